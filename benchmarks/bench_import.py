@@ -0,0 +1,94 @@
+"""
+benchmarks.bench_import
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Import time budget of the CLI, measured with `python -X importtime`.
+
+    $ python -m benchmarks.bench_import --budget 150
+
+Each scenario runs the CLI in a fresh interpreter, checks that the heavy
+dependencies are not imported on its code path, and that the imports take
+no more than the budget (best of `--repeat` runs, without the imports of an
+empty interpreter). The exit status is 1 when a scenario fails.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, "examples")
+
+# (name, CLI arguments, modules which must not be imported).
+SCENARIOS = [
+    ("help", ["--help"],
+     ["lark", "termcolor", "networkx", "dataclasses", "jpipe_runner.jpipe"]),
+    ("merge", ["merge", "--help"],
+     ["lark", "termcolor", "networkx", "jpipe_runner.jpipe"]),
+    ("json", ["--dry-run", os.path.join(EXAMPLES, "models", "01_slides.json")],
+     ["lark", "networkx", "concurrent.futures", "socket"]),
+    ("jd", ["--dry-run", os.path.join(EXAMPLES, "models", "01_slides.jd")],
+     ["networkx", "concurrent.futures", "socket"]),
+]
+
+
+def import_times(args: list[str]) -> tuple[float, set[str]]:
+    """Return the import time, in ms, of the top-level imports of a Python
+    process, and the names of all the imported modules."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args],
+                          env=env, cwd=ROOT, capture_output=True, text=True)
+    total, modules = 0, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or not (fields := line.split("|"))[1].strip().isdigit():
+            continue
+        _, cumulative, name = fields
+        modules.add(name.strip())
+        # nested imports are indented, and already counted by their parent.
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def measure(cli: list[str], repeat: int) -> tuple[float, set[str]]:
+    """Return the best import time, in ms, of the CLI with some arguments,
+    without the imports of an empty interpreter, and the imported modules."""
+    startup, _ = import_times(["-c", "pass"])
+    best, imported = float("inf"), set()
+    for _ in range(repeat):
+        total, imported = import_times(["-m", "jpipe_runner", *cli])
+        best = min(best, total - startup)
+    return best, imported
+
+
+def run(name: str, cli: list[str], forbidden: list[str], budget: float, repeat: int) -> bool:
+    best, imported = measure(cli, repeat)
+    ok = True
+    message = f"{name:<6} {best:>7.1f} ms"
+    if found := [m for m in forbidden if m in imported]:
+        message += f"  imports {', '.join(found)}"
+        ok = False
+    if best > budget:
+        message += f"  over budget ({budget:.0f} ms)"
+        ok = False
+    print(message + ("" if ok else "  FAIL"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--budget", type=float, default=150,
+                        help="Import time budget of each scenario, in ms (default: 150)")
+    parser.add_argument("--repeat", "-r", type=int, default=5,
+                        help="Runs of each scenario, keeping the best time")
+    args = parser.parse_args()
+
+    results = [run(name, cli, forbidden, args.budget, max(args.repeat, 1))
+               for name, cli, forbidden in SCENARIOS]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
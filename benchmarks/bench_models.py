@@ -0,0 +1,101 @@
+"""
+benchmarks.bench_models
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Memory benchmark of the model definitions on synthetic large models.
+
+    $ python -m benchmarks.bench_models --justifications 2000 --nodes 100
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from jpipe_runner.enums import ClassType, VariableType
+from jpipe_runner.models import (ModelDef,
+                                 ClassDef,
+                                 JustificationDef,
+                                 VariableDef,
+                                 SupportDef)
+from jpipe_runner.parser import parse_jd
+
+
+def generate_justification(i: int, nodes: int) -> ClassDef:
+    """Generate a chain of evidence -> strategy -> sub-conclusion -> ...
+    -> conclusion, whose descriptions repeat across justifications."""
+    variables = {"c": VariableDef(VariableType.CONCLUSION, "c", "Conclusion holds")}
+    supports = []
+    top = "c"
+    for k in range((nodes - 2) // 2):
+        s, sc = f"s{k}", f"sc{k}"
+        variables[s] = VariableDef(VariableType.STRATEGY, s, f"Check step {k}")
+        supports.append(SupportDef(s, top))
+        if k < (nodes - 2) // 2 - 1:
+            variables[sc] = VariableDef(VariableType.SUB_CONCLUSION, sc, f"Step {k} holds")
+            supports.append(SupportDef(sc, s))
+            top = sc
+        else:
+            variables["e"] = VariableDef(VariableType.EVIDENCE, "e", "Evidence exists")
+            supports.append(SupportDef("e", s))
+    return ClassDef(class_type=ClassType.JUSTIFICATION,
+                    name=f"j{i}",
+                    body=JustificationDef(supports=set(supports),
+                                          variables=variables))
+
+
+def generate_source(justifications: int, nodes: int) -> str:
+    lines = []
+    for i in range(justifications):
+        cls = generate_justification(i, nodes)
+        lines.append(f"justification {cls.name} {{")
+        for v in cls.body.variables.values():
+            lines.append(f'    {v.var_type.value} {v.name} is "{v.description}"')
+        for s in cls.body.supports:
+            lines.append(f"    {s.left} supports {s.right}")
+        lines.append("}")
+    return "\n".join(lines)
+
+
+def measure(build) -> tuple[ModelDef, int, int, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    # read the supports, as the engine does.
+    for cls in result.class_defs.values():
+        len(cls.body.supports)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--justifications", "-j", type=int, default=2000)
+    parser.add_argument("--nodes", "-n", type=int, default=100)
+    parser.add_argument("--parse", action="store_true",
+                        help="Build the model by parsing the generated .jd source")
+    args = parser.parse_args()
+
+    if args.parse:
+        source = generate_source(args.justifications, args.nodes)
+        model, current, peak, elapsed = measure(lambda: parse_jd(source))
+    else:
+        model, current, peak, elapsed = measure(lambda: ModelDef(class_defs={
+            cls.name: cls for cls in (generate_justification(i, args.nodes)
+                                      for i in range(args.justifications))}))
+
+    supports = sum(len(c.body.supports) for c in model.class_defs.values())
+    print(f"justifications : {len(model.class_defs)}")
+    print(f"supports       : {supports}")
+    print(f"time           : {elapsed:.3f}s")
+    print(f"retained       : {current / 2 ** 20:.1f} MiB ({current / supports:.1f} B/support)")
+    print(f"peak           : {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+benchmarks.bench_stages
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Time and peak memory benchmark of each stage of a run, on a synthetic model
+(see `benchmarks/synthetic.py`).
+
+    $ python -m benchmarks.bench_stages --justifications 500 --nodes 200 --save baseline.json
+    $ python -m benchmarks.bench_stages --compare baseline.json
+
+Stages are run `--repeat` times for the best time, then once more under
+tracemalloc for the peak memory, which is measured above the memory held
+before the stage. With `--compare`, the model of the baseline is generated
+again, and the exit status is 1 when a stage is slower or takes more memory
+than its baseline by more than `--threshold` (and, for times, by more than
+`MIN_TIME_DELTA`).
+
+Times depend on the machine, hence no baseline is committed: a CI job
+saves one from the target branch, e.g. checked out with `git worktree add`,
+then compares the change with it on the same machine.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, NamedTuple
+
+from benchmarks.synthetic import ModelConfig, add_config_args, config_from_args, generate_model
+
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.parser import ModelCache, load_jd_file, parse_jd_file
+from jpipe_runner.runtime import PythonRuntime
+from jpipe_runner.scheduler import Scheduler
+
+# time differences below this many seconds are noise, never regressions.
+MIN_TIME_DELTA = 0.02
+
+
+class Stage(NamedTuple):
+    name: str
+    # prepare the input of the stage, which is not measured.
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+
+
+def _engine(model: str) -> JPipeEngine:
+    cache = ModelCache()
+    load_jd_file(model, cache=cache)
+    return JPipeEngine(model, cache=cache)
+
+
+def _justify(state: tuple[JPipeEngine, PythonRuntime, Scheduler]) -> None:
+    engine, runtime, scheduler = state
+    for name in engine.justifications:
+        for _ in engine.justify(name, runtime=runtime, scheduler=scheduler):
+            pass
+
+
+def make_stages(model: str, library: str, jobs: int) -> list[Stage]:
+    directory = os.path.dirname(model)
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".jd"))
+
+    def loaded() -> ModelCache:
+        cache = ModelCache()
+        load_jd_file(model, cache=cache)
+        return cache
+
+    def built() -> list:
+        engine = _engine(model)
+        return list(engine.justifications.values())
+
+    def build(cache: ModelCache) -> None:
+        engine = JPipeEngine(model, cache=cache)
+        for _ in engine.justifications.values():
+            pass
+
+    return [
+        Stage("parse", lambda: files, lambda fs: [parse_jd_file(f) for f in fs]),
+        Stage("load", lambda: model, load_jd_file),
+        Stage("build", loaded, build),
+        Stage("validate", built, lambda jds: [jd.validate() for jd in jds]),
+        Stage("traverse", built, lambda jds: [jd.layered_traverse() for jd in jds]),
+        Stage("justify",
+              lambda: (_engine(model), PythonRuntime(libraries=[library]),
+                       Scheduler(jobs=jobs) if jobs > 1 else None),
+              _justify),
+    ]
+
+
+def measure(stage: Stage, repeat: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        state = stage.setup()
+        gc.collect()
+        start = time.perf_counter()
+        stage.run(state)
+        best = min(best, time.perf_counter() - start)
+        del state
+
+    tracemalloc.start()
+    state = stage.setup()
+    gc.collect()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    stage.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(time=best, peak=peak - before)
+
+
+def _delta(value: float, baseline: float) -> float:
+    return (value - baseline) / baseline if baseline else 0.0
+
+
+def _mib(size: float) -> str:
+    return f"{size / 2 ** 20:.1f} MiB"
+
+
+def report(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Print the results, along with their baseline when given, and return
+    the stages regressing by more than the threshold."""
+    regressions = []
+    header = ["stage", "time", "baseline", "delta", "peak", "baseline", "delta"]
+    rows = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        row = [name, f"{r['time']:.3f}s", "-", "-", _mib(r['peak']), "-", "-"]
+        if b is not None:
+            dt, dm = _delta(r['time'], b['time']), _delta(r['peak'], b['peak'])
+            row[2:4] = f"{b['time']:.3f}s", f"{dt:+.1%}"
+            row[5:7] = _mib(b['peak']), f"{dm:+.1%}"
+            if (dt > threshold and r['time'] - b['time'] > MIN_TIME_DELTA) or dm > threshold:
+                regressions.append(name)
+                row.append("REGRESSION")
+        rows.append(row)
+
+    if not baseline:
+        header = [header[0], header[1], header[4]]
+        rows = [[r[0], r[1], r[4]] for r in rows]
+    for row in [header] + rows:
+        print(f"{row[0]:<10}" + "".join(f" {c:>12}" for c in row[1:]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    add_config_args(parser)
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Checks run at once in the justify stage")
+    parser.add_argument("--repeat", "-r", type=int, default=5,
+                        help="Runs of each stage, keeping the best time")
+    parser.add_argument("--stages", metavar="NAME[,NAME...]",
+                        help="Only run these stages")
+    parser.add_argument("--keep", metavar="DIR",
+                        help="Generate the model into DIR, and keep it")
+    parser.add_argument("--save", metavar="FILE",
+                        help="Save the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Compare the results with a baseline, using its model and jobs")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative regression failing the comparison (default: 0.2)")
+    args = parser.parse_args()
+
+    config, jobs, baseline = config_from_args(args), args.jobs, {}
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        config, jobs, baseline = ModelConfig(**saved['config']), saved['jobs'], saved['stages']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model, library = generate_model(config, args.keep or tmp)
+        stages = make_stages(model, library, jobs)
+        if args.stages:
+            selected = args.stages.split(',')
+            if unknown := set(selected) - {s.name for s in stages}:
+                parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+            stages = [s for s in stages if s.name in selected]
+
+        print(f"model : {config.as_dict()}, jobs={jobs}")
+        results = {s.name: measure(s, max(args.repeat, 1)) for s in stages}
+        regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(config=config.as_dict(),
+                           jobs=jobs,
+                           python=platform.python_version(),
+                           stages=results), f, indent=2)
+            f.write("\n")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
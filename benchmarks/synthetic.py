@@ -0,0 +1,205 @@
+"""
+benchmarks.synthetic
+~~~~~~~~~~~~~~~~~~~~
+
+Generator of synthetic large models and their libraries.
+
+    $ python -m benchmarks.synthetic --justifications 500 --nodes 200 out/
+
+Each justification is a tree grown breadth first from its conclusion: every
+claim (the conclusion or a sub-conclusion) is supported by one strategy,
+itself supported by `fan_in` evidence, and evidence are turned into
+sub-conclusions until the justification has `nodes` nodes. With a `fan_out`
+larger than 1, each node also supports the next strategies of its layer.
+
+Node labels, hence check functions, repeat across justifications, and the
+generated library defines one function per label, which sleeps and spins
+for the given cost before passing.
+"""
+
+import argparse
+import os
+from dataclasses import dataclass, asdict, field
+
+from jpipe_runner.utils import sanitize_string
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    justifications: int = 200
+    nodes: int = 50
+    fan_in: int = 2
+    fan_out: int = 1
+    # fraction of the justifications implementing the shared pattern.
+    pattern_reuse: float = 0.5
+    # number of nested files, loaded one from the other.
+    load_depth: int = 2
+    # cost of each check function, in seconds of sleep and loop iterations.
+    sleep: float = 0.0
+    cpu: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _Tree:
+    # (kind, name, label) of each node, and (left, right) supports.
+    variables: list[tuple[str, str, str]] = field(default_factory=list)
+    supports: list[tuple[str, str]] = field(default_factory=list)
+
+
+def generate_tree(config: ModelConfig) -> _Tree:
+    """Generate the shape shared by all the justifications."""
+    fan_in = max(config.fan_in, 1)
+    kinds = {"c": "conclusion"}
+    labels = {"c": "Conclusion holds"}
+    supports = []
+    claims = ["c"]
+    layers: dict[int, list[str]] = {}
+    depth = {"c": 0}
+    strategies = 0
+
+    while claims and len(kinds) + 1 + fan_in <= max(config.nodes, 2 + fan_in):
+        claim = claims.pop(0)
+        if claim != "c":
+            kinds[claim] = "sub-conclusion"
+            labels[claim] = f"Step {claim[1:]} holds"
+        s = f"s{strategies}"
+        strategies += 1
+        kinds[s], labels[s] = "strategy", f"Check step {s[1:]}"
+        supports.append((s, claim))
+        layer = layers.setdefault(depth[claim], [])
+        layer.append(s)
+
+        for _ in range(fan_in):
+            n = f"n{len(kinds)}"
+            kinds[n], labels[n] = "evidence", f"Evidence {n[1:]} exists"
+            depth[n] = depth[claim] + 1
+            supports.append((n, s))
+            # also support the previous strategies of the layer.
+            for other in layer[-config.fan_out:-1]:
+                supports.append((n, other))
+            claims.append(n)
+
+    return _Tree(variables=[(kinds[n], n, labels[n]) for n in kinds],
+                 supports=supports)
+
+
+def _justification(name: str, tree: _Tree, pattern: bool) -> list[str]:
+    # the conclusion and top strategy come from the pattern when implementing it.
+    top = {"c", "s0"} if pattern else set()
+    lines = [f"justification {name}" + (" implements shared_P {" if pattern else " {")]
+    for kind, n, label in tree.variables:
+        if n not in top:
+            lines.append(f'    {kind} {n} is "{label}"')
+    for left, right in tree.supports:
+        if right not in top:
+            lines.append(f"    {left} supports {right}")
+    lines.append("}")
+    return lines
+
+
+def _pattern(tree: _Tree) -> list[str]:
+    variables = {n: (kind, label) for kind, n, label in tree.variables}
+    lines = ["pattern shared_P {",
+             f'    conclusion c is "{variables["c"][1]}"',
+             f'    strategy s0 is "{variables["s0"][1]}"',
+             "    s0 supports c"]
+    for left, right in tree.supports:
+        if right == "s0":
+            lines.append(f'    @support {left} is "{variables[left][1]}"')
+            lines.append(f"    {left} supports s0")
+    lines.append("}")
+    return lines
+
+
+def generate_library(config: ModelConfig, tree: _Tree) -> str:
+    lines = ['"""Synthetic library generated by benchmarks/synthetic.py."""',
+             "",
+             "import time",
+             "",
+             f"SLEEP = {config.sleep!r}",
+             f"CPU = {config.cpu!r}",
+             "",
+             "",
+             "def _work():",
+             "    if SLEEP:",
+             "        time.sleep(SLEEP)",
+             "    for _ in range(CPU):",
+             "        pass",
+             "    return True",
+             ""]
+    for kind, _, label in tree.variables:
+        if kind in ("evidence", "strategy"):
+            lines += ["", f"def {sanitize_string(label)}():", "    return _work()", ""]
+    return "\n".join(lines)
+
+
+def generate_model(config: ModelConfig, directory: str) -> tuple[str, str]:
+    """Write a synthetic model into a directory, returning the paths of its
+    top model file and of its library.
+
+    Justifications are spread over `load_depth + 1` files, `model.jd`
+    loading `part1.jd`, which loads `part2.jd`, and so on, the deepest file
+    defining the shared pattern.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tree = generate_tree(config)
+    files = ["model.jd"] + [f"part{k}.jd" for k in range(1, config.load_depth + 1)]
+    contents: list[list[str]] = [[] for _ in files]
+
+    for k in range(1, len(files)):
+        contents[k - 1].append(f'load "{os.path.abspath(os.path.join(directory, files[k]))}"')
+    patterns = round(config.justifications * config.pattern_reuse)
+    if patterns:
+        contents[-1] += _pattern(tree)
+    for i in range(config.justifications):
+        contents[i % len(files)] += _justification(f"j{i}", tree, pattern=i < patterns)
+
+    for filename, lines in zip(files, contents):
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+    library = os.path.join(directory, "library.py")
+    with open(library, 'w') as f:
+        f.write(generate_library(config, tree))
+    return os.path.join(directory, files[0]), library
+
+
+def add_config_args(parser: argparse.ArgumentParser) -> None:
+    defaults = ModelConfig()
+    parser.add_argument("--justifications", type=int, default=defaults.justifications)
+    parser.add_argument("--nodes", "-n", type=int, default=defaults.nodes,
+                        help="Nodes per justification")
+    parser.add_argument("--fan-in", type=int, default=defaults.fan_in,
+                        help="Supporters of each strategy")
+    parser.add_argument("--fan-out", type=int, default=defaults.fan_out,
+                        help="Strategies supported by each node")
+    parser.add_argument("--pattern-reuse", type=float, default=defaults.pattern_reuse,
+                        help="Fraction of the justifications implementing a shared pattern")
+    parser.add_argument("--load-depth", type=int, default=defaults.load_depth,
+                        help="Depth of the chain of loaded files")
+    parser.add_argument("--sleep", type=float, default=defaults.sleep,
+                        help="Seconds slept by each check")
+    parser.add_argument("--cpu", type=int, default=defaults.cpu,
+                        help="Loop iterations spun by each check")
+
+
+def config_from_args(args: argparse.Namespace) -> ModelConfig:
+    return ModelConfig(**{k: getattr(args, k) for k in ModelConfig().as_dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    add_config_args(parser)
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    model, library = generate_model(config_from_args(args), args.directory)
+    print(f"model   : {model}")
+    print(f"library : {library}")
+
+
+if __name__ == "__main__":
+    main()
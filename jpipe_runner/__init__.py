@@ -0,0 +1,9 @@
+__all__ = ["batch", "check"]
+
+
+def __getattr__(name: str):
+    # libraries import the decorators, while the CLI starts without them.
+    if name in __all__:
+        from jpipe_runner import library
+        return getattr(library, name)
+    raise AttributeError(f"module 'jpipe_runner' has no attribute '{name}'")
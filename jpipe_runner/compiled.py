@@ -0,0 +1,273 @@
+"""
+jpipe_runner.compiled
+~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the compiled binary format of justification models.
+
+A compiled model holds fully resolved justifications: loaded files are
+merged, patterns expanded and justifications validated, and the justify
+order and function names of the nodes are precomputed. It is loaded with
+a single memory mapping of the file, and each justification is decoded
+from the mapped arrays on first access, without any further validation.
+
+The file starts with a header, followed by a table of sections, each one
+being a flat array of little-endian integers aligned on 8 bytes:
+
+    header      magic, version, number of sections
+    sections    (offset, length) of each section below, in order
+    STRINGS     offsets of the strings in TEXT (uint32, n + 1)
+    TEXT        UTF-8 encoded strings
+    DIAGRAMS    one record of uint32 per justification, see `DIAGRAM_FIELDS`
+    NAMES       string of the name of each node (uint32)
+    LABELS      string of the label of each node (uint32)
+    TYPES       variable type of each node (uint8)
+    FUNCTIONS   string of the function of each node, or NONE (uint32)
+    COMPONENTS  string of the component justification of each node, or NONE (uint32)
+    OPERATORS   string of the operator of each node, or NONE (uint32)
+    ORDER       justify order of the nodes of each justification (uint32)
+    EDGES       packed `(source << 32 | target)` edges, in insertion order (uint64)
+    SUCC_PTR    CSR successor offsets of each justification (uint32, n + 1)
+    SUCC        CSR successors (uint32)
+    PRED_PTR    CSR predecessor offsets of each justification (uint32, n + 1)
+    PRED        CSR predecessors (uint32)
+    REFS        string of the component justifications of each composition (uint32)
+
+Node and edge indices are local to their justification.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Iterable, Mapping, Optional
+
+from jpipe_runner.enums import VariableType
+from jpipe_runner.exceptions import RunnerException
+from jpipe_runner.utils import sanitize_string
+
+MAGIC = b"\x89JPB\r\n\x1a\n"
+VERSION = 1
+
+NONE = 0xFFFFFFFF
+
+SECTIONS = ("STRINGS", "TEXT", "DIAGRAMS", "NAMES", "LABELS", "TYPES",
+            "FUNCTIONS", "COMPONENTS", "OPERATORS", "ORDER", "EDGES",
+            "SUCC_PTR", "SUCC", "PRED_PTR", "PRED", "REFS")
+
+DIAGRAM_FIELDS = ("name", "node_start", "node_count", "edge_start", "edge_count",
+                  "ptr_start", "ref_start", "ref_count")
+
+_FORMATS = dict(STRINGS='I', TEXT='B', DIAGRAMS='I', NAMES='I', LABELS='I', TYPES='B',
+                FUNCTIONS='I', COMPONENTS='I', OPERATORS='I', ORDER='I', EDGES='Q',
+                SUCC_PTR='I', SUCC='I', PRED_PTR='I', PRED='I', REFS='I')
+
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<QQ")
+
+_VAR_TYPES = list(VariableType)
+
+
+class CompiledModelException(RunnerException):
+    """An invalid compiled model error occurred."""
+
+
+class _StringTable:
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self.index: dict[str, int] = {}
+
+    def __call__(self, s: Optional[str]) -> int:
+        if s is None:
+            return NONE
+        if (i := self.index.get(s)) is None:
+            self.index[s] = i = len(self.strings)
+            self.strings.append(s)
+        return i
+
+
+def write_compiled(justifications: Mapping[str, Any], filename: str) -> None:
+    """Write validated justifications into a compiled model file."""
+    string = _StringTable()
+    data = {k: array(f) for k, f in _FORMATS.items()}
+
+    for name, jd in justifications.items():
+        names = list(jd.nodes)
+        index = {n: i for i, n in enumerate(names)}
+        edges, succ_ptr, succ, pred_ptr, pred = jd.arrays()
+        refs = []
+        data['DIAGRAMS'].extend((string(name),
+                                 len(data['NAMES']), len(names),
+                                 len(data['EDGES']), len(edges),
+                                 len(data['SUCC_PTR']),
+                                 len(data['REFS']), 0))
+        for n, d in jd.nodes(data=True):
+            var_type = d['var_type']
+            function = None
+            if var_type in (VariableType.EVIDENCE, VariableType.STRATEGY) \
+                    and 'component' not in d and 'operator' not in d:
+                function = sanitize_string(d['label'])
+            if (component := d.get('component')) is not None and component not in refs:
+                refs.append(component)
+            data['NAMES'].append(string(n))
+            data['LABELS'].append(string(d['label']))
+            data['TYPES'].append(_VAR_TYPES.index(var_type))
+            data['FUNCTIONS'].append(string(function))
+            data['COMPONENTS'].append(string(component))
+            data['OPERATORS'].append(string(d.get('operator')))
+        data['ORDER'].extend(index[n] for n in jd.justify_order())
+        data['EDGES'].extend(edges)
+        data['SUCC_PTR'].extend(succ_ptr)
+        data['SUCC'].extend(succ)
+        data['PRED_PTR'].extend(pred_ptr)
+        data['PRED'].extend(pred)
+        data['DIAGRAMS'][-1] = len(refs)
+        data['REFS'].extend(string(r) for r in refs)
+
+    offset = 0
+    for s in string.strings:
+        data['STRINGS'].append(offset)
+        data['TEXT'].frombytes(encoded := s.encode('utf-8'))
+        offset += len(encoded)
+    data['STRINGS'].append(offset)
+
+    if sys.byteorder != 'little':
+        for a in data.values():
+            a.byteswap()
+
+    header_size = _HEADER.size + _SECTION.size * len(SECTIONS)
+    offset, table, blobs = header_size, [], []
+    for section in SECTIONS:
+        offset += -offset % 8  # align every section on 8 bytes.
+        blob = data[section].tobytes()
+        table.append((offset, len(blob)))
+        blobs.append((offset, blob))
+        offset += len(blob)
+
+    # written to a temporary file, then renamed over the model, so that an
+    # interrupted compile never leaves a truncated model behind.
+    directory = os.path.dirname(filename) or os.curdir
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(SECTIONS)))
+            for entry in table:
+                f.write(_SECTION.pack(*entry))
+            for offset, blob in blobs:
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(blob)
+        # mkstemp creates private files, models get the default permissions.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class CompiledDiagram:
+    """The record of a justification in a compiled model."""
+
+    __slots__ = ("model",) + DIAGRAM_FIELDS
+
+    def __init__(self, model: "CompiledModel", record: Iterable[int]):
+        self.model = model
+        for field, value in zip(DIAGRAM_FIELDS, record):
+            setattr(self, field, value)
+
+    @property
+    def components(self) -> tuple[str, ...]:
+        model = self.model
+        return tuple(model.string(i) for i in
+                     model.section('REFS')[self.ref_start:self.ref_start + self.ref_count])
+
+    def nodes(self) -> tuple[list[str], dict[str, list]]:
+        """Decode the names and attribute columns of the nodes, None values
+        of the function, component and operator columns being missing."""
+        model = self.model
+        nodes = slice(self.node_start, self.node_start + self.node_count)
+
+        def strings(section: str) -> list:
+            return [model.string(i) for i in model.section(section)[nodes]]
+
+        columns = dict(label=strings('LABELS'),
+                       var_type=[_VAR_TYPES[i] for i in model.section('TYPES')[nodes]],
+                       status=[None] * self.node_count)
+        for column, section in (('function', 'FUNCTIONS'),
+                                ('component', 'COMPONENTS'),
+                                ('operator', 'OPERATORS')):
+            if any(i != NONE for i in model.section(section)[nodes]):
+                columns[column] = strings(section)
+        return strings('NAMES'), columns
+
+    def order(self) -> list[int]:
+        return self.model.section('ORDER')[self.node_start:self.node_start + self.node_count].tolist()
+
+    def arrays(self) -> tuple[Any, Any, Any, Any, Any]:
+        """Return the edge and CSR arrays, as read-only views of the file."""
+        model = self.model
+        edges = slice(self.edge_start, self.edge_start + self.edge_count)
+        ptr = slice(self.ptr_start, self.ptr_start + self.node_count + 1)
+        return (model.section('EDGES')[edges],
+                model.section('SUCC_PTR')[ptr], model.section('SUCC')[edges],
+                model.section('PRED_PTR')[ptr], model.section('PRED')[edges])
+
+
+class CompiledModel:
+    """A compiled model file, mapped in memory."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:  # empty file
+                raise CompiledModelException(f"'{filename}' is not a compiled model") from e
+        buf = memoryview(self._map)
+
+        try:
+            magic, version, count = _HEADER.unpack_from(buf)
+        except struct.error as e:
+            raise CompiledModelException(f"'{filename}' is not a compiled model") from e
+        if magic != MAGIC:
+            raise CompiledModelException(f"'{filename}' is not a compiled model")
+        if version != VERSION or count != len(SECTIONS):
+            raise CompiledModelException(
+                f"unsupported compiled model version in '{filename}': {version}")
+
+        self._sections = {}
+        for i, section in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(buf, _HEADER.size + i * _SECTION.size)
+            view = buf[offset:offset + length].cast(_FORMATS[section])
+            if sys.byteorder != 'little':
+                view = array(_FORMATS[section], view)
+                view.byteswap()
+            self._sections[section] = view
+
+        self._offsets = self._sections['STRINGS']
+        self._text = self._sections['TEXT']
+        self._strings: list[Optional[str]] = [None] * (len(self._offsets) - 1)
+
+        records = self._sections['DIAGRAMS']
+        size = len(DIAGRAM_FIELDS)
+        self.diagrams: dict[str, CompiledDiagram] = {}
+        for i in range(0, len(records), size):
+            diagram = CompiledDiagram(self, records[i:i + size])
+            self.diagrams[self.string(diagram.name)] = diagram
+
+    def section(self, section: str) -> Any:
+        return self._sections[section]
+
+    def string(self, i: int) -> Optional[str]:
+        if i == NONE:
+            return None
+        if (s := self._strings[i]) is None:
+            s = self._strings[i] = sys.intern(
+                bytes(self._text[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8'))
+        return s
@@ -28,3 +28,11 @@ class RuntimeException(RuntimeError, RunnerException):
 
 class FunctionException(RunnerException):
     """A justification function error occurred."""
+
+
+class CheckTimeoutError(TimeoutError, RunnerException):
+    """A check timed out, and is left running until `running` is done."""
+
+    def __init__(self, message: str, running=None):
+        super().__init__(message)
+        self.running = running
@@ -0,0 +1,209 @@
+"""
+jpipe_runner.explain
+~~~~~~~~~~~~~~~~~~~~
+
+This module contains the cost estimation of justifications.
+"""
+
+import heapq
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Mapping, Optional
+
+from jpipe_runner.enums import VariableType
+from jpipe_runner.utils import sanitize_string
+
+if TYPE_CHECKING:
+    from jpipe_runner.library import CheckSpec
+
+# The cost of a function without any recorded duration or estimate.
+DEFAULT_COST = 1.0
+
+
+def node_costs(jd: Any,
+               costs: Mapping[str, float],
+               default_cost: Optional[float] = None,
+               components: Optional[Mapping[str, float]] = None,
+               ) -> dict[str, tuple[float, str | None, str]]:
+    """Return the cost, function (or component) name and cost source of each node.
+
+    Only evidence and strategy nodes call a function, and the evidence of a
+    composition justifies its component, which costs `components[name]`;
+    any other node is free. Functions without a known cost fall back to the
+    mean known cost.
+    """
+    if default_cost is None:
+        default_cost = (sum(costs.values()) / len(costs)) if costs else DEFAULT_COST
+
+    result = {}
+    for n, d in jd.nodes(data=True):
+        if (component := d.get('component')) is not None:
+            result[n] = ((components or {}).get(component, 0.0), component, "component")
+        elif d['var_type'] not in (VariableType.EVIDENCE, VariableType.STRATEGY) or 'operator' in d:
+            result[n] = (0.0, None, "free")
+        elif (fn := d.get('function') or sanitize_string(d['label'])) in costs:
+            result[n] = (costs[fn], fn, "known")
+        else:
+            result[n] = (default_cost, fn, "default")
+    return result
+
+
+def estimate_wall_time(jd: Any,
+                       cost: Mapping[str, float],
+                       priority: Mapping[str, float],
+                       workers: int,
+                       specs: Optional[Mapping[str, "CheckSpec"]] = None,
+                       capacities: Optional[Mapping[str, float]] = None,
+                       ) -> float:
+    """Simulate a list scheduling of the justification on a number of workers.
+
+    Ready nodes are started by decreasing priority (the longest remaining
+    path), as soon as they fit next to the running checks, as with
+    `Scheduler`: `specs` maps the nodes calling a check to its properties,
+    checks which are not parallel-safe running alone, and the others up to
+    `workers` at once and within the resource pools of `capacities`. Nodes
+    without a spec do not take a worker.
+    """
+    from jpipe_runner.scheduler import Scheduler
+
+    scheduler = Scheduler(workers, capacities)
+    specs = specs or {}
+    pending = {n: jd.in_degree(n) for n in jd.nodes}
+    ready = [(-priority[n], n) for n, k in pending.items() if k == 0]
+    heapq.heapify(ready)
+    running: list[tuple[float, str]] = []
+    checks: dict[str, tuple[str, "CheckSpec"]] = {}
+    held = Counter()
+    now = 0.0
+
+    while ready or running:
+        # the next node waits for a worker, and holds back the others.
+        while ready and ((spec := specs.get(n := ready[0][1])) is None
+                         or scheduler.fits(spec, checks, held)):
+            heapq.heappop(ready)
+            if spec is not None:
+                checks[n] = (n, spec)
+                held.update(spec.resources)
+            heapq.heappush(running, (now + cost[n], n))
+        now, n = heapq.heappop(running)
+        if (check := checks.pop(n, None)) is not None:
+            held.subtract(check[1].resources)
+        for child in jd.successors(n):
+            pending[child] -= 1
+            if pending[child] == 0:
+                heapq.heappush(ready, (-priority[child], child))
+
+    return now
+
+
+def explain(jd: Any,
+            costs: Mapping[str, float],
+            workers: int = 1,
+            default_cost: Optional[float] = None,
+            top: int = 5,
+            justifications: Optional[Mapping[str, Any]] = None,
+            specs: Optional[Mapping[str, "CheckSpec"]] = None,
+            capacities: Optional[Mapping[str, float]] = None,
+            _components: Optional[dict[str, dict[str, Any]]] = None,
+            ) -> dict[str, Any]:
+    """Explain the expected cost of justifying a justification.
+
+    The components of a composition, looked up in `justifications`, are
+    explained recursively: the evidence of a component costs its serial
+    cost in the serial cost, and its expected wall time otherwise.
+
+    `specs` maps functions to their declared properties (see
+    `PythonRuntime.specs`), the other functions running alone as in a run;
+    without it, every check is assumed to be parallel-safe.
+    """
+    from jpipe_runner.library import DEFAULT_SPEC, CheckSpec
+
+    if _components is None:
+        _components = {}
+    for n, d in jd.nodes(data=True):
+        if (component := d.get('component')) is not None and justifications is not None \
+                and component not in _components:
+            _components[component] = explain(justifications[component], costs, workers, default_cost,
+                                             top, justifications, specs, capacities, _components)
+    nodes = node_costs(jd, costs, default_cost,
+                       {c: e['wall_time'] for c, e in _components.items()})
+    cost = {n: c for n, (c, _, _) in nodes.items()}
+    order = jd.justify_order()
+
+    # longest path ending at each node.
+    finish, prev = {}, {}
+    for n in order:
+        parents = list(jd.predecessors(n))
+        best = max(parents, key=lambda p: finish[p], default=None)
+        prev[n] = best
+        finish[n] = cost[n] + (finish[best] if best is not None else 0.0)
+
+    # longest path starting at each node.
+    remaining = {}
+    for n in reversed(order):
+        remaining[n] = cost[n] + max((remaining[c] for c in jd.successors(n)), default=0.0)
+
+    sinks = [n for n in order if jd.out_degree(n) == 0]
+    path, n = [], max(sinks, key=lambda k: finish[k], default=None)
+    while n is not None:
+        path.append(n)
+        n = prev[n]
+    path.reverse()
+
+    # the serial cost of a component does not depend on the workers, unlike its wall time.
+    serial_cost = {n: _components[fn]['serial_cost'] if src == "component" and fn in _components else c
+                   for n, (c, fn, src) in nodes.items()}
+    serial = sum(serial_cost.values())
+    # components are justified one after the other, before the other nodes.
+    components = sum(c for c, _, src in nodes.values() if src == "component")
+    scheduled = {n: 0.0 if src == "component" else c for n, (c, _, src) in nodes.items()}
+    parallel_safe = CheckSpec(parallel_safe=True)
+    checks = {n: parallel_safe if specs is None else specs.get(fn, DEFAULT_SPEC)
+              for n, (_, fn, src) in nodes.items() if src in ("known", "default")}
+    unknown = {fn for _, fn, src in nodes.values() if src == "default"}
+    for _, fn, src in nodes.values():
+        if src == "component" and fn in _components:
+            unknown.update(_components[fn]['unknown_functions'])
+    critical = set(path)
+    dominating = sorted((n for n in order if serial_cost[n] > 0),
+                        key=lambda k: -serial_cost[k])[:top]
+
+    return dict(
+        name=jd.name,
+        workers=workers,
+        assumed_parallel_safe=specs is None,
+        serial_cost=serial,
+        critical_path_cost=finish[path[-1]] if path else 0.0,
+        critical_path=path,
+        wall_time=components + estimate_wall_time(jd, scheduled, remaining, workers, checks, capacities),
+        dominating_nodes=[dict(name=n,
+                               var_type=jd.nodes[n]['var_type'].value,
+                               function=nodes[n][1],
+                               cost=serial_cost[n],
+                               source=nodes[n][2],
+                               share=(serial_cost[n] / serial) if serial else 0.0,
+                               critical=n in critical)
+                          for n in dominating],
+        unknown_functions=sorted(unknown),
+    )
+
+
+def format_explanation(explanation: Mapping[str, Any]) -> str:
+    """Format an explanation as human-readable text."""
+    lines = [
+        f"Justification :: {explanation['name']}",
+        f"  serial cost         : {explanation['serial_cost']:.3f}s",
+        f"  critical path cost  : {explanation['critical_path_cost']:.3f}s",
+        f"  critical path       : {' -> '.join(explanation['critical_path'])}",
+        f"  wall time ({explanation['workers']} worker{'s' if explanation['workers'] > 1 else ''})"
+        .ljust(22) + f": {explanation['wall_time']:.3f}s"
+        + (" (checks assumed parallel-safe)" if explanation['assumed_parallel_safe']
+           and explanation['workers'] > 1 else ""),
+        "  dominating nodes    :",
+    ]
+    for node in explanation['dominating_nodes']:
+        lines.append(f"    {node['share']:6.1%}  {node['cost']:.3f}s  "
+                     f"{node['var_type'].title()}<{node['name']}> {node['function']}"
+                     + (" [component]" if node['source'] == "component" else "")
+                     + (" [critical]" if node['critical'] else "")
+                     + (" [no estimate]" if node['source'] == "default" else ""))
+    return "\n".join(lines)
@@ -0,0 +1,311 @@
+"""
+jpipe_runner.export
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the image export of justification diagrams.
+
+Diagrams are rendered by Graphviz through pygraphviz when installed, or by
+the built-in writers otherwise, which produce DOT and SVG text in pure
+Python. Renders are cached by a hash of the graph structure and of the
+drawn attributes, so that unchanged diagrams are never rendered again.
+"""
+
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+from html import escape
+from typing import Any, Iterator, Mapping, Optional
+
+from jpipe_runner.enums import VariableType
+from jpipe_runner.exceptions import RunnerException, RuntimeException
+
+RENDERERS = ("auto", "graphviz", "builtin")
+# formats written by the built-in renderer.
+BUILTIN_FORMATS = ("dot", "gv", "svg")
+# bump when the output of a renderer changes, to invalidate the caches.
+RENDER_VERSION = 1
+
+# X11 colors of `Justification.node_attr_map` which are not SVG colors.
+_SVG_COLORS = {"lightskyblue2": "#a4d3ee"}
+
+_FONT_SIZE = 14
+_CHAR_WIDTH = 7.5
+_NODE_HEIGHT = 36
+_H_GAP, _V_GAP, _MARGIN, _SKEW = 24, 48, 20, 12
+
+
+class ExportException(RunnerException):
+    """An image export error occurred."""
+
+
+def has_graphviz() -> bool:
+    # networkx converts the diagrams for pygraphviz, see `Justification.export_to_image`.
+    return all(importlib.util.find_spec(m) is not None for m in ("pygraphviz", "networkx"))
+
+
+def resolve_renderer(renderer: str, fmt: str) -> str:
+    """Resolve the `auto` renderer: Graphviz when installed, except for
+    DOT text, which never needs it."""
+    if renderer != "auto":
+        return renderer
+    if fmt in ("dot", "gv") or not has_graphviz():
+        return "builtin"
+    return "graphviz"
+
+
+def graph_hash(jd: Any, fmt: str, renderer: str, dpi: int) -> str:
+    """Hash the structure and drawn attributes of a diagram, along with the
+    render options, e.g. as the key of its cached render."""
+    data = [RENDER_VERSION, fmt, renderer, dpi, jd.name,
+            [(n, d['label'], d['var_type'].value) for n, d in jd.nodes(data=True)],
+            jd.edges]
+    return hashlib.sha256(json.dumps(data).encode('utf-8')).hexdigest()
+
+
+def _dot_id(s: str) -> str:
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def to_dot(jd: Any, dpi: Optional[int] = None) -> str:
+    """Write a diagram as Graphviz DOT text, drawn as `export_to_image` does."""
+    graph = dict(size="5", rankdir="BT", label=jd.name, fontsize="15", labelloc="b")
+    if dpi is not None:
+        graph['dpi'] = str(dpi)
+    lines = [f"digraph {_dot_id(jd.name)} {{",
+             "    graph [" + ", ".join(f"{k}={_dot_id(v)}" for k, v in graph.items()) + "];",
+             '    edge [color="black", arrowhead="normal"];']
+    for n, d in jd.nodes(data=True):
+        attr = dict(label=d['label'], **jd.node_attr_map[d['var_type']])
+        lines.append(f"    {_dot_id(n)} [" + ", ".join(f"{k}={_dot_id(v)}" for k, v in attr.items()) + "];")
+    for u, v in jd.edges:
+        lines.append(f"    {_dot_id(u)} -> {_dot_id(v)};")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _xml_attr(s: str) -> str:
+    return '"' + escape(s, quote=True) + '"'
+
+
+def _layers(jd: Any) -> list[list[str]]:
+    # longest path ranks, from the evidence up to the conclusion.
+    order = list(jd.justify_order())
+    rank = {}
+    for n in order:
+        rank[n] = max((rank[p] + 1 for p in jd.predecessors(n)), default=0)
+    # sources right below their lowest successor, to keep edges short.
+    for n in order:
+        if jd.in_degree(n) == 0 and jd.out_degree(n):
+            rank[n] = min(rank[s] for s in jd.successors(n)) - 1
+    layers = [[] for _ in range(max(rank.values(), default=-1) + 1)]
+    for n in order:
+        layers[rank[n]].append(n)
+
+    # reduce crossings, sorting the layers by the barycenter of their
+    # neighbours, sweeping up then down.
+    position = {n: i for layer in layers for i, n in enumerate(layer)}
+    for sweep in range(4):
+        up = sweep % 2 == 0
+        neighbours = jd.predecessors if up else jd.successors
+        for r in (range(1, len(layers)) if up else range(len(layers) - 2, -1, -1)):
+            def barycenter(n: str) -> float:
+                ps = [position[m] for m in neighbours(n)]
+                return sum(ps) / len(ps) if ps else position[n]
+
+            layers[r].sort(key=barycenter)
+            for i, n in enumerate(layers[r]):
+                position[n] = i
+    return layers
+
+
+def to_svg(jd: Any) -> str:
+    """Write a diagram as SVG text, with a simple layered layout, from the
+    evidence at the bottom up to the conclusion at the top."""
+    layers = _layers(jd)
+    width = {n: max(60.0, _CHAR_WIDTH * len(d['label']) + 24
+                    + (2 * _SKEW if d['var_type'] == VariableType.STRATEGY else 0))
+             for n, d in jd.nodes(data=True)}
+    layer_widths = [sum(width[n] for n in layer) + _H_GAP * (len(layer) - 1) for layer in layers]
+    title_width = _CHAR_WIDTH * len(jd.name)
+    canvas = max(layer_widths + [title_width])
+    height = 2 * _MARGIN + len(layers) * (_NODE_HEIGHT + _V_GAP) + _FONT_SIZE
+
+    center = {}
+    for r, layer in enumerate(layers):
+        x = _MARGIN + (canvas - layer_widths[r]) / 2
+        y = _MARGIN + (len(layers) - 1 - r) * (_NODE_HEIGHT + _V_GAP) + _NODE_HEIGHT / 2
+        for n in layer:
+            center[n] = (x + width[n] / 2, y)
+            x += width[n] + _H_GAP
+
+    total_width = canvas + 2 * _MARGIN
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{total_width:.0f}" height="{height:.0f}"'
+             f' viewBox="0 0 {total_width:.0f} {height:.0f}" font-family="sans-serif">',
+             '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8"'
+             ' markerHeight="8" orient="auto"><path d="M0,0 L10,5 L0,10 z" fill="black"/></marker></defs>',
+             f'<rect width="{total_width:.0f}" height="{height:.0f}" fill="white"/>']
+
+    for u, v in jd.edges:
+        (x1, y1), (x2, y2) = center[u], center[v]
+        lines.append(f'<line x1="{x1:.1f}" y1="{y1 - _NODE_HEIGHT / 2:.1f}" x2="{x2:.1f}"'
+                     f' y2="{y2 + _NODE_HEIGHT / 2:.1f}" stroke="black" marker-end="url(#arrow)"/>')
+
+    for n, d in jd.nodes(data=True):
+        attr = jd.node_attr_map[d['var_type']]
+        fill = _SVG_COLORS.get(c := attr.get('fillcolor'), c) if attr.get('style') == "filled" else "white"
+        stroke = _SVG_COLORS.get(c := attr.get('color', "black"), c)
+        (x, y), w, h = center[n], width[n], _NODE_HEIGHT
+        left, top = x - w / 2, y - h / 2
+        if attr.get('shape') == "parallelogram":
+            points = [(left + _SKEW, top), (left + w, top), (left + w - _SKEW, top + h), (left, top + h)]
+            shape = '<polygon points="' + " ".join(f"{px:.1f},{py:.1f}" for px, py in points) + '"'
+        else:
+            shape = f'<rect x="{left:.1f}" y="{top:.1f}" width="{w:.1f}" height="{h:.1f}"'
+        lines.append(f'<g id={_xml_attr(n)}><title>{escape(n)}</title>'
+                     f'{shape} fill="{fill}" stroke="{stroke}"/>'
+                     f'<text x="{x:.1f}" y="{y:.1f}" text-anchor="middle" dominant-baseline="central"'
+                     f' font-size="{_FONT_SIZE}">{escape(d["label"])}</text></g>')
+
+    lines.append(f'<text x="{total_width / 2:.1f}" y="{height - _MARGIN:.1f}" text-anchor="middle"'
+                 f' font-size="15">{escape(jd.name)}</text>')
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+
+def render(jd: Any, fmt: str, renderer: str = "auto", dpi: int = 500) -> bytes:
+    """Render a diagram into an image of the given format."""
+    renderer = resolve_renderer(renderer, fmt)
+    if renderer == "graphviz":
+        return jd.export_to_image(format=fmt, dpi=dpi)
+    match fmt:
+        case "dot" | "gv":
+            return to_dot(jd, dpi=dpi).encode('utf-8')
+        case "svg":
+            return to_svg(jd).encode('utf-8')
+    raise ExportException(f"format '{fmt}' requires pygraphviz, "
+                          f"the built-in renderer only writes {', '.join(BUILTIN_FORMATS)}")
+
+
+def output_path(output: str, name: str) -> str:
+    """The output path of a diagram, `{name}` being replaced by its name made
+    safe for a filename, e.g. `docs/{name}.svg`."""
+    return output.replace("{name}", re.sub(r"[^\w.-]+", "_", name))
+
+
+def _write(path: str, data: bytes) -> bool:
+    # unchanged images are left untouched, e.g. for incremental docs builds.
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # written to a temporary file, then renamed over the image, so that
+    # concurrent readers and interrupted runs never see a partial image.
+    fd, tmp = tempfile.mkstemp(dir=directory or os.curdir, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates private files, images get the default permissions.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def export_diagrams(justifications: Mapping[str, Any],
+                    output: str,
+                    /,
+                    fmt: Optional[str] = None,
+                    renderer: str = "auto",
+                    dpi: int = 500,
+                    jobs: int = 1,
+                    cache_dir: Optional[str] = None,
+                    ) -> Iterator[tuple[str, str, bool]]:
+    """Export diagrams to images, yielding `(name, path, cached)` for each
+    one in order.
+
+    The output is a path, where `{name}` is replaced by the name of each
+    diagram, or `stdout`/`stderr` for a single diagram. The format defaults
+    to the extension of the output. Diagrams missing from the cache are
+    rendered in parallel, in up to `jobs` forked processes.
+    """
+    names = list(justifications)
+    if len(names) > 1 and "{name}" not in output:
+        raise ExportException("several diagrams found, use {name} in the output path to export them all")
+    if fmt is None:
+        _, ext = os.path.splitext(output)
+        fmt = ext[1:].lower() or ("png" if has_graphviz() else "svg")
+    renderer = resolve_renderer(renderer, fmt)
+
+    keys = {n: graph_hash(justifications[n], fmt, renderer, dpi) for n in names}
+    images: dict[str, bytes] = {}
+    if cache_dir is not None:
+        for n in names:
+            try:
+                with open(os.path.join(cache_dir, f"{keys[n]}.{fmt}"), 'rb') as f:
+                    images[n] = f.read()
+            except OSError:
+                pass
+
+    def render_chunk(chunk: list[str]) -> list[bytes | BaseException]:
+        # an exception is returned in place of its image.
+        results = []
+        for n in chunk:
+            try:
+                results.append(render(justifications[n], fmt, renderer, dpi))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    missing = [n for n in names if n not in images]
+    server = None
+    if len(missing) > 1 and jobs > 1:
+        from jpipe_runner.forkserver import ForkServer
+
+        try:
+            server = ForkServer()
+        except RuntimeException:
+            pass  # rendered one after the other.
+
+    if server is None:
+        results = render_chunk(missing)
+    else:
+        # a few chunks per process, so that forks are not more costly than renders.
+        size = -(-len(missing) // (jobs * 4))
+        chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+        results = itertools.chain.from_iterable(
+            [result] * len(chunk) if isinstance(result, BaseException) else result
+            for chunk, result in zip(chunks, server.imap(render_chunk, chunks, jobs=jobs)))
+    rendered = dict(zip(missing, results))
+
+    for n in names:
+        if isinstance(image := rendered.get(n, images.get(n)), BaseException):
+            raise ExportException(f"cannot export diagram '{n}': {image}") from image
+        if n in rendered and cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            _write(os.path.join(cache_dir, f"{keys[n]}.{fmt}"), image)
+        match output:
+            case "stdout" | "STDOUT" | "stderr" | "STDERR":
+                stream = sys.stdout if output.lower() == "stdout" else sys.stderr
+                stream.buffer.write(image)
+                stream.flush()
+                path = output.lower()
+            case _:
+                _write(path := output_path(output, n), image)
+        yield n, path, n not in rendered
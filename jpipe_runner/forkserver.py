@@ -0,0 +1,230 @@
+"""
+jpipe_runner.forkserver
+~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the fork server used to isolate justifications.
+"""
+
+import os
+import pickle
+import select
+import selectors
+import signal
+import struct
+import sys
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from jpipe_runner.exceptions import CheckTimeoutError, RuntimeException
+
+# Frame kinds sent from a forked child back to the template process.
+_ITEM = 0
+_ERROR = 1
+
+_HEADER = struct.Struct("!BI")
+
+
+class _Unpicklable:
+    """Stand-in for a result that cannot be sent back over the pipe."""
+
+    def __init__(self, value: Any):
+        self._repr = repr(value)
+        self._truth = bool(value)
+
+    def __bool__(self) -> bool:
+        return self._truth
+
+    def __repr__(self) -> str:
+        return self._repr
+
+
+def _dumps(kind: int, obj: Any) -> bytes:
+    try:
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        if kind == _ERROR:
+            obj = RuntimeException(f"{type(obj).__name__}: {obj}")
+        else:
+            obj = _Unpicklable(obj)
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(kind, len(payload)) + payload
+
+
+def _read_exactly(fd: int, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = os.read(fd, size)
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _call(fn: Callable, *args, **kwargs) -> Iterator[Any]:
+    yield fn(*args, **kwargs)
+
+
+class ForkServer:
+    """Run work in copy-on-write forks of a pre-warmed template process.
+
+    The process owning the server acts as the template: libraries are
+    imported and variables are set once, then every task runs in a
+    ``fork()``ed child sharing the warm memory pages copy-on-write, so
+    any state a task leaves behind dies with its child.
+    """
+
+    def __init__(self):
+        if not hasattr(os, "fork"):
+            raise RuntimeException(
+                "fork server isolation is not supported on this platform")
+
+    @staticmethod
+    def _fork(fn: Callable[..., Iterable[Any]], args, kwargs) -> tuple[int, int]:
+        # flush buffered output, otherwise the child would print it again.
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child
+            status = 0
+            try:
+                os.close(r)
+                try:
+                    for item in fn(*args, **kwargs):
+                        os.write(w, _dumps(_ITEM, item))
+                except BaseException as e:
+                    os.write(w, _dumps(_ERROR, e))
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+
+        os.close(w)
+        return pid, r
+
+    @staticmethod
+    def _frames(pid: int, r: int) -> Iterator[tuple[int, Any]]:
+        try:
+            while True:
+                try:
+                    kind, size = _HEADER.unpack(_read_exactly(r, _HEADER.size))
+                except EOFError:
+                    break
+                yield kind, pickle.loads(_read_exactly(r, size))
+        finally:
+            os.close(r)
+            _, status = os.waitpid(pid, 0)
+        if (code := os.waitstatus_to_exitcode(status)) != 0:
+            raise RuntimeException(f"forked process {pid} exited with status {code}")
+
+    @staticmethod
+    def _result(pid: int, r: int, data: bytes) -> Any:
+        # the frames of a `_call` child, which were read in full.
+        os.close(r)
+        _, status = os.waitpid(pid, 0)
+        result, offset = None, 0
+        while offset < len(data):
+            kind, size = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            result = pickle.loads(data[offset:offset + size])
+            offset += size
+            if kind == _ERROR:
+                return result
+        if (code := os.waitstatus_to_exitcode(status)) != 0:
+            return RuntimeException(f"forked process {pid} exited with status {code}")
+        return result
+
+    def imap(self, fn: Callable[[Any], Any], items: Iterable[Any], jobs: int = 1) -> Iterator[Any]:
+        """Call ``fn(item)`` for each item in a forked child of its own, with at
+        most ``jobs`` children at once, yielding the results in order.
+
+        The exception raised by a child, or a `RuntimeException` for a child
+        exiting abnormally, is yielded in place of its result.
+        """
+        selector = selectors.DefaultSelector()
+        running: dict[int, tuple[int, int, list[bytes]]] = {}
+        done: dict[int, Any] = {}
+        items = enumerate(items)
+        exhausted, next_index = False, 0
+        try:
+            while True:
+                while not exhausted and len(running) < max(jobs, 1):
+                    if (entry := next(items, None)) is None:
+                        exhausted = True
+                        break
+                    i, item = entry
+                    pid, r = self._fork(_call, (fn, item), {})
+                    running[r] = (i, pid, [])
+                    selector.register(r, selectors.EVENT_READ)
+                if not running:
+                    break
+                for key, _ in selector.select():
+                    if chunk := os.read(key.fd, 1 << 16):
+                        running[key.fd][2].append(chunk)
+                        continue
+                    selector.unregister(key.fd)
+                    i, pid, chunks = running.pop(key.fd)
+                    done[i] = self._result(pid, key.fd, b"".join(chunks))
+                while next_index in done:
+                    yield done.pop(next_index)
+                    next_index += 1
+        finally:
+            # children left running when closed early exit on a broken pipe.
+            for r, (_, pid, _) in running.items():
+                os.close(r)
+                os.waitpid(pid, 0)
+            selector.close()
+
+    def iterate(self, fn: Callable[..., Iterable[Any]], *args, **kwargs) -> Iterator[Any]:
+        """Iterate ``fn(*args, **kwargs)`` in a forked child, streaming its items back."""
+        yield from self._iterate(self._fork(fn, args, kwargs))
+
+    def _iterate(self, child: tuple[int, int]) -> Iterator[Any]:
+        for kind, obj in self._frames(*child):
+            if kind == _ERROR:
+                raise obj
+            yield obj
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Call ``fn(*args, **kwargs)`` in a forked child and return its result.
+
+        The child is killed, raising a CheckTimeoutError, when it has not returned
+        its result after ``timeout`` seconds.
+        """
+        pid, r = self._fork(_call, (fn,) + args, kwargs)
+        if timeout is not None and not select.select([r], [], [], timeout)[0]:
+            os.kill(pid, signal.SIGKILL)
+            os.close(r)
+            os.waitpid(pid, 0)
+            raise CheckTimeoutError(f"forked process {pid} timed out after {timeout}s")
+        result = None
+        for result in self._iterate((pid, r)):
+            pass
+        return result
+
+
+class ForkedRuntime:
+    """A runtime proxy that calls every function in a fresh fork of the template runtime."""
+
+    def __init__(self, runtime: Any, server: ForkServer):
+        self._runtime = runtime
+        self._server = server
+
+    def __getattr__(self, name):
+        return getattr(self._runtime, name)
+
+    def call_function(self, name: str, *args, **kwargs) -> Any:
+        return self._server.call(self._runtime.call_function, name, *args, **kwargs)
+
+    def call_check(self, name: str, timeout: Optional[float] = None) -> Any:
+        # the fork of a timed out function is killed.
+        try:
+            return self._server.call(self._runtime.call_function, name, timeout=timeout)
+        except CheckTimeoutError:
+            raise CheckTimeoutError(f"function '{name}' timed out after {timeout}s") from None
+
+    def call_batch(self, name: str, variable_sets: list[dict[str, Any]]) -> list[Any]:
+        return self._server.call(self._runtime.call_batch, name, variable_sets)
@@ -0,0 +1,284 @@
+"""
+jpipe_runner.graph
+~~~~~~~~~~~~~~~~~~
+
+This module contains the compact graph core of jPipe Runner.
+"""
+
+from array import array
+from collections import deque
+from collections.abc import MutableMapping
+from typing import Any, Iterable, Iterator
+
+_MISSING = object()
+
+
+class NodeAttributes(MutableMapping):
+    """A mutable view of the attributes of a node, stored in columns."""
+
+    __slots__ = ("_graph", "_id")
+
+    def __init__(self, graph: "DiGraph", node_id: int):
+        self._graph = graph
+        self._id = node_id
+
+    def __getitem__(self, key: str) -> Any:
+        if (value := self._graph._columns[key][self._id]) is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._graph._column(key)[self._id] = value
+
+    def __delitem__(self, key: str) -> None:
+        column = self._graph._columns.get(key)
+        if column is None or column[self._id] is _MISSING:
+            raise KeyError(key)
+        column[self._id] = _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return (k for k, column in self._graph._columns.items()
+                if column[self._id] is not _MISSING)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class NodeView:
+    """A view of the nodes of a graph, in the spirit of `networkx.NodeView`.
+
+    >>> g.nodes[n]['status']           # attributes of a node
+    >>> g.nodes(data=True)             # (node, attributes) pairs
+    """
+
+    __slots__ = ("_graph",)
+
+    def __init__(self, graph: "DiGraph"):
+        self._graph = graph
+
+    def __call__(self, data: bool = False) -> Iterable[str | tuple[str, NodeAttributes]]:
+        if not data:
+            return iter(self)
+        return ((n, NodeAttributes(self._graph, i))
+                for i, n in enumerate(self._graph._names))
+
+    def __getitem__(self, node: str) -> NodeAttributes:
+        return NodeAttributes(self._graph, self._graph._index[node])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._graph._names)
+
+    def __len__(self) -> int:
+        return len(self._graph._names)
+
+    def __contains__(self, node: object) -> bool:
+        return node in self._graph._index
+
+
+class DiGraph:
+    """A compact directed graph, implementing the small subset of the
+    `networkx.DiGraph` API used by jPipe Runner.
+
+    Nodes are numbered in insertion order through a name <-> id table, their
+    attributes are stored in columns, and edges are kept in an array of
+    packed `(source << 32 | target)` integers, from which CSR-style
+    successor and predecessor arrays are built on the first query.
+
+    As with networkx, successors and predecessors are in the order their
+    edges were first added, and edges are grouped by source in node order.
+    """
+
+    __slots__ = ("name", "_names", "_index", "_columns", "_edges", "_csr", "__weakref__")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._names: list[str] = []
+        self._index: dict[str, int] = {}
+        self._columns: dict[str, list] = {}
+        self._edges = array('Q')
+        self._csr = None
+
+    def _column(self, key: str) -> list:
+        if (column := self._columns.get(key)) is None:
+            column = self._columns[key] = [_MISSING] * len(self._names)
+        return column
+
+    def _id(self, node: str) -> int:
+        if (i := self._index.get(node)) is None:
+            self._index[node] = i = len(self._names)
+            self._names.append(node)
+            for column in self._columns.values():
+                column.append(_MISSING)
+        return i
+
+    def add_node(self, node: str, **attr) -> None:
+        i = self._id(node)
+        for k, v in attr.items():
+            self._column(k)[i] = v
+
+    def add_edge(self, u: str, v: str) -> None:
+        self._edges.append(self._id(u) << 32 | self._id(v))
+        self._csr = None
+
+    def add_edges_from(self, edges: Iterable[tuple[str, str]]) -> None:
+        for u, v in edges:
+            self.add_edge(u, v)
+
+    def _build(self) -> tuple[array, array, array, array]:
+        if self._csr is None:
+            n = len(self._names)
+            # deduplicated, in insertion order.
+            self._edges = edges = array('Q', dict.fromkeys(self._edges))
+            succ_ptr, pred_ptr = array('I', bytes(4 * (n + 1))), array('I', bytes(4 * (n + 1)))
+            for e in edges:
+                succ_ptr[(e >> 32) + 1] += 1
+                pred_ptr[(e & 0xFFFFFFFF) + 1] += 1
+            for i in range(n):
+                succ_ptr[i + 1] += succ_ptr[i]
+                pred_ptr[i + 1] += pred_ptr[i]
+            # stable counting sorts, by source and by target.
+            succ, pred = array('I', bytes(4 * len(edges))), array('I', bytes(4 * len(edges)))
+            succ_fill, pred_fill = array('I', succ_ptr), array('I', pred_ptr)
+            for e in edges:
+                u, v = e >> 32, e & 0xFFFFFFFF
+                succ[succ_fill[u]] = v
+                succ_fill[u] += 1
+                pred[pred_fill[v]] = u
+                pred_fill[v] += 1
+            self._csr = succ_ptr, succ, pred_ptr, pred
+        return self._csr
+
+    def _successor_ids(self, i: int) -> array:
+        succ_ptr, succ, _, _ = self._build()
+        return succ[succ_ptr[i]:succ_ptr[i + 1]]
+
+    def _predecessor_ids(self, i: int) -> array:
+        _, _, pred_ptr, pred = self._build()
+        return pred[pred_ptr[i]:pred_ptr[i + 1]]
+
+    @property
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    @property
+    def edges(self) -> list[tuple[str, str]]:
+        succ_ptr, succ, _, _ = self._build()
+        names = self._names
+        return [(names[i], names[succ[k]])
+                for i in range(len(names)) for k in range(succ_ptr[i], succ_ptr[i + 1])]
+
+    def __contains__(self, node: object) -> bool:
+        return node in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def number_of_nodes(self) -> int:
+        return len(self._names)
+
+    def number_of_edges(self) -> int:
+        return len(self._build()[1])
+
+    def successors(self, node: str) -> Iterator[str]:
+        names = self._names
+        return (names[j] for j in self._successor_ids(self._index[node]))
+
+    def predecessors(self, node: str) -> Iterator[str]:
+        names = self._names
+        return (names[j] for j in self._predecessor_ids(self._index[node]))
+
+    def in_degree(self, node: str) -> int:
+        _, _, pred_ptr, _ = self._build()
+        i = self._index[node]
+        return pred_ptr[i + 1] - pred_ptr[i]
+
+    def out_degree(self, node: str) -> int:
+        succ_ptr, _, _, _ = self._build()
+        i = self._index[node]
+        return succ_ptr[i + 1] - succ_ptr[i]
+
+    def is_directed_acyclic_graph(self) -> bool:
+        succ_ptr, succ, pred_ptr, _ = self._build()
+        n = len(self._names)
+        in_degree = array('I', (pred_ptr[i + 1] - pred_ptr[i] for i in range(n)))
+        queue = deque(i for i in range(n) if in_degree[i] == 0)
+        visited = 0
+        while queue:
+            i = queue.popleft()
+            visited += 1
+            for j in succ[succ_ptr[i]:succ_ptr[i + 1]]:
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    queue.append(j)
+        return visited == n
+
+    def ancestors(self, node: str) -> set[str]:
+        """Return all the nodes having a path to the node."""
+        _, _, pred_ptr, pred = self._build()
+        start = self._index[node]
+        seen = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for j in pred[pred_ptr[i]:pred_ptr[i + 1]]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        seen.discard(start)
+        return {self._names[i] for i in seen}
+
+    def copy(self) -> "DiGraph":
+        graph = type(self)(name=self.name)
+        graph._names = list(self._names)
+        graph._index = dict(self._index)
+        graph._columns = {k: list(v) for k, v in self._columns.items()}
+        graph._edges = array('Q', self._edges)
+        graph._csr = self._csr  # arrays are never mutated in place.
+        return graph
+
+    def arrays(self) -> tuple[Any, Any, Any, Any, Any]:
+        """Return the packed edges and the CSR successor and predecessor arrays."""
+        succ_ptr, succ, pred_ptr, pred = self._build()
+        return self._edges, succ_ptr, succ, pred_ptr, pred
+
+    @classmethod
+    def from_arrays(cls,
+                    name: str,
+                    names: list[str],
+                    columns: dict[str, list],
+                    arrays: tuple[Any, Any, Any, Any, Any],
+                    sparse: Iterable[str] = (),
+                    ) -> "DiGraph":
+        """Build a graph from attribute columns and the arrays returned by
+        `arrays`, which may be read-only buffers (e.g. memoryviews of a mapped
+        file) as long as no edge is added to the graph. None values of the
+        `sparse` columns are missing attributes."""
+        graph = cls(name=name)
+        graph._names = names
+        graph._index = {n: i for i, n in enumerate(names)}
+        graph._columns = columns
+        for key in sparse:
+            if key in columns:
+                columns[key] = [_MISSING if v is None else v for v in columns[key]]
+        graph._edges, *csr = arrays
+        graph._csr = tuple(csr)
+        return graph
+
+    def to_networkx(self):
+        """Convert the graph to a `networkx.DiGraph`."""
+        try:
+            import networkx as nx
+        except ImportError as e:
+            raise ImportError("networkx is required to convert a graph, "
+                              "install it with the `export` extra") from e
+
+        graph = nx.DiGraph(name=self.name)
+        graph.add_nodes_from(self.nodes(data=True))
+        graph.add_edges_from(self.edges)
+        return graph
@@ -0,0 +1,258 @@
+"""
+jpipe_runner.history
+~~~~~~~~~~~~~~~~~~~~
+
+This module contains the run-history store of jPipe Runner.
+
+Runs with `--history DIR` record their justifications and nodes into the
+SQLite database `DIR/history.sqlite3`, along with hashes of their models,
+libraries and variables, so that `jpipe-runner history` can query them
+across runs: slowest functions, duration trends, flaky checks and cache hit
+rates. Results are written at the end of a run, in one transaction.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Iterable, Optional
+
+from jpipe_runner.exceptions import RunnerException
+from jpipe_runner.report import RunReport
+
+HISTORY_FILENAME = "history.sqlite3"
+HISTORY_VERSION = 2
+# rows inserted per statement.
+BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    shard TEXT,
+    model_hash TEXT NOT NULL,
+    library_hash TEXT NOT NULL,
+    variables_hash TEXT NOT NULL,
+    exit_code INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS diagrams (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    status TEXT,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    diagram TEXT NOT NULL,
+    name TEXT NOT NULL,
+    var_type TEXT NOT NULL,
+    function TEXT,
+    status TEXT NOT NULL,
+    exception TEXT,
+    duration REAL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    replayed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS nodes_run ON nodes(run_id);
+CREATE INDEX IF NOT EXISTS nodes_function ON nodes(function);
+"""
+
+QUERIES = ("slowest", "trends", "flaky", "cache")
+
+
+class HistoryException(RunnerException):
+    pass
+
+
+def hash_files(filenames: Iterable[str]) -> str:
+    """Hash the paths and contents of files, in a stable order."""
+    digest = hashlib.sha256()
+    for filename in sorted(os.path.abspath(f) for f in filenames):
+        digest.update(filename.encode('utf-8') + b"\0")
+        with open(filename, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def hash_variables(variables: Iterable[Iterable[str]]) -> str:
+    return hashlib.sha256(json.dumps(sorted(map(list, variables))).encode('utf-8')).hexdigest()
+
+
+class RunHistory:
+    """A SQLite store of the results of past runs."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.filename = os.path.join(directory, HISTORY_FILENAME)
+        try:
+            self._db = sqlite3.connect(self.filename)
+            self._db.row_factory = sqlite3.Row
+            # readers (e.g. `jpipe-runner history`) do not block concurrent runs.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, 1, HISTORY_VERSION):
+                raise HistoryException(f"unsupported history version in '{self.filename}': {version}")
+            with self._db:
+                if version == 1:
+                    # results replayed from the memo of a run were recorded as cached.
+                    self._db.execute("ALTER TABLE nodes ADD COLUMN replayed INTEGER NOT NULL DEFAULT 0")
+                self._db.executescript(_SCHEMA)
+                self._db.execute(f"PRAGMA user_version={HISTORY_VERSION}")
+        except sqlite3.Error as e:
+            raise HistoryException(f"cannot open history '{self.filename}': {e}") from e
+
+    def __enter__(self) -> "RunHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def record(self,
+               report: RunReport,
+               started: float,
+               model_hash: str,
+               library_hash: str,
+               variables_hash: str,
+               ) -> int:
+        """Record the results of a run, returning its id."""
+        diagrams = [(d['name'], d['status'], d.get('duration')) for d in report.diagrams]
+        nodes = [(d['name'], n['name'], n['var_type'], n.get('function'), n['status'],
+                  n.get('exception'), n.get('duration'), int(bool(n.get('cached'))),
+                  int(bool(n.get('replayed'))))
+                 for d in report.diagrams for n in d['nodes']]
+        try:
+            with self._db:
+                run_id = self._db.execute(
+                    "INSERT INTO runs (started, duration, shard, model_hash, library_hash,"
+                    " variables_hash, exit_code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (started, time.time() - started, report.shard,
+                     model_hash, library_hash, variables_hash, report.exit_code),
+                ).lastrowid
+                for i in range(0, len(diagrams), BATCH_SIZE):
+                    self._db.executemany("INSERT INTO diagrams VALUES (?, ?, ?, ?)",
+                                         [(run_id, *d) for d in diagrams[i:i + BATCH_SIZE]])
+                for i in range(0, len(nodes), BATCH_SIZE):
+                    self._db.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                         [(run_id, *n) for n in nodes[i:i + BATCH_SIZE]])
+        except sqlite3.Error as e:
+            raise HistoryException(f"cannot record run in '{self.filename}': {e}") from e
+        return run_id
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+        try:
+            return [dict(row) for row in self._db.execute(sql, params)]
+        except sqlite3.Error as e:
+            raise HistoryException(f"cannot query history '{self.filename}': {e}") from e
+
+    def slowest(self, limit: int = 20, runs: Optional[int] = None) -> list[dict[str, Any]]:
+        """The functions with the longest mean duration of their non-cached calls."""
+        return self._query(
+            "SELECT function, COUNT(*) AS calls, AVG(duration) AS mean,"
+            " MAX(duration) AS max, SUM(duration) AS total"
+            " FROM nodes WHERE function IS NOT NULL AND duration IS NOT NULL AND NOT cached AND NOT replayed"
+            " AND run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)"
+            " GROUP BY function ORDER BY mean DESC LIMIT ?",
+            (runs or -1, limit))
+
+    def trends(self, limit: int = 20, runs: Optional[int] = None) -> list[dict[str, Any]]:
+        """The functions whose mean duration grew the most, from the older half
+        to the newer half of the runs calling them."""
+        series: dict[str, list[tuple[int, float]]] = {}
+        for row in self._query(
+                "SELECT function, run_id, AVG(duration) AS mean"
+                " FROM nodes WHERE function IS NOT NULL AND duration IS NOT NULL AND NOT cached AND NOT replayed"
+                " AND run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)"
+                " GROUP BY function, run_id ORDER BY function, run_id",
+                (runs or -1,)):
+            series.setdefault(row['function'], []).append((row['run_id'], row['mean']))
+
+        trends = []
+        for function, points in series.items():
+            if len(points) < 2:
+                continue
+            half = len(points) // 2
+            before = sum(m for _, m in points[:half]) / half
+            after = sum(m for _, m in points[half:]) / (len(points) - half)
+            trends.append(dict(function=function,
+                               runs=len(points),
+                               before=before,
+                               after=after,
+                               change=(after - before) / before if before else 0.0,
+                               durations=[m for _, m in points]))
+        trends.sort(key=lambda t: t['change'], reverse=True)
+        return trends[:limit]
+
+    def flaky(self, limit: int = 20, runs: Optional[int] = None) -> list[dict[str, Any]]:
+        """The checks which both passed and failed on the same model, library
+        and variables, by their number of status flips between runs."""
+        return self._query(
+            "WITH checks AS (SELECT n.diagram, n.name, n.function, n.status, n.exception, n.run_id,"
+            "   r.model_hash, r.library_hash, r.variables_hash,"
+            "   LAG(n.status) OVER (PARTITION BY n.diagram, n.name, r.model_hash,"
+            "     r.library_hash, r.variables_hash ORDER BY n.run_id) AS previous"
+            "  FROM nodes n JOIN runs r ON r.id = n.run_id"
+            "  WHERE n.function IS NOT NULL AND n.status IN ('PASS', 'FAIL') AND NOT n.cached AND NOT n.replayed"
+            "  AND n.run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?))"
+            " SELECT diagram, name, function,"
+            "  SUM(status = 'PASS') AS passed, SUM(status = 'FAIL') AS failed,"
+            "  SUM(previous IS NOT NULL AND previous != status) AS flips,"
+            "  MAX(run_id) AS last_run, MAX(exception) AS exception"
+            " FROM checks GROUP BY diagram, name, model_hash, library_hash, variables_hash"
+            " HAVING passed > 0 AND failed > 0"
+            " ORDER BY flips DESC, failed DESC LIMIT ?",
+            (runs or -1, limit))
+
+    def cache_hits(self, limit: int = 20, runs: Optional[int] = None) -> list[dict[str, Any]]:
+        """The cache hit rate of the functions whose results were cached at
+        least once, leaving out the results replayed from the memo of a run."""
+        return self._query(
+            "SELECT function, COUNT(*) AS calls, SUM(cached) AS hits,"
+            " CAST(SUM(cached) AS REAL) / COUNT(*) AS rate"
+            " FROM nodes WHERE function IS NOT NULL AND status != 'SKIP' AND NOT replayed"
+            " AND run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)"
+            " GROUP BY function HAVING hits > 0 ORDER BY rate DESC, calls DESC LIMIT ?",
+            (runs or -1, limit))
+
+    def query(self, name: str, limit: int = 20, runs: Optional[int] = None) -> list[dict[str, Any]]:
+        match name:
+            case "slowest":
+                return self.slowest(limit, runs)
+            case "trends":
+                return self.trends(limit, runs)
+            case "flaky":
+                return self.flaky(limit, runs)
+            case "cache":
+                return self.cache_hits(limit, runs)
+        raise HistoryException(f"unknown history query '{name}', expected one of {', '.join(QUERIES)}")
+
+
+def format_history(name: str, rows: list[dict[str, Any]]) -> str:
+    """Format the rows of a history query as human-readable text."""
+    if not rows:
+        return f"No {name} results in the history"
+    match name:
+        case "slowest":
+            lines = [f"{'mean':>9} {'max':>9} {'total':>10} {'calls':>6}  function"]
+            lines += [f"{r['mean']:8.3f}s {r['max']:8.3f}s {r['total']:9.3f}s {r['calls']:6}  {r['function']}"
+                      for r in rows]
+        case "trends":
+            lines = [f"{'change':>8} {'before':>9} {'after':>9} {'runs':>5}  function"]
+            lines += [f"{r['change']:+8.1%} {r['before']:8.3f}s {r['after']:8.3f}s {r['runs']:5}  {r['function']}"
+                      for r in rows]
+        case "flaky":
+            lines = [f"{'flips':>5} {'pass':>5} {'fail':>5}  check"]
+            for r in rows:
+                lines.append(f"{r['flips']:5} {r['passed']:5} {r['failed']:5}  "
+                             f"{r['diagram']} :: {r['name']} ({r['function']})")
+                if r['exception']:
+                    lines.append(f"{'':18}exception: {r['exception']}")
+        case _:
+            lines = [f"{'rate':>6} {'hits':>6} {'calls':>6}  function"]
+            lines += [f"{r['rate']:6.1%} {r['hits']:6} {r['calls']:6}  {r['function']}" for r in rows]
+    return "\n".join(lines)
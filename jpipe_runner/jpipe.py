@@ -5,29 +5,97 @@ jpipe_runner.jpipe
 This module contains the core of jPipe Runner.
 """
 
+import os
+import threading
+import time
+import weakref
 from collections import deque
-from copy import deepcopy
+from collections.abc import Mapping
 from typing import (Any,
                     Optional,
                     Callable,
                     Iterable,
                     Iterator)
 
-import networkx as nx
-
+from jpipe_runner.compiled import CompiledDiagram, CompiledModel
 from jpipe_runner.enums import (ClassType,
                                 VariableType,
                                 StatusType)
 from jpipe_runner.exceptions import (InvalidJustificationException,
                                      JustificationTraverseException,
-                                     FunctionException)
-from jpipe_runner.models import JustificationDef, ClassDef
-from jpipe_runner.parser import load_jd_file, parse_jd_json_file
+                                     FunctionException,
+                                     CheckTimeoutError)
+from jpipe_runner.graph import DiGraph
+from jpipe_runner.library import CheckSpec
+from jpipe_runner.models import JustificationDef, ClassDef, ModelDef, CompositionInfo
+from jpipe_runner.parser import ModelCache, detect_model_format, load_jd_file
 from jpipe_runner.runtime import PythonRuntime
+from jpipe_runner.scheduler import Scheduler
 from jpipe_runner.utils import sanitize_string
 
 
-class Justification(nx.DiGraph):
+def validate_node(n: str,
+                  var_type: VariableType,
+                  in_degree: int,
+                  successors: tuple[str, ...],
+                  var_type_of: Callable[[str], VariableType],
+                  reaches: Callable[[str], bool],
+                  conclusion: str,
+                  ) -> None:
+    """Validate a node of a justification from its neighbourhood."""
+    match var_type:
+        case VariableType.EVIDENCE:
+            if in_degree != 0:  # check in-degree
+                raise InvalidJustificationException(
+                    f"evidence '{n}' is not allowed to be supported by others")
+            if not reaches(n):
+                raise InvalidJustificationException(
+                    f"evidence '{n}' does not reach the conclusion '{conclusion}'")
+            for out in successors:
+                if (out_var_type := var_type_of(out)) != VariableType.STRATEGY:
+                    raise InvalidJustificationException(
+                        f"evidence '{n}' can only support strategy, found '{out_var_type}'")
+        case VariableType.STRATEGY:
+            if in_degree == 0:
+                raise InvalidJustificationException(
+                    f"strategy '{n}' must be supported by others")
+            if len(successors) == 0:
+                raise InvalidJustificationException(
+                    f"strategy '{n}' does not support any node, must have 1 out-edge")
+            if len(successors) > 1:
+                raise InvalidJustificationException(
+                    f"strategy '{n}' supports multiple nodes, but only 1 out-edge allowed")
+            if (out_var_type := var_type_of(successors[0])) not in \
+                    (VariableType.SUB_CONCLUSION, VariableType.CONCLUSION):
+                raise InvalidJustificationException(
+                    f"strategy '{n}' can only support sub-conclusion or conclusion, found '{out_var_type}'.")
+        case VariableType.SUB_CONCLUSION:
+            if in_degree == 0:
+                raise InvalidJustificationException(
+                    f"sub-conclusion '{n}' must be supported by others")
+            if not reaches(n):
+                raise InvalidJustificationException(
+                    f"sub-conclusion '{n}' does not reach the conclusion '{conclusion}'")
+            for out in successors:
+                if (out_var_type := var_type_of(out)) != VariableType.STRATEGY:
+                    raise InvalidJustificationException(
+                        f"sub-conclusion '{n}' can only support strategy, found '{out_var_type}'")
+        case VariableType.CONCLUSION:
+            pass
+        case VariableType.SUPPORT:
+            raise InvalidJustificationException(
+                f"abstract support '{n}' should not be included in a justification class")
+
+
+class Justification(DiGraph):
+    """A justification diagram, on top of the compact graph core.
+
+    networkx is only needed to convert it with `to_networkx`, e.g. for
+    the image export.
+    """
+
+    __slots__ = ()
+
     node_attr_map = {
         VariableType.CONCLUSION: dict(fillcolor="lightgrey",
                                       shape="rect",
@@ -108,72 +176,38 @@ class Justification(nx.DiGraph):
             raise InvalidJustificationException(
                 f"justification '{self.name}' must have only one conclusion, but got {len(conclusion_nodes)}")
 
-        if not nx.is_directed_acyclic_graph(self):
+        if not self.is_directed_acyclic_graph():
             raise InvalidJustificationException(
                 f"justification '{self.name}' must be a DAG (directed acyclic graph)")
 
         conclusion = conclusion_nodes[0]
+        reaching = self.ancestors(conclusion)
 
         for n, d in self.nodes(data=True):
-            match d["var_type"]:
-                case VariableType.EVIDENCE:
-                    if self.in_degree(n) != 0:  # check in-degree
-                        raise InvalidJustificationException(
-                            f"evidence '{n}' is not allowed to be supported by others")
-                    if not nx.has_path(self, n, conclusion):
-                        raise InvalidJustificationException(
-                            f"evidence '{n}' does not reach the conclusion '{conclusion}'")
-                    for out in self.successors(n):
-                        if (out_var_type := self.nodes[out]['var_type']) != VariableType.STRATEGY:
-                            raise InvalidJustificationException(
-                                f"evidence '{n}' can only support strategy, found '{out_var_type}'")
-                case VariableType.STRATEGY:
-                    if self.in_degree(n) == 0:
-                        raise InvalidJustificationException(
-                            f"strategy '{n}' must be supported by others")
-                    supports = tuple(self.successors(n))
-                    if len(supports) == 0:
-                        raise InvalidJustificationException(
-                            f"strategy '{n}' does not support any node, must have 1 out-edge")
-                    if len(supports) > 1:
-                        raise InvalidJustificationException(
-                            f"strategy '{n}' supports multiple nodes, but only 1 out-edge allowed")
-                    if (out_var_type := self.nodes[supports[0]]['var_type']) not in \
-                            (VariableType.SUB_CONCLUSION, VariableType.CONCLUSION):
-                        raise InvalidJustificationException(
-                            f"strategy '{n}' can only support sub-conclusion or conclusion, found '{out_var_type}'.")
-                case VariableType.SUB_CONCLUSION:
-                    if self.in_degree(n) == 0:
-                        raise InvalidJustificationException(
-                            f"sub-conclusion '{n}' must be supported by others")
-                    if not nx.has_path(self, n, conclusion):
-                        raise InvalidJustificationException(
-                            f"sub-conclusion '{n}' does not reach the conclusion '{conclusion}'")
-                    for out in self.successors(n):
-                        if (out_var_type := self.nodes[out]['var_type']) != VariableType.STRATEGY:
-                            raise InvalidJustificationException(
-                                f"sub-conclusion '{n}' can only support strategy, found '{out_var_type}'")
-                case VariableType.CONCLUSION:
-                    pass
-                case VariableType.SUPPORT:
-                    raise InvalidJustificationException(
-                        f"abstract support '{n}' should not be included in a justification class")
+            validate_node(n, d["var_type"],
+                          in_degree=self.in_degree(n),
+                          successors=tuple(self.successors(n)),
+                          var_type_of=lambda k: self.nodes[k]['var_type'],
+                          reaches=reaching.__contains__,
+                          conclusion=conclusion)
 
     def export_to_image(self,
                         path: Optional[Any] = None,
                         format: Optional[str] = None,
+                        dpi: int = 500,
                         ) -> bytes | None:
         try:
             from networkx.drawing.nx_agraph import to_agraph
         except ImportError as e:
-            raise ImportError("pygraphviz is required to enable this feature") from e
+            raise ImportError("networkx and pygraphviz are required to enable this feature, "
+                              "install them with the `export` extra") from e
 
-        agraph = to_agraph(self)
+        agraph = to_agraph(self.to_networkx())
 
         agraph.graph_attr.update(
             size="5",
             rankdir="BT",  # Bottom-to-Top
-            dpi="500",
+            dpi=str(dpi),
             label=self.name,
             fontsize="15",
             labelloc="bottem"
@@ -195,61 +229,415 @@ class Justification(nx.DiGraph):
         return agraph.draw(path=path, format=format, prog="dot")
 
 
+class PatternTemplate:
+    """A pattern expanded and validated once, and shared by all the
+    justifications implementing it, which only hold their own overlay.
+
+    Variables supported in the pattern without being defined by it, such as
+    `@support` variables, are placeholders to be defined by the overlays.
+    Pattern nodes whose validity depends on an overlay (e.g. supporting a
+    placeholder) are deferred, and validated again with each overlay.
+    """
+
+    def __init__(self, name: str, pattern: JustificationDef):
+        self.name = name
+        self.graph = Justification(name=name)
+
+        for k, v in pattern.variables.items():
+            if v.var_type != VariableType.SUPPORT:
+                self.graph.add_node(k,
+                                    label=v.description,
+                                    var_type=v.var_type,
+                                    status=None,  # init
+                                    )
+        self.variables = frozenset(self.graph.nodes)
+
+        self.graph.add_edges_from(pattern.supports.edges())
+        self.placeholders = frozenset(n for n in self.graph.nodes
+                                      if n not in self.variables)
+
+        conclusion_nodes = [n for n in self.variables
+                            if self.graph.nodes[n]["var_type"] == VariableType.CONCLUSION]
+        if len(conclusion_nodes) > 1:
+            raise InvalidJustificationException(
+                f"pattern '{name}' must have only one conclusion, but got {len(conclusion_nodes)}")
+
+        if not self.graph.is_directed_acyclic_graph():
+            raise InvalidJustificationException(
+                f"pattern '{name}' must be a DAG (directed acyclic graph)")
+
+        self.conclusion = conclusion_nodes[0] if conclusion_nodes else None
+        self.reaching = frozenset(self.graph.ancestors(self.conclusion)
+                                  if self.conclusion is not None else ())
+
+        deferred = set()
+        for n in self.variables:
+            successors = tuple(self.graph.successors(n))
+            if any(out in self.placeholders for out in successors):
+                deferred.add(n)
+                continue
+            try:
+                validate_node(n, self.graph.nodes[n]["var_type"],
+                              in_degree=self.graph.in_degree(n),
+                              successors=successors,
+                              var_type_of=lambda k: self.graph.nodes[k]["var_type"],
+                              reaches=self.reaching.__contains__,
+                              conclusion=self.conclusion)
+            except InvalidJustificationException:
+                deferred.add(n)
+        self.deferred = frozenset(deferred)
+
+    def expand(self, jd_cls: ClassDef) -> "ExpandedJustification":
+        """Validate the overlay of a justification implementing this pattern.
+
+        Only the overlay, the deferred nodes and the pattern nodes touched
+        by the overlay are validated, the rest of the pattern being valid.
+        """
+        name = jd_cls.name
+        # pattern variables take precedence over the overlay ones.
+        variables = {k: v for k, v in jd_cls.body.variables.items()
+                     if k not in self.variables}
+        supports = jd_cls.body.supports
+
+        for left, right in supports.edges():
+            for v in (left, right):
+                if v not in variables and v not in self.variables:
+                    raise InvalidJustificationException(
+                        f"variable ID '{v}' not found")
+        for v in self.placeholders:
+            if v not in variables:
+                raise InvalidJustificationException(
+                    f"variable ID '{v}' not found")
+
+        successors: dict[str, list[str]] = {}
+        predecessors: dict[str, list[str]] = {}
+        for left, right in supports.edges():
+            successors.setdefault(left, []).append(right)
+            predecessors.setdefault(right, []).append(left)
+
+        def var_type_of(n: str) -> VariableType:
+            if n in self.variables:
+                return self.graph.nodes[n]["var_type"]
+            return variables[n].var_type
+
+        def successors_of(n: str) -> tuple[str, ...]:
+            outs = list(self.graph.successors(n)) if n in self.graph else []
+            return tuple(dict.fromkeys(outs + successors.get(n, [])))
+
+        def in_degree_of(n: str) -> int:
+            ins = list(self.graph.predecessors(n)) if n in self.graph else []
+            return len(dict.fromkeys(ins + predecessors.get(n, [])))
+
+        conclusion_nodes = [n for n, v in variables.items() if v.var_type == VariableType.CONCLUSION]
+        if self.conclusion is not None:
+            conclusion_nodes.append(self.conclusion)
+        if len(conclusion_nodes) != 1:
+            raise InvalidJustificationException(
+                f"justification '{name}' must have only one conclusion, but got {len(conclusion_nodes)}")
+        conclusion = conclusion_nodes[0]
+
+        # any cycle goes through an overlay edge, whose tail can only be
+        # reached back from pattern nodes that are ancestors of such tails.
+        tails = [n for n in successors if n in self.graph]
+        backward = set(tails)
+        for n in tails:
+            backward.update(self.graph.ancestors(n))
+
+        def next_of(n: str) -> Iterable[str]:
+            for out in successors_of(n):
+                if out not in self.graph or out in backward:
+                    yield out
+
+        visiting, visited = set(), set()
+        for root in [*variables, *tails]:
+            if root in visited:
+                continue
+            stack = [(root, iter(next_of(root)))]
+            visiting.add(root)
+            while stack:
+                n, it = stack[-1]
+                if (out := next(it, None)) is None:
+                    stack.pop()
+                    visiting.discard(n)
+                    visited.add(n)
+                elif out in visiting:
+                    raise InvalidJustificationException(
+                        f"justification '{name}' must be a DAG (directed acyclic graph)")
+                elif out not in visited:
+                    visiting.add(out)
+                    stack.append((out, iter(next_of(out))))
+
+        reaching: dict[str, bool] = {}
+
+        def reached(n: str) -> bool:
+            if n == conclusion or (conclusion == self.conclusion and n in self.reaching):
+                return True
+            return reaching.get(n, False)
+
+        def reaches(root: str) -> bool:
+            if reached(root) or root in reaching:
+                return reached(root)
+            stack = [(root, iter(successors_of(root)))]
+            while stack:
+                n, it = stack[-1]
+                if (out := next(it, None)) is None:
+                    reaching[n] = False
+                    stack.pop()
+                elif reached(out):
+                    for m, _ in stack:
+                        reaching[m] = True
+                    return True
+                elif out not in reaching:
+                    stack.append((out, iter(successors_of(out))))
+            return False
+
+        touched = {*successors, *predecessors}
+        for n in {*variables, *self.deferred, *(touched & self.variables)}:
+            validate_node(n, var_type_of(n),
+                          in_degree=in_degree_of(n),
+                          successors=successors_of(n),
+                          var_type_of=var_type_of,
+                          reaches=reaches,
+                          conclusion=conclusion)
+
+        return ExpandedJustification(self, jd_cls)
+
+
+class ExpandedJustification:
+    """A justification implementing a pattern, stored as an overlay of the
+    shared pattern template, and materialized only when it is used.
+
+    The overlay is the definition of the justification itself, whose
+    variables defined by the pattern are ignored.
+    """
+
+    __slots__ = ("template", "jd_cls")
+
+    def __init__(self, template: PatternTemplate, jd_cls: ClassDef):
+        self.template = template
+        self.jd_cls = jd_cls
+
+    @property
+    def name(self) -> str:
+        return self.jd_cls.name
+
+    def materialize(self) -> Justification:
+        jd = self.template.graph.copy()
+        jd.name = self.name
+        for name, item in self.jd_cls.body.variables.items():
+            if name not in self.template.variables:
+                jd.add_node(name,
+                            label=item.description,
+                            var_type=item.var_type,
+                            status=None,  # init
+                            )
+        jd.add_edges_from(self.jd_cls.body.supports.edges())
+        return jd
+
+
+class CompiledJustification(Justification):
+    """A justification decoded from a compiled model, which was validated
+    and ordered at compile time."""
+
+    __slots__ = ("_order",)
+
+    @classmethod
+    def load(cls, diagram: CompiledDiagram) -> "CompiledJustification":
+        names, columns = diagram.nodes()
+        jd = cls.from_arrays(diagram.model.string(diagram.name), names, columns,
+                             diagram.arrays(),
+                             sparse=('function', 'component', 'operator'))
+        jd._order = diagram.order()
+        return jd
+
+    def justify_order(self,
+                      data: bool = False,
+                      ) -> Iterable[str | tuple[str, dict]]:
+        names = self._names
+        if not data:
+            return [names[i] for i in self._order]
+        return [(names[i], self.nodes[names[i]]) for i in self._order]
+
+    def copy(self) -> "CompiledJustification":
+        jd = super().copy()
+        jd._order = self._order
+        return jd
+
+
+class Justifications(Mapping[str, Justification]):
+    """A read-only mapping of justifications, materializing the expanded
+    ones on access, for as long as they are in use."""
+
+    def __init__(self, justifications: dict[str, "Justification | ExpandedJustification | CompiledDiagram"]):
+        self._justifications = justifications
+        self._materialized = weakref.WeakValueDictionary()
+
+    def __getitem__(self, name: str) -> Justification:
+        jd = self._justifications[name]
+        if isinstance(jd, Justification):
+            return jd
+        if (materialized := self._materialized.get(name)) is None:
+            materialized = CompiledJustification.load(jd) \
+                if isinstance(jd, CompiledDiagram) else jd.materialize()
+            self._materialized[name] = materialized
+        return materialized
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._justifications)
+
+    def __len__(self) -> int:
+        return len(self._justifications)
+
+
 class JPipeEngine:
 
     def __init__(self,
-                 jd_file: str,
+                 jd_file: str | Iterable[str],
+                 cache: Optional[ModelCache] = None,
+                 root: Optional[str] = None,
                  ):
-        """TODO:
-        Currently JPipeEngine only supports to load and parse .jd files.
-        To extend the ability to support a more general form of justification
-        representation such as JSON files, A `parse_jd_json_file` function
-        is added in the parser module, which can be imported like
-        `from parser import parse_jd_json_file`. This function works just like
-        the `load_jd_file` or `parse_jd_file` function, but for JSON file
-        format instead. The format of the JSON content is similar to the .jd
-        justification file and an example can be found in
-        `examples/models/01_slides.json`.
-
-        E.g., with the following line to parse the JSON justification file directly.
-        >>> self._model = parse_jd_json_file(filename=jd_file)
+        """Load the justifications of one or several model files.
+
+        Model files are either .jd files or their JSON representation (see
+        `examples/models/01_slides.json`), detected by their extension, or by
+        their content otherwise. JSON models are streamed, so that very large
+        generated models are never fully decoded in memory at once.
+
+        Compiled models (see `jpipe_runner.compiled`) are mapped in memory,
+        and their justifications are decoded on access, without validation.
+
+        When several files are given, they are merged into one engine: each
+        file (including the loaded ones) is parsed only once, and diagram
+        names are qualified by their defining file, relative to `root`, which
+        defaults to the common directory of the files, e.g. `a.jd::name`.
         """
-        self._model = load_jd_file(filename=jd_file)
-        self._justifications: dict[str, Justification] = {}
-        self._init_model()
+        jd_files = [jd_file] if isinstance(jd_file, str) else list(jd_file)
+        if root is None and jd_files:
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in jd_files])
+        # qualified names do not depend on the working directory.
+        self._root = os.path.abspath(root or os.curdir)
+        self._cache = cache if cache is not None else ModelCache()
+        # compiled model files, the others being known to the cache.
+        self._compiled_files: list[str] = []
+        self._justifications: dict[str, Justification | ExpandedJustification | CompiledDiagram] = {}
+        self._view = Justifications(self._justifications)
+        # expanded patterns, shared by the justifications implementing them.
+        self._templates: dict[int, PatternTemplate] = {}
+        # components of each composed justification.
+        self._compositions: dict[str, tuple[str, ...]] = {}
+        # memoized results of the justifications justified in this run.
+        self._results: dict[str, list[dict]] = {}
+        # outcomes of the pure checks called in this run, by cache key, and
+        # the pure checks being called, which concurrent callers wait for.
+        self._checks: dict[tuple, tuple[StatusType, Optional[str]]] = {}
+        self._calling: dict[tuple, threading.Event] = {}
+        self._checks_lock = threading.Lock()
+        for filename in jd_files:
+            if detect_model_format(filename) == "jpb":
+                self._compiled_files.append(os.path.abspath(filename))
+                self._init_compiled(CompiledModel(filename))
+                continue
+            model = load_jd_file(filename=filename, cache=self._cache)
+            self._init_model(model, qualified=len(jd_files) > 1)
+
+    def _diagram_name(self, cls: ClassDef, name: str, qualified: bool) -> str:
+        if not qualified:
+            return name
+        origin = os.path.relpath(self._cache.origin(cls), self._root)
+        return f"{origin.replace(os.sep, '/')}::{name}"
 
-    def _init_model(self) -> None:
-        for cls in self._model.class_defs.values():
+    def _init_model(self, model: ModelDef, qualified: bool = False) -> None:
+        for cls in model.class_defs.values():
             match cls.class_type:
                 case ClassType.JUSTIFICATION:
-                    jd = self._build_justification(cls)
-                    self._justifications[cls.name] = jd
+                    self._add_justification(model, cls, qualified)
                 case ClassType.PATTERN:
                     # ignore pattern class.
                     pass
                 case ClassType.COMPOSITION:
-                    # ignore composition class.
-                    pass
-
-    def _find_pattern(self, pattern: str) -> JustificationDef:
-        for cls in self._model.class_defs.values():
+                    for composed, info in cls.body.compositions.items():
+                        # a declaration alone refers to an existing justification.
+                        if info is not None:
+                            self._add_composition(model, cls, composed, qualified)
+
+    def _init_compiled(self, model: CompiledModel) -> None:
+        # names were qualified, or not, when compiled.
+        for name, diagram in model.diagrams.items():
+            if name in self._justifications:
+                continue
+            self._justifications[name] = diagram
+            if components := diagram.components:
+                self._compositions[name] = components
+
+    def _add_justification(self, model: ModelDef, cls: ClassDef, qualified: bool) -> str:
+        name = self._diagram_name(cls, cls.name, qualified)
+        # may be already built from another file loading the same file.
+        if name not in self._justifications:
+            self._justifications[name] = self._build_justification(model, cls)
+        return name
+
+    def _add_composition(self,
+                         model: ModelDef,
+                         cls: ClassDef,
+                         composed: str,
+                         qualified: bool,
+                         building: frozenset[str] = frozenset(),
+                         ) -> str:
+        name = self._diagram_name(cls, composed, qualified)
+        if name in self._compositions:
+            return name
+        if name in self._justifications:
+            raise InvalidJustificationException(
+                f"composed justification '{composed}' is already defined")
+        if name in building:
+            raise InvalidJustificationException(
+                f"composed justification '{composed}' is composed of itself")
+        info = cls.body.compositions[composed]
+        components = {c: self._find_component(model, c, qualified, building | {name})
+                      for c in (info.left, info.right)}
+        self._justifications[name] = self._build_composition(composed, info, components)
+        self._compositions[name] = tuple(components.values())
+        return name
+
+    def _find_component(self,
+                        model: ModelDef,
+                        component: str,
+                        qualified: bool,
+                        building: frozenset[str],
+                        ) -> str:
+        for cls in model.class_defs.values():
+            match cls.class_type:
+                case ClassType.JUSTIFICATION if cls.name == component:
+                    return self._add_justification(model, cls, qualified)
+                case ClassType.COMPOSITION if cls.body.compositions.get(component) is not None:
+                    return self._add_composition(model, cls, component, qualified, building)
+        raise InvalidJustificationException(f"component justification '{component}' not found")
+
+    @staticmethod
+    def _find_pattern(model: ModelDef, pattern: str) -> ClassDef:
+        for cls in model.class_defs.values():
             if cls.class_type == ClassType.PATTERN and cls.name == pattern:
                 assert isinstance(cls.body, JustificationDef)
-                return cls.body
+                return cls
         raise InvalidJustificationException(f"pattern {pattern} not found")
 
-    def _build_justification(self, jd_cls: ClassDef) -> Justification:
-        jd = Justification(name=jd_cls.name)
-
-        supports = deepcopy(jd_cls.body.supports)
-        variables = deepcopy(jd_cls.body.variables)
-
+    def _template(self, model: ModelDef, pattern: str) -> PatternTemplate:
+        pattern_cls = self._find_pattern(model, pattern)
+        if (template := self._templates.get(id(pattern_cls))) is None:
+            template = PatternTemplate(pattern_cls.name, pattern_cls.body)
+            self._templates[id(pattern_cls)] = template
+        return template
+
+    def _build_justification(self,
+                             model: ModelDef,
+                             jd_cls: ClassDef,
+                             ) -> Justification | ExpandedJustification:
         # expand justification with pattern.
         if jd_cls.pattern is not None:
-            pattern_jd: JustificationDef = self._find_pattern(jd_cls.pattern)
-            supports.update(i for i in pattern_jd.supports)
-            variables.update((k, v) for k, v in pattern_jd.variables.items()
-                             if v.var_type != VariableType.SUPPORT)
+            return self._template(model, jd_cls.pattern).expand(jd_cls)
+
+        jd = Justification(name=jd_cls.name)
+        variables = jd_cls.body.variables
 
         for name, item in variables.items():
             jd.add_node(name,
@@ -264,62 +652,372 @@ class JPipeEngine:
                     raise InvalidJustificationException(
                         f"variable ID '{v}' not found")
 
-        for support in supports:
-            check_vars(support.left, support.right)
-            jd.add_edge(support.left, support.right)
+        for left, right in jd_cls.body.supports.edges():
+            check_vars(left, right)
+            jd.add_edge(left, right)
 
         jd.validate()
         return jd
 
+    @staticmethod
+    def _conclusion(jd: Justification) -> tuple[str, dict]:
+        return next((n, d) for n, d in jd.nodes(data=True)
+                    if d["var_type"] == VariableType.CONCLUSION)
+
+    def _build_composition(self,
+                           composed: str,
+                           info: CompositionInfo,
+                           components: dict[str, str],
+                           ) -> Justification:
+        """Build a composed justification, which uses the conclusions of its
+        component justifications as evidence, e.g. `X is A with B`:
+
+            A (evidence) --+
+                           +--> A_with_B (strategy) --> X (conclusion)
+            B (evidence) --+
+        """
+        jd = Justification(name=composed)
+        strategy = f"{info.left}_with_{info.right}"
+
+        labels = []
+        for evidence, component in components.items():
+            _, conclusion = self._conclusion(self.justifications[component])
+            labels.append(conclusion['label'])
+            jd.add_node(evidence,
+                        label=conclusion['label'],
+                        var_type=VariableType.EVIDENCE,
+                        status=None,  # init
+                        component=component,
+                        )
+            jd.add_edge(evidence, strategy)
+
+        jd.add_node(strategy,
+                    label=f"{info.left} with {info.right}",
+                    var_type=VariableType.STRATEGY,
+                    status=None,  # init
+                    operator="with",
+                    )
+        jd.add_node(composed,
+                    label=" and ".join(dict.fromkeys(labels)),
+                    var_type=VariableType.CONCLUSION,
+                    status=None,  # init
+                    )
+        jd.add_edge(strategy, composed)
+
+        jd.validate()
+        return jd
+
+    @property
+    def justifications(self) -> Mapping[str, Justification]:
+        return self._view
+
     @property
-    def justifications(self) -> dict[str, Justification]:
-        return self._justifications
+    def files(self) -> list[str]:
+        """The absolute paths of the model files, including the loaded ones."""
+        return sorted(set(self._compiled_files) | set(self._cache.files))
+
+    @property
+    def results(self) -> dict[str, list[dict]]:
+        """The memoized results of the justifications justified in this run."""
+        return self._results
+
+    def memoize(self, diagram: str, results: Iterable[dict]) -> None:
+        """Memoize the results of a justification justified elsewhere, e.g. in a fork."""
+        self._results[diagram] = list(results)
+
+    def components(self, diagram: str) -> list[str]:
+        """Return the component justifications of a diagram, transitively, in justify order."""
+        order = []
+
+        def visit(name: str):
+            for component in self._compositions.get(name, ()):
+                if component not in order:
+                    visit(component)
+                    order.append(component)
+
+        visit(diagram)
+        return order
+
+    def functions(self, diagram: str) -> list[str]:
+        """Return the functions called by the checks of a diagram and of its components."""
+        functions = {}
+        for name in [*self.components(diagram), diagram]:
+            for _, attr in self.justifications[name].nodes(data=True):
+                if attr['var_type'] in (VariableType.EVIDENCE, VariableType.STRATEGY) \
+                        and 'component' not in attr and 'operator' not in attr:
+                    functions.setdefault(attr.get('function') or sanitize_string(attr['label']))
+        return list(functions)
 
     def justify(self,
                 diagram: str,
                 /,
                 dry_run: bool = False,
                 runtime: PythonRuntime = None,
+                scheduler: Optional[Scheduler] = None,
                 ) -> Iterator[dict]:
+        """Justify a diagram, running its checks with a scheduler when given,
+        or one after the other otherwise."""
+        # each justification is justified at most once per run,
+        # whether selected directly or used as a component: the replayed
+        # checks are marked, so that their durations are not counted twice.
+        # Only real runs are memoized, and a dry run never replays them.
+        if not dry_run and (results := self._results.get(diagram)) is not None:
+            yield from (dict(r, duration=0.0, replayed=True) if r.get('duration') is not None else dict(r)
+                        for r in results)
+            return
+
+        results = []
+        for result in self._justify(diagram, dry_run=dry_run, runtime=runtime, scheduler=scheduler):
+            results.append(result)
+            yield result
+
+        if not dry_run:
+            self._results[diagram] = results
+
+    def justify_batch(self,
+                      diagram: str,
+                      variable_sets: list[dict[str, Any]],
+                      /,
+                      dry_run: bool = False,
+                      runtime: PythonRuntime = None,
+                      ) -> list[list[dict]]:
+        """Justify a diagram for a batch of variable sets in lockstep, returning
+        the results of each set.
+
+        Each node is evaluated at once for all the sets whose predecessors
+        passed, through `PythonRuntime.call_batch`. Statuses are kept per set,
+        hence the nodes of the diagram are left untouched.
+        """
+        return self._justify_batch(diagram, variable_sets, dry_run, runtime, {})
+
+    def _justify_batch(self,
+                       diagram: str,
+                       variable_sets: list[dict[str, Any]],
+                       dry_run: bool,
+                       runtime: PythonRuntime,
+                       components: dict[str, list[list[dict]]],
+                       ) -> list[list[dict]]:
         jd = self.justifications[diagram]
+        results: list[list[dict]] = [[] for _ in variable_sets]
+        statuses: list[dict[str, StatusType]] = [{} for _ in variable_sets]
 
-        for node, attr in jd.justify_order(data=True):
-
-            # get all statuses of its predecessors
-            pre_statuses = [
-                jd.nodes[i]['status']
-                for i in jd.predecessors(node)
-            ]
+        def emit(k: int, status: StatusType, **extra) -> None:
+            result = dict(name=node, **extra, **attr)
+            result['status'] = statuses[k][node] = status
+            results[k].append(result)
 
-            # check if predecessors have set status
-            assert None not in pre_statuses
-
-            # check if all predecessors have passed
-            all_passed = all(x is StatusType.PASS for x in pre_statuses)
+        for node, attr in jd.justify_order(data=True):
+            parents = list(jd.predecessors(node))
+            pending = [k for k in range(len(variable_sets))
+                       if not dry_run and all(statuses[k][p] is StatusType.PASS for p in parents)]
+            for k in set(range(len(variable_sets))).difference(pending):
+                emit(k, StatusType.SKIP)
 
-            # skip all other parts if conditions are not met
-            if dry_run or not all_passed:
-                attr['status'] = StatusType.SKIP
-                yield dict(name=node, **attr)
+            if not pending:
                 continue
 
             match attr['var_type']:
+                case VariableType.EVIDENCE if 'component' in attr:
+                    component = attr['component']
+                    if component not in components:
+                        components[component] = self._justify_batch(
+                            component, variable_sets, dry_run, runtime, components)
+                    for k in pending:
+                        conclusion = next(r for r in components[component][k]
+                                          if r['var_type'] == VariableType.CONCLUSION)
+                        if conclusion['status'] is StatusType.PASS:
+                            emit(k, StatusType.PASS, exception=None)
+                        else:
+                            emit(k, StatusType.FAIL,
+                                 exception=f"component justification '{component}' is not justified")
+                case VariableType.STRATEGY if 'operator' in attr:
+                    for k in pending:
+                        emit(k, StatusType.PASS)
                 case VariableType.EVIDENCE | VariableType.STRATEGY:
-                    exception = None
-                    fn_name = sanitize_string(attr['label'])
-                    # initiate to PASS
-                    attr['status'] = StatusType.PASS
+                    fn_name = attr.get('function') or sanitize_string(attr['label'])
+                    start = time.perf_counter()
                     try:
-                        if not (res := runtime.call_function(fn_name)):
-                            raise FunctionException(
-                                f"function '{fn_name}' returns non-true result: {res}")
+                        outcomes = runtime.call_batch(fn_name, [variable_sets[k] for k in pending])
                     except Exception as e:
-                        exception = f'{type(e).__name__}: {e}'
-                        # set to FAIL due to exceptions
-                        attr['status'] = StatusType.FAIL
-                    yield dict(name=node,
-                               exception=exception,
-                               **attr)
+                        outcomes = [e] * len(pending)
+                    # the duration of a batch is shared by its sets.
+                    duration = (time.perf_counter() - start) / len(pending)
+                    for k, res in zip(pending, outcomes):
+                        exception, status = None, StatusType.PASS
+                        if isinstance(res, Exception):
+                            exception, status = f'{type(res).__name__}: {res}', StatusType.FAIL
+                        elif not res:
+                            exception = (f"FunctionException: function '{fn_name}' "
+                                         f"returns non-true result: {res}")
+                            status = StatusType.FAIL
+                        emit(k, status, exception=exception, duration=duration)
                 case VariableType.SUB_CONCLUSION | VariableType.CONCLUSION:
-                    attr['status'] = StatusType.PASS
-                    yield dict(name=node, **attr)
+                    for k in pending:
+                        emit(k, StatusType.PASS)
+
+        return results
+
+    def _justify(self,
+                 diagram: str,
+                 /,
+                 dry_run: bool = False,
+                 runtime: PythonRuntime = None,
+                 scheduler: Optional[Scheduler] = None,
+                 ) -> Iterator[dict]:
+        jd = self.justifications[diagram]
+
+        def evaluate(node: str, attr: dict) -> dict:
+            return self._evaluate(jd, node, attr, dry_run, runtime, scheduler)
+
+        if scheduler is not None:
+            # components first, so that no other check is running meanwhile.
+            if not dry_run:
+                for component in self.components(diagram):
+                    for _ in self.justify(component, runtime=runtime, scheduler=scheduler):
+                        pass
+            yield from scheduler.run(
+                jd, evaluate, lambda node, attr: self._pending_check(jd, node, attr, dry_run, runtime))
+            return
+
+        for node, attr in jd.justify_order(data=True):
+            result = evaluate(node, attr)
+            # a timed out check left running (without fork) runs alone until
+            # it returns, or for its timeout again, after which it is given up.
+            if (running := result.pop('running', None)) is not None:
+                # imported here, as checks are only left running without fork.
+                from concurrent.futures import wait
+                fn_name = attr.get('function') or sanitize_string(attr['label'])
+                wait([running], timeout=runtime.spec(fn_name).timeout)
+            yield result
+
+    def _pending_check(self,
+                       jd: Justification,
+                       node: str,
+                       attr: dict,
+                       dry_run: bool,
+                       runtime: PythonRuntime,
+                       ) -> Optional[CheckSpec]:
+        """Return the properties of the check a node is about to call, if any."""
+        if dry_run or attr['var_type'] not in (VariableType.EVIDENCE, VariableType.STRATEGY) \
+                or 'component' in attr or 'operator' in attr \
+                or any(jd.nodes[i]['status'] is not StatusType.PASS for i in jd.predecessors(node)):
+            return None
+        fn_name = attr.get('function') or sanitize_string(attr['label'])
+        spec = runtime.spec(fn_name)
+        try:
+            if spec.pure and self._check_key(fn_name, spec) in self._checks:
+                return None
+        except Exception:
+            pass  # the error is reported by the evaluation of the node.
+        return spec
+
+    @staticmethod
+    def _check_key(fn_name: str, spec: CheckSpec) -> tuple:
+        return fn_name, spec.cache_key() if spec.cache_key is not None else None
+
+    def _claim_check(self, key: tuple) -> Optional[tuple[StatusType, Optional[str]]]:
+        """Return the outcome of a pure check, waiting for it when another
+        thread is calling it, or None when the caller has to call it."""
+        while True:
+            with self._checks_lock:
+                if (outcome := self._checks.get(key)) is not None:
+                    return outcome
+                if (calling := self._calling.get(key)) is None:
+                    self._calling[key] = threading.Event()
+                    return None
+            calling.wait()
+
+    def _release_check(self, key: tuple, outcome: Optional[tuple[StatusType, Optional[str]]]) -> None:
+        # without an outcome, e.g. on KeyboardInterrupt, a waiting caller calls it again.
+        with self._checks_lock:
+            if outcome is not None:
+                self._checks[key] = outcome
+            self._calling.pop(key).set()
+
+    def _evaluate(self,
+                  jd: Justification,
+                  node: str,
+                  attr: dict,
+                  dry_run: bool,
+                  runtime: PythonRuntime,
+                  scheduler: Optional[Scheduler],
+                  ) -> dict:
+        # get all statuses of its predecessors
+        pre_statuses = [
+            jd.nodes[i]['status']
+            for i in jd.predecessors(node)
+        ]
+
+        # check if predecessors have set status
+        assert None not in pre_statuses
+
+        # check if all predecessors have passed
+        all_passed = all(x is StatusType.PASS for x in pre_statuses)
+
+        # skip all other parts if conditions are not met
+        if dry_run or not all_passed:
+            attr['status'] = StatusType.SKIP
+            return dict(name=node, **attr)
+
+        match attr['var_type']:
+            case VariableType.EVIDENCE if 'component' in attr:
+                exception = None
+                component = attr['component']
+                if (results := self._results.get(component)) is None:
+                    results = list(self.justify(component, runtime=runtime, scheduler=scheduler))
+                conclusion = next(r for r in results
+                                  if r['var_type'] == VariableType.CONCLUSION)
+                attr['status'] = StatusType.PASS
+                if conclusion['status'] is not StatusType.PASS:
+                    exception = f"component justification '{component}' is not justified"
+                    attr['status'] = StatusType.FAIL
+                return dict(name=node,
+                            exception=exception,
+                            **attr)
+            case VariableType.STRATEGY if 'operator' in attr:
+                # composition strategies hold once their components hold.
+                attr['status'] = StatusType.PASS
+                return dict(name=node, **attr)
+            case VariableType.EVIDENCE | VariableType.STRATEGY:
+                exception, key, cached, outcome, running = None, None, False, None, None
+                # precomputed in compiled models.
+                fn_name = attr.get('function') or sanitize_string(attr['label'])
+                # initiate to PASS
+                attr['status'] = StatusType.PASS
+                start = time.perf_counter()
+                try:
+                    spec = runtime.spec(fn_name)
+                    # pure checks are called once per run (and cache key).
+                    if spec.pure:
+                        key = self._check_key(fn_name, spec)
+                        cached = (outcome := self._claim_check(key)) is not None
+                    if cached:
+                        attr['status'], exception = outcome
+                    elif not (res := runtime.call_check(fn_name, timeout=spec.timeout)):
+                        raise FunctionException(
+                            f"function '{fn_name}' returns non-true result: {res}")
+                except Exception as e:
+                    exception = f'{type(e).__name__}: {e}'
+                    # set to FAIL due to exceptions
+                    attr['status'] = StatusType.FAIL
+                    if isinstance(e, CheckTimeoutError):
+                        running = e.running
+                except BaseException:
+                    if key is not None and not cached:
+                        self._release_check(key, None)
+                    raise
+                if key is not None and not cached:
+                    self._release_check(key, (attr['status'], exception))
+                result = dict(name=node,
+                              exception=exception,
+                              duration=time.perf_counter() - start,
+                              **attr)
+                if cached:
+                    result['cached'] = True
+                if running is not None:
+                    # popped by the caller, which holds the slot and resources of the check meanwhile.
+                    result['running'] = running
+                return result
+            case VariableType.SUB_CONCLUSION | VariableType.CONCLUSION:
+                attr['status'] = StatusType.PASS
+                return dict(name=node, **attr)
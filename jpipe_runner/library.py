@@ -0,0 +1,102 @@
+"""
+jpipe_runner.library
+~~~~~~~~~~~~~~~~~~~~
+
+This module contains the API for the authors of justification libraries.
+"""
+
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Mapping, Optional
+
+from jpipe_runner.utils import parse_amount
+
+# The attribute of a check holding its declared properties.
+SPEC_ATTR = "__jpipe_check__"
+
+
+@dataclass(frozen=True)
+class CheckSpec:
+    """The declared properties of a check.
+
+    pure: the result only depends on the variables of the run, hence it is
+        computed once per run (or once per `cache_key`) and reused.
+    parallel_safe: the check may run concurrently with other checks, which
+        defaults to `pure`; other checks run alone.
+    timeout: the number of seconds after which the check fails. Unless its
+        fork is killed (`--isolation node`), a timed out check keeps running
+        in the background, and holds its `--jobs` slot and its resources
+        until it returns, or for its timeout again, after which the next
+        checks start while the timed out code may still be running.
+    resources: the amount of each resource held while the check runs, as a
+        number or with a binary suffix, e.g. {"memory": "8G", "registry": 1}.
+    cache_key: a function returning the key of a pure check result, for
+        results depending on some state, e.g. the modification time of a file.
+    batch: the batched variant of the check, see `batch`.
+    """
+    pure: bool = False
+    parallel_safe: bool = False
+    timeout: Optional[float] = None
+    resources: Mapping[str, float] = field(default_factory=dict)
+    cache_key: Optional[Callable[[], Hashable]] = None
+    batch: Optional[Callable[[list[dict[str, Any]]], list[Any]]] = None
+
+
+DEFAULT_SPEC = CheckSpec()
+
+
+def spec_of(fn: Callable) -> CheckSpec:
+    """Return the declared properties of a check."""
+    return getattr(fn, SPEC_ATTR, DEFAULT_SPEC)
+
+
+def check(fn: Optional[Callable] = None,
+          /,
+          *,
+          pure: bool = False,
+          parallel_safe: Optional[bool] = None,
+          timeout: Optional[float] = None,
+          resources: Optional[Mapping[str, float]] = None,
+          cache_key: Optional[Callable[[], Hashable]] = None,
+          batch: Optional[Callable[[list[dict[str, Any]]], list[Any]]] = None,
+          ) -> Callable:
+    """Declare the properties of a check, see `CheckSpec`.
+
+    >>> @check(pure=True, timeout=30, resources={"cpu": 2})
+    ... def check_pep8_coding_standard():
+    ...     return lint(notebook)
+    """
+
+    def decorator(f: Callable) -> Callable:
+        setattr(f, SPEC_ATTR, CheckSpec(
+            pure=pure,
+            parallel_safe=pure if parallel_safe is None else parallel_safe,
+            timeout=timeout,
+            resources={k: parse_amount(v) for k, v in (resources or {}).items()},
+            cache_key=cache_key,
+            batch=batch if batch is not None else spec_of(f).batch,
+        ))
+        return f
+
+    return decorator if fn is None else decorator(fn)
+
+
+def batch(check: Callable[[], Any]) -> Callable[[Callable], Callable]:
+    """Register the decorated function as the batched variant of a check.
+
+    When a diagram is justified for many sets of variables (see `--matrix`
+    and `--batch-size`), the batched variant is called once with the list of
+    the variable sets of a batch, instead of calling the check once per set.
+    It returns the list of their results, in the same order, where a result
+    may be an exception instance, failing its set only.
+
+    >>> @batch(notebook_file_exists)
+    ... def notebook_files_exist(variable_sets):
+    ...     return [v['notebook'] in fake_fs for v in variable_sets]
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        setattr(check, SPEC_ATTR, dataclasses.replace(spec_of(check), batch=fn))
+        return fn
+
+    return decorator
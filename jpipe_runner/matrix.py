@@ -0,0 +1,158 @@
+"""
+jpipe_runner.matrix
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the matrix mode of jPipe Runner, which justifies the
+same diagrams for many sets of variables.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import redirect_stdout
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from jpipe_runner.forkserver import ForkServer
+from jpipe_runner.report import RunReport
+
+
+def read_variable_sets(filename: str) -> Iterator[dict[str, Any]]:
+    """Read the sets of variables of a matrix file, one set at a time.
+
+    A .csv file holds one set per row, named by its header, and any other
+    file holds one JSON object per line (JSONL).
+    """
+    _, ext = os.path.splitext(filename)
+    with open(filename, newline='', encoding='utf-8') as f:
+        if ext.lower() == ".csv":
+            yield from csv.DictReader(f)
+            return
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            if not isinstance(variables := json.loads(line), dict):
+                raise ValueError(f"{filename}:{lineno}: expected a JSON object of variables")
+            yield variables
+
+
+def _justify_set(jpipe: Any,
+                 diagrams: list[str],
+                 variables: dict[str, Any],
+                 dry_run: bool,
+                 runtime: Any,
+                 ) -> list[dict]:
+    # run in a fork, where the variables die with the process, and where the
+    # output of the libraries must not interleave with the records on stdout.
+    with redirect_stdout(sys.stderr):
+        for name, value in variables.items():
+            runtime.set_variable(name, value)
+        report = RunReport()
+        for diagram in diagrams:
+            for _ in report.record(diagram, jpipe.justify(diagram, dry_run=dry_run, runtime=runtime)):
+                pass
+    return report.diagrams
+
+
+def _justify_chunk(jpipe: Any,
+                   diagrams: list[str],
+                   chunk: list[dict[str, Any]],
+                   dry_run: bool,
+                   runtime: Any,
+                   ) -> list[list[dict]]:
+    # run in a fork, where the sets of the chunk share the library state.
+    reports = [RunReport() for _ in chunk]
+    with redirect_stdout(sys.stderr):
+        for diagram in diagrams:
+            start = time.perf_counter()
+            results = jpipe.justify_batch(diagram, chunk, dry_run=dry_run, runtime=runtime)
+            duration = (time.perf_counter() - start) / len(chunk)
+            for report, nodes in zip(reports, results):
+                report.add(diagram, nodes, duration)
+    return [report.diagrams for report in reports]
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def unbatched_checks(jpipe: Any, diagrams: list[str], runtime: Any) -> list[str]:
+    """Return the checks of the diagrams without a batched variant."""
+    return [fn for fn in dict.fromkeys(fn for diagram in diagrams for fn in jpipe.functions(diagram))
+            if runtime.spec(fn).batch is None]
+
+
+def justify_matrix(jpipe: Any,
+                   server: ForkServer,
+                   diagrams: list[str],
+                   variable_sets: Iterable[dict[str, Any]],
+                   /,
+                   jobs: int = 1,
+                   batch_size: int = 1,
+                   dry_run: bool = False,
+                   runtime: Any = None,
+                   ) -> Iterator[dict]:
+    """Justify the diagrams for each set of variables, in a fork of the
+    pre-loaded engine and runtime per set, yielding one record per set in
+    the order of the sets.
+
+    With a batch size larger than 1, the sets are justified by chunks in
+    lockstep (see `JPipeEngine.justify_batch`), in a fork per chunk, so that
+    the batched variants of the checks are called once per chunk. The sets
+    of a chunk share its library state, hence they are only grouped when
+    every check of the diagrams has a batched variant; otherwise each set
+    is still justified in a fork of its own.
+    """
+    if batch_size > 1 and unbatched_checks(jpipe, diagrams, runtime):
+        batch_size = 1
+
+    # the sets in flight, as they are read lazily.
+    in_flight: dict[int, dict[str, Any]] = {}
+
+    def tasks() -> Iterator[dict[str, Any]]:
+        for index, variables in enumerate(variable_sets):
+            in_flight[index] = variables
+            yield variables
+
+    def batched() -> Iterator[list[dict] | BaseException]:
+        sizes = deque()
+
+        def chunks() -> Iterator[list[dict[str, Any]]]:
+            for chunk in _chunks(tasks(), batch_size):
+                sizes.append(len(chunk))
+                yield chunk
+
+        for result in server.imap(lambda c: _justify_chunk(jpipe, diagrams, c, dry_run, runtime),
+                                  chunks(), jobs=jobs):
+            size = sizes.popleft()
+            # a failed chunk fails each of its sets.
+            yield from ([result] * size if isinstance(result, BaseException) else result)
+
+    if batch_size > 1:
+        results = batched()
+    else:
+        results = server.imap(lambda v: _justify_set(jpipe, diagrams, v, dry_run, runtime),
+                              tasks(), jobs=jobs)
+
+    for index, result in enumerate(results):
+        variables = in_flight.pop(index)
+        if isinstance(result, BaseException):
+            yield dict(index=index,
+                       variables=variables,
+                       status=None,
+                       error=f"{type(result).__name__}: {result}",
+                       summary=None,
+                       diagrams=[])
+            continue
+        report = RunReport(diagrams=result)
+        yield dict(index=index,
+                   variables=variables,
+                   status="PASS" if report.exit_code == 0 else "FAIL",
+                   error=None,
+                   summary=report.summary,
+                   diagrams=report.diagrams)
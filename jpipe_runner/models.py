@@ -3,62 +3,214 @@ jpipe_runner.models
 ~~~~~~~~~~~~~~~~~~~
 
 This module contains the model definitions of Justification Diagram.
+
+Models of generated justifications may hold millions of supports, hence
+definitions use `__slots__`, identifiers and descriptions are interned,
+and supports are stored as integer-indexed edge arrays.
 """
 
+import sys
+from array import array
+from collections.abc import MutableSet
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Iterable, Iterator, Optional
 
 from jpipe_runner.enums import ClassType, VariableType
 
 
-@dataclass(order=True, frozen=True)
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if type(s) is str else s
+
+
+@dataclass(order=True, frozen=True, slots=True)
 class VariableDef:
     var_type: VariableType
     name: str
     description: str
 
+    def __post_init__(self):
+        object.__setattr__(self, 'name', _intern(self.name))
+        object.__setattr__(self, 'description', _intern(self.description))
 
-@dataclass(order=True, frozen=True)
+
+@dataclass(order=True, frozen=True, slots=True)
 class SupportDef:
     left: str
     right: str
 
 
-@dataclass(order=True)
+class Supports(MutableSet):
+    """A set of supports stored as an array of edges.
+
+    Variable names are indexed in a per-justification table, and each edge
+    is packed as `left << 32 | right` into an array of 64-bit integers,
+    which is deduplicated on read, keeping the insertion order. The reverse
+    index of the table is only kept while supports are being added, and the
+    set of packed edges once supports are looked up.
+    """
+
+    __slots__ = ("_names", "_index", "_edges", "_members", "_compacted")
+
+    def __init__(self, supports: Iterable[SupportDef | tuple[str, str]] = ()):
+        self._names: list[str] = []
+        self._index: Optional[dict[str, int]] = {}
+        self._edges = array('Q')
+        self._members: Optional[set[int]] = None
+        self._compacted = True
+        for support in supports:
+            self.add(support)
+
+    def _lookup(self) -> dict[str, int]:
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self._names)}
+        return self._index
+
+    def _id(self, name: str) -> int:
+        if (i := self._lookup().get(name)) is None:
+            self._index[name] = i = len(self._names)
+            self._names.append(_intern(name))
+        return i
+
+    def _pack(self, support: SupportDef | tuple[str, str]) -> Optional[int]:
+        left, right = (support.left, support.right) \
+            if isinstance(support, SupportDef) else support
+        index = self._lookup()
+        if (i := index.get(left)) is None or (j := index.get(right)) is None:
+            return None
+        return i << 32 | j
+
+    def _compact(self) -> array:
+        if not self._compacted:
+            self._edges = array('Q', dict.fromkeys(self._edges))
+            self._compacted = True
+            self._index = None
+        return self._edges
+
+    def _packed(self) -> set[int]:
+        if self._members is None:
+            self._members = set(self._compact())
+        return self._members
+
+    def add(self, support: SupportDef | tuple[str, str]) -> None:
+        left, right = (support.left, support.right) \
+            if isinstance(support, SupportDef) else support
+        packed = self._id(left) << 32 | self._id(right)
+        self._edges.append(packed)
+        self._compacted = False
+        if self._members is not None:
+            self._members.add(packed)
+
+    def discard(self, support: SupportDef | tuple[str, str]) -> None:
+        if (packed := self._pack(support)) is not None and packed in self._packed():
+            self._members.remove(packed)
+            edges = self._compact()
+            del edges[edges.index(packed)]
+
+    def clear(self) -> None:
+        self._edges = array('Q')
+        self._members = None
+        self._compacted = True
+
+    def update(self, supports: Iterable[SupportDef | tuple[str, str]]) -> None:
+        for support in supports:
+            self.add(support)
+
+    def edges(self) -> Iterator[tuple[str, str]]:
+        """Iterate over the supports as (left, right) name pairs."""
+        names = self._names
+        for packed in self._compact():
+            yield names[packed >> 32], names[packed & 0xFFFFFFFF]
+
+    def __contains__(self, support: object) -> bool:
+        if not isinstance(support, SupportDef | tuple):
+            return False
+        return (packed := self._pack(support)) is not None and packed in self._packed()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Supports):
+            return super().__eq__(other)
+        if len(self) != len(other):
+            return False
+        if self._names == other._names:
+            return self._packed() == other._packed()
+        # the edges of the other supports, renumbered with the names of these.
+        index = self._lookup()
+        ids = [index.get(name, -1) for name in other._names]
+        members = self._packed()
+        for packed in other._compact():
+            i, j = ids[packed >> 32], ids[packed & 0xFFFFFFFF]
+            if i < 0 or j < 0 or i << 32 | j not in members:
+                return False
+        return True
+
+    def __iter__(self) -> Iterator[SupportDef]:
+        return (SupportDef(left=left, right=right) for left, right in self.edges())
+
+    def __len__(self) -> int:
+        return len(self._compact())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({set(self)!r})"
+
+    def __deepcopy__(self, memo) -> "Supports":
+        return Supports(self.edges())
+
+    def __getstate__(self):
+        return list(self.edges())
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+
+@dataclass(order=True, slots=True)
 class JustificationDef:
-    supports: Optional[set[SupportDef]] = None
+    supports: Optional[Supports] = None
     variables: Optional[dict[str, VariableDef]] = None
 
     def __post_init__(self):
-        if self.supports is None:
-            self.supports = set()
+        if not isinstance(self.supports, Supports):
+            self.supports = Supports(self.supports or ())
         if self.variables is None:
             self.variables = dict()
 
 
-@dataclass(order=True)
+@dataclass(order=True, frozen=True, slots=True)
+class CompositionInfo:
+    left: str
+    right: str
+
+    def __post_init__(self):
+        object.__setattr__(self, 'left', _intern(self.left))
+        object.__setattr__(self, 'right', _intern(self.right))
+
+
+@dataclass(order=True, slots=True)
 class CompositionDef:
-    compositions: Optional[dict[str, Any]] = None
+    compositions: Optional[dict[str, Optional[CompositionInfo]]] = None
 
     def __post_init__(self):
         if self.compositions is None:
             self.compositions = dict()
 
 
-@dataclass(order=True, frozen=True)
+@dataclass(order=True, frozen=True, slots=True)
 class LoadStmt:
     path: str
 
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class ClassDef:
     class_type: ClassType
     name: str
     pattern: Optional[str] = None
     body: JustificationDef | CompositionDef = None
 
+    def __post_init__(self):
+        self.name = _intern(self.name)
+        self.pattern = _intern(self.pattern)
+
 
-@dataclass(order=True)
+@dataclass(order=True, slots=True)
 class ModelDef:
     load_stmts: Optional[set[LoadStmt]] = None
     class_defs: Optional[dict[str, ClassDef]] = None
@@ -5,14 +5,23 @@ jpipe_runner.parser
 This module contains the parser code of jPipe Runner.
 """
 
+import functools
+import io
 import json
 import os
+from typing import Iterator
 
-from lark import Lark, ParseTree
-from lark.exceptions import (UnexpectedCharacters,
-                             UnexpectedToken)
-
-from jpipe_runner.transformer import *
+from jpipe_runner.compiled import MAGIC, CompiledModelException
+from jpipe_runner.enums import ClassType, VariableType
+from jpipe_runner.exceptions import SyntaxException
+from jpipe_runner.models import (ModelDef,
+                                 LoadStmt,
+                                 ClassDef,
+                                 VariableDef,
+                                 Supports,
+                                 JustificationDef,
+                                 CompositionDef,
+                                 CompositionInfo)
 
 
 def read_jpipe_grammar() -> str:
@@ -23,17 +32,23 @@ def read_jpipe_grammar() -> str:
         return f.read()
 
 
-JPIPE_GRAMMAR = read_jpipe_grammar()
+@functools.cache
+def jpipe_parser():
+    """Return the default jPipe parser, built on first use, so that Lark is
+    only imported when parsing .jd sources."""
+    from lark import Lark
 
-# Default jPipe parser.
-jpipe_parser = Lark(grammar=JPIPE_GRAMMAR,
-                    start='start',
-                    parser='lalr')
+    return Lark(grammar=read_jpipe_grammar(),
+                start='start',
+                parser='lalr')
 
 
 def parse_jd(source: str) -> ModelDef:
+    from lark.exceptions import UnexpectedCharacters, UnexpectedToken
+    from jpipe_runner.transformer import JPipeTransformer
+
     try:
-        tree: ParseTree = jpipe_parser.parse(text=source)
+        tree = jpipe_parser().parse(text=source)
         model: ModelDef = JPipeTransformer().transform(tree)
         return model
     except (UnexpectedCharacters, UnexpectedToken) as e:
@@ -47,9 +62,11 @@ def parse_jd_file(filename: str) -> ModelDef:
     return parse_jd(source=content)
 
 
-def parse_jd_json(json_data: dict) -> ModelDef:
+def parse_jd_json_class(value: dict) -> ClassDef:
+    """Convert the JSON object of a class definition into a ClassDef."""
+
     def parse_supports(supports):
-        return {SupportDef(**support) for support in supports}
+        return Supports((support["left"], support["right"]) for support in supports)
 
     def parse_variables(variables):
         return {
@@ -67,31 +84,200 @@ def parse_jd_json(json_data: dict) -> ModelDef:
             variables=parse_variables(body["variables"])
         )
 
-    def parse_class_defs(class_defs):
-        return {
-            key: ClassDef(
-                class_type=ClassType(value["class_type"]),
-                name=value["name"],
-                pattern=value["pattern"],
-                body=parse_justification(value["body"])
-            )
-            for key, value in class_defs.items()
-        }
+    def parse_composition(body):
+        return CompositionDef(
+            compositions={
+                key: CompositionInfo(**info) if info else None
+                for key, info in body["compositions"].items()
+            }
+        )
+
+    class_type = ClassType(value["class_type"])
+    return ClassDef(
+        class_type=class_type,
+        name=value["name"],
+        pattern=value["pattern"],
+        body=(parse_composition(value["body"])
+              if class_type == ClassType.COMPOSITION
+              else parse_justification(value["body"]))
+    )
+
 
+def parse_jd_json(json_data: dict) -> ModelDef:
     return ModelDef(
-        load_stmts=set(json_data["load_stmts"]),
-        class_defs=parse_class_defs(json_data["class_defs"])
+        load_stmts=set(LoadStmt(path=path) for path in json_data["load_stmts"]),
+        class_defs={key: parse_jd_json_class(value)
+                    for key, value in json_data["class_defs"].items()}
     )
 
 
-def parse_jd_json_file(filename: str) -> ModelDef:
+# characters which may follow the prefix of a JSON number within the number.
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+class _JSONObjectReader:
+    """Decode the members of a JSON object incrementally from a text stream,
+    so that only one member at a time is held as Python objects."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, fp, chunk_size: int = 1 << 16):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        if self._eof:
+            return False
+        chunk = self._fp.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\n\r":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill(self._chunk_size):
+                raise ValueError("unexpected end of JSON document")
+
+    def _expect(self, *chars: str) -> str:
+        if (ch := self._peek()) not in chars:
+            raise ValueError(f"expected one of {chars} in JSON document, found {ch!r}")
+        self._pos += 1
+        return ch
+
+    def value(self):
+        self._peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # a number cut by the end of the buffer, e.g. `1` of `1.5`, goes on.
+                if self._eof or not (isinstance(value, (int, float)) and not isinstance(value, bool)
+                                     and (end == len(self._buf) or self._buf[end] in _NUMBER_CHARS)):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(size)
+            size *= 2  # values larger than the buffer grow it geometrically.
+
+    def members(self) -> Iterator[str]:
+        """Iterate over the keys of an object, the caller must read each value."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(":")
+            yield key
+            if self._expect(",", "}") == "}":
+                return
+
+
+def iter_jd_json_file(filename: str) -> Iterator[LoadStmt | ClassDef]:
+    """Stream the load statements and class definitions of a JSON model file.
+
+    Class definitions are converted as soon as they are decoded, so that the
+    whole document is never held in memory at once. The standard json
+    decoder is used: ijson, even with its C backend, measured slower on
+    large generated models.
+    """
     with open(filename, encoding='utf-8') as f:
-        data = json.load(f)
-    return parse_jd_json(json_data=data)
+        reader = _JSONObjectReader(f)
+        for key in reader.members():
+            match key:
+                case "load_stmts":
+                    yield from (LoadStmt(path=path) for path in reader.value())
+                case "class_defs":
+                    for _ in reader.members():
+                        yield parse_jd_json_class(reader.value())
+                case _:
+                    reader.value()
+
+
+def parse_jd_json_file(filename: str) -> ModelDef:
+    model = ModelDef()
+    for item in iter_jd_json_file(filename):
+        if isinstance(item, LoadStmt):
+            model.load_stmts.add(item)
+        else:
+            model.class_defs[item.name] = item
+    return model
 
 
-def load_jd_file(filename: str, _loaded: set = None) -> ModelDef:
-    """load_jd_file is able to load JD files recursively."""
+def detect_model_format(filename: str) -> str:
+    """Detect the format of a model file, `jd`, `json` or compiled `jpb`, by
+    its extension, or by sniffing its content when the extension is unknown."""
+    _, ext = os.path.splitext(filename)
+    match ext.lower():
+        case ".jd":
+            return "jd"
+        case ".json":
+            return "json"
+        case ".jpb":
+            return "jpb"
+    with open(filename, 'rb') as f:
+        head = f.read(4096)
+    if head.startswith(MAGIC):
+        return "jpb"
+    return "json" if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{") else "jd"
+
+
+def parse_model_file(filename: str) -> ModelDef:
+    """Parse a model file of any supported source format."""
+    match detect_model_format(filename):
+        case "json":
+            return parse_jd_json_file(filename=filename)
+        case "jpb":
+            raise CompiledModelException(
+                f"compiled model '{filename}' can only be run, not loaded by another model")
+        case _:
+            return parse_jd_file(filename=filename)
+
+
+class ModelCache:
+    """ModelCache parses each JD file only once across several models.
+
+    Cached models are never mutated, class definitions are shared by
+    reference between all the models loading the same file.
+    """
+
+    def __init__(self):
+        self._models: dict[str, ModelDef] = {}
+        self._origins: dict[int, str] = {}
+
+    def parse(self, filename: str) -> ModelDef:
+        jd_file = os.path.abspath(filename)
+        if (model := self._models.get(jd_file)) is None:
+            model = parse_model_file(filename=jd_file)
+            self._models[jd_file] = model
+            for cls in model.class_defs.values():
+                self._origins[id(cls)] = jd_file
+        return model
+
+    @property
+    def files(self) -> list[str]:
+        """The absolute paths of the parsed files."""
+        return list(self._models)
+
+    def origin(self, cls: ClassDef) -> str:
+        """Return the absolute path of the file that defines the class."""
+        return self._origins[id(cls)]
+
+
+def load_jd_file(filename: str, _loaded: set = None, cache: ModelCache = None) -> ModelDef:
+    """load_jd_file is able to load JD files recursively, in any format."""
 
     if _loaded is None:
         _loaded = set()
@@ -101,17 +287,52 @@ def load_jd_file(filename: str, _loaded: set = None) -> ModelDef:
     # save loaded JD file path
     _loaded.add(jd_file)
 
-    model = parse_jd_file(filename=jd_file)
+    if cache is None:
+        model = parse_model_file(filename=jd_file)
+    else:
+        # shallow copy, so that merging loaded files keeps the cache intact.
+        cached = cache.parse(filename=jd_file)
+        model = ModelDef(load_stmts=set(cached.load_stmts),
+                         class_defs=dict(cached.class_defs))
 
     for ld in model.load_stmts.copy():
-        new_model = load_jd_file(ld.path, _loaded)
+        new_model = load_jd_file(ld.path, _loaded, cache)
         model.update(new_model)
 
     return model
 
 
 def _test():
-    pass
+    """test parse_jd"""
+    model = parse_jd('''
+    justification j {
+        evidence   e is "Evidence holds"
+        strategy   s is "Check evidence"
+        conclusion c is "Claim holds"
+        e supports s
+        s supports c
+    }
+    ''')
+    assert list(model.class_defs) == ['j']
+    assert model.class_defs['j'].class_type == ClassType.JUSTIFICATION
+    try:
+        parse_jd('justification j {')
+    except SyntaxException:
+        pass
+
+    """test _JSONObjectReader"""
+    document = '{"a": [1, 2.5e3, -0.5], "b": {"c": "d\\"e"}, "f": null}'
+    for chunk_size in range(1, len(document) + 1):
+        reader = _JSONObjectReader(io.StringIO(document), chunk_size=chunk_size)
+        assert {key: reader.value() for key in reader.members()} == json.loads(document)
+
+    """test detect_model_format"""
+    examples = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'models')
+    if os.path.isdir(examples):
+        assert detect_model_format(os.path.join(examples, '01_slides.jd')) == 'jd'
+        assert detect_model_format(os.path.join(examples, '01_slides.json')) == 'json'
+        assert parse_model_file(os.path.join(examples, '01_slides.jd')).class_defs.keys() \
+               == parse_model_file(os.path.join(examples, '01_slides.json')).class_defs.keys()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+jpipe_runner.report
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the machine-readable results of jPipe Runner.
+"""
+
+import json
+import time
+from typing import Any, Iterable, Iterator
+
+from jpipe_runner.enums import StatusType, VariableType
+from jpipe_runner.sharding import parse_shard
+from jpipe_runner.utils import sanitize_string
+
+REPORT_VERSION = 1
+
+
+def diagram_status(results: Iterable[dict]) -> StatusType | None:
+    """Return the overall status of a justification from its node results.
+
+    A justification passes when all its nodes passed, fails when any node
+    failed, and is skipped when all its nodes were skipped. None is returned
+    for any other combination, which counts neither as passed nor skipped.
+    """
+    statuses = [r['status'] for r in results]
+    if all(s == StatusType.PASS for s in statuses):
+        return StatusType.PASS
+    if any(s == StatusType.FAIL for s in statuses):
+        return StatusType.FAIL
+    if all(s == StatusType.SKIP for s in statuses):
+        return StatusType.SKIP
+    return None
+
+
+class RunReport:
+    """Machine-readable results of a run, which can be dumped, loaded and merged."""
+
+    def __init__(self, diagrams: Iterable[dict] = (), shard: str | None = None):
+        self.diagrams: list[dict] = list(diagrams)
+        self.shard = shard
+
+    def record(self, name: str, results: Iterable[dict]) -> Iterator[dict]:
+        """Pass the node results of a justification through, recording them."""
+        nodes = []
+        start = time.perf_counter()
+        for result in results:
+            nodes.append(result)
+            yield result
+        self.add(name, nodes, time.perf_counter() - start)
+
+    def add(self, name: str, nodes: list[dict], duration: float) -> None:
+        """Add the node results of a justification, justified elsewhere."""
+        status = diagram_status(nodes)
+        self.diagrams.append(dict(
+            name=name,
+            status=status.value if status else None,
+            duration=duration,
+            nodes=[self._dump_node(n) for n in nodes],
+        ))
+
+    @staticmethod
+    def _dump_node(result: dict) -> dict:
+        var_type: VariableType = result['var_type']
+        node = dict(name=result['name'],
+                    var_type=var_type.value,
+                    label=result['label'],
+                    status=result['status'].value,
+                    exception=result.get('exception'))
+        if (component := result.get('component')) is not None:
+            node['component'] = component
+        elif var_type in (VariableType.EVIDENCE, VariableType.STRATEGY) and 'operator' not in result:
+            node['function'] = result.get('function') or sanitize_string(result['label'])
+        if (duration := result.get('duration')) is not None:
+            node['duration'] = duration
+        if result.get('cached'):
+            node['cached'] = True
+        if result.get('replayed'):
+            node['replayed'] = True
+        return node
+
+    @staticmethod
+    def _load_node(node: dict) -> dict:
+        result = dict(node)
+        result['var_type'] = VariableType(node['var_type'])
+        result['status'] = StatusType(node['status'])
+        return result
+
+    def replay(self) -> Iterator[tuple[str, list[dict]]]:
+        """Replay recorded results in the form returned by `JPipeEngine.justify`."""
+        for diagram in self.diagrams:
+            yield diagram['name'], [self._load_node(n) for n in diagram['nodes']]
+
+    @property
+    def summary(self) -> dict[str, int]:
+        statuses = [d['status'] for d in self.diagrams]
+        return dict(total=len(statuses),
+                    passed=statuses.count(StatusType.PASS.value),
+                    failed=statuses.count(StatusType.FAIL.value),
+                    skipped=statuses.count(StatusType.SKIP.value))
+
+    @property
+    def exit_code(self) -> int:
+        # exit 0 only when all justifications passed/skipped
+        summary = self.summary
+        return summary['total'] - summary['passed'] - summary['skipped']
+
+    def to_json(self) -> dict[str, Any]:
+        return dict(version=REPORT_VERSION,
+                    shard=self.shard,
+                    summary=self.summary,
+                    diagrams=self.diagrams)
+
+    def dump(self, filename: str) -> None:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    @classmethod
+    def load(cls, filename: str) -> "RunReport":
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != REPORT_VERSION:
+            raise ValueError(f"unsupported report version in '{filename}': {data.get('version')}")
+        return cls(diagrams=data['diagrams'], shard=data.get('shard'))
+
+    @classmethod
+    def merge(cls, reports: Iterable["RunReport"]) -> "RunReport":
+        """Merge the reports of several runs, e.g. all the shards of a run.
+
+        Raise a ValueError when the reports mix shards of different runs or
+        sharded and unsharded runs, when a shard is missing or repeated, or
+        when a diagram is in several reports, so that the exit code of the
+        merge only ever covers a complete run.
+        """
+        reports = list(reports)
+        if shards := [r.shard for r in reports if r.shard is not None]:
+            if len(shards) != len(reports):
+                raise ValueError("cannot merge the reports of sharded and unsharded runs")
+            parsed = [parse_shard(shard) for shard in shards]
+            if len(totals := {total for _, total in parsed}) > 1:
+                raise ValueError(f"cannot merge the shards of runs with different totals: "
+                                 f"{', '.join(map(str, sorted(totals)))}")
+            total = totals.pop()
+            indices = [index for index, _ in parsed]
+            if duplicates := sorted({i for i in indices if indices.count(i) > 1}):
+                raise ValueError(f"duplicate shards: {', '.join(f'{i}/{total}' for i in duplicates)}")
+            if missing := sorted(set(range(1, total + 1)) - set(indices)):
+                raise ValueError(f"missing shards: {', '.join(f'{i}/{total}' for i in missing)}")
+
+        diagrams: dict[str, dict] = {}
+        for report in reports:
+            for diagram in report.diagrams:
+                if diagram['name'] in diagrams:
+                    raise ValueError(f"diagram '{diagram['name']}' is in several reports")
+                diagrams[diagram['name']] = diagram
+        return cls(diagrams=diagrams.values())
+
+
+def load_durations(filenames: Iterable[str]) -> dict[str, float]:
+    """Load the recorded duration of each justification from reports."""
+    durations = {}
+    for filename in filenames:
+        for diagram in RunReport.load(filename).diagrams:
+            if (duration := diagram.get('duration')) is not None:
+                durations[diagram['name']] = duration
+    return durations
+
+
+def load_function_durations(filenames: Iterable[str]) -> dict[str, float]:
+    """Load the mean recorded duration of each function from reports,
+    leaving out the cached and replayed results."""
+    durations: dict[str, list[float]] = {}
+    for filename in filenames:
+        for diagram in RunReport.load(filename).diagrams:
+            for node in diagram['nodes']:
+                if node.get('function') and not node.get('cached') and not node.get('replayed') \
+                        and (duration := node.get('duration')) is not None:
+                    durations.setdefault(node['function'], []).append(duration)
+    return {k: sum(v) / len(v) for k, v in durations.items()}
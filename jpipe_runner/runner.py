@@ -5,19 +5,32 @@ jpipe_runner.runner
 This module contains the entrypoint of jPipe Runner.
 """
 
+from __future__ import annotations
+
 import argparse
 import fnmatch
 import glob
+import json
 import os.path
 import shutil
 import sys
-from typing import Any, Iterable
-
-from termcolor import colored
-
-from jpipe_runner.enums import StatusType
-from jpipe_runner.jpipe import JPipeEngine, Justification
-from jpipe_runner.runtime import PythonRuntime
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+from jpipe_runner.enums import StatusType, VariableType
+from jpipe_runner.exceptions import RuntimeException
+from jpipe_runner.explain import explain, format_explanation
+from jpipe_runner.report import RunReport, load_durations, load_function_durations
+from jpipe_runner.sharding import parse_shard, diagram_sizes, estimate_costs, shard_diagrams
+from jpipe_runner.utils import format_amount, sanitize_string
+
+# the engine, and the runtimes and their dependencies, are imported on the
+# code paths using them, so that e.g. `--help` or `merge` start fast.
+if TYPE_CHECKING:
+    from jpipe_runner.forkserver import ForkServer
+    from jpipe_runner.jpipe import JPipeEngine
+    from jpipe_runner.runtime import PythonRuntime
+    from jpipe_runner.scheduler import Scheduler
 
 # Generate:
 # - https://patorjk.com/software/taag/#p=display&f=Ivrit&t=jPipe%20%20Runner%0A
@@ -42,30 +55,212 @@ def parse_args(argv=None):
                         help="Specify a Python library to load")
     parser.add_argument("--diagram", "-d", metavar="PATTERN", default="*",
                         help="Specify diagram pattern or wildcard")
+    parser.add_argument("--root", metavar="DIR",
+                        help=("Directory the diagram names of several files are qualified relative to\n"
+                              "(default: the common directory of the files)"))
     parser.add_argument("--output", "-o", metavar="FILE",
-                        help="Output file for generated diagram image")
+                        help=("Output file for generated diagram images, where {name} is replaced\n"
+                              "by the name of each diagram, e.g. docs/{name}.svg, to export them all"))
+    parser.add_argument("--renderer", choices=("auto", "graphviz", "builtin"), default="auto",
+                        help=("Render images with pygraphviz, or with the built-in DOT/SVG writers\n"
+                              "(default: pygraphviz when installed)"))
+    parser.add_argument("--dpi", metavar="N", type=int, default=500,
+                        help="Resolution of the images rendered by pygraphviz (default: 500)")
+    parser.add_argument("--image-cache", metavar="DIR",
+                        help="Cache rendered images in DIR, by a hash of their diagram")
     parser.add_argument("--dry-run", action="store_true",
                         help="Perform a dry run without actually executing justifications")
+    parser.add_argument("--explain", action="store_true",
+                        help=("Dry run explaining the serial cost, critical path and expected wall\n"
+                              "time of each diagram, from --durations and --estimates, with the check\n"
+                              "properties of the -l libraries (all checks are assumed parallel-safe\n"
+                              "without any) and the --resource pools"))
+    parser.add_argument("--explain-format", choices=("text", "json"), default="text",
+                        help="Output format of --explain (default: text)")
+    parser.add_argument("--estimates", metavar="FILE", action="append", default=[],
+                        help="JSON file mapping function names to estimated durations in seconds")
+    parser.add_argument("--jobs", "-j", metavar="N", type=int, default=1,
+                        help=("Number of parallel workers: threads running the parallel-safe checks\n"
+                              "of a diagram, forks of --matrix, or the workers assumed by --explain"))
+    parser.add_argument("--resource", metavar="NAME=AMOUNT", action="append", default=[],
+                        help=("Capacity of a resource pool shared by the checks declaring it, with\n"
+                              "an optional binary suffix, e.g. memory=16G or registry=4"))
+    parser.add_argument("--worker", metavar="HOST:PORT", action="append", default=[],
+                        help=("Call the checks on a remote `jpipe-runner worker` (repeatable), which\n"
+                              "loads its own libraries; --jobs defaults to the slots of the workers,\n"
+                              "and only parallel-safe checks (see @check) run at once"))
+    parser.add_argument("--isolation", choices=("none", "diagram", "node"), default="none",
+                        help=("Run each diagram or each node in a fork of the pre-loaded runtime,\n"
+                              "so that library state does not leak between them (requires fork)"))
+    parser.add_argument("--shard", metavar="INDEX/TOTAL",
+                        help=("Only run the INDEX-th of TOTAL deterministic, duration-balanced\n"
+                              "shards of the selected diagrams, e.g. 1/4"))
+    parser.add_argument("--durations", metavar="FILE", action="append", default=[],
+                        help="Report of a previous run providing recorded durations for --shard/--explain")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Write the machine-readable results of the run to a JSON file")
+    parser.add_argument("--history", metavar="DIR", default=os.environ.get("JPIPE_RUNNER_HISTORY"),
+                        help=("Record the results of the run into the history store of DIR, queried\n"
+                              "with `jpipe-runner history` (default: $JPIPE_RUNNER_HISTORY)"))
+    parser.add_argument("--matrix", metavar="FILE",
+                        help=("Justify the diagrams once per set of variables of a CSV (one set per\n"
+                              "row) or JSONL (one object per line) file, in a fork of the loaded\n"
+                              "runtime per set, streaming one JSON record per set to stdout"))
+    parser.add_argument("--batch-size", metavar="N", type=int, default=1,
+                        help=("Justify the sets of --matrix by batches of N in lockstep, calling the\n"
+                              "batched variants of the checks once per batch (sets of a batch share\n"
+                              "one fork, hence only when every check has a batched variant)"))
     # parser.add_argument("--verbose", "-V", action="store_true",
     #                     help="Enable verbose (debug) output")
-    parser.add_argument("jd_file",
-                        help="Path to the justification .jd file")
+    parser.add_argument("jd_files", metavar="jd_file", nargs="+",
+                        help=("Path to the justification .jd, .json or compiled .jpb file, or a glob\n"
+                              "pattern of files (e.g. 'models/**/*.jd'); several files are merged\n"
+                              "into one run"))
 
     return parser.parse_args(argv)
 
 
-def generate_image(jd: Justification, output: Any) -> None:
-    _, fmt = os.path.splitext(output)
-    match output:
-        case "stdout" | "STDOUT":
-            output = sys.stdout.buffer
-        case "stderr" | "STDERR":
-            output = sys.stderr.buffer
-    jd.export_to_image(path=output,
-                       format=(fmt[1:] if fmt else "png"))
+def expand_jd_files(patterns: Iterable[str]) -> list[str]:
+    """Expand glob patterns into a list of unique justification files."""
+    jd_files, seen = [], set()
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            if not (matches := sorted(glob.glob(pattern, recursive=True))):
+                raise FileNotFoundError(f"No justification file found: {pattern}")
+        else:
+            matches = [pattern]
+        for jd_file in matches:
+            if (path := os.path.abspath(jd_file)) not in seen:
+                seen.add(path)
+                jd_files.append(jd_file)
+    return jd_files
+
+
+def parse_merge_args(argv=None):
+    parser = argparse.ArgumentParser(prog="jpipe-runner merge",
+                                     description="Merge the reports of several runs (e.g. shards)")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Write the merged machine-readable results to a JSON file")
+    parser.add_argument("reports", metavar="report", nargs="+",
+                        help="Path to a report written with --report")
+
+    return parser.parse_args(argv)
+
+
+def parse_compile_args(argv=None):
+    parser = argparse.ArgumentParser(prog="jpipe-runner compile",
+                                     description=("Compile justification files into a binary model, resolved,\n"
+                                                  "expanded and validated once, e.g. at build time"),
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--output", "-o", metavar="FILE", required=True,
+                        help="Output file of the compiled model (e.g. model.jpb)")
+    parser.add_argument("--root", metavar="DIR",
+                        help=("Directory the diagram names of several files are qualified relative to\n"
+                              "(default: the common directory of the files)"))
+    parser.add_argument("jd_files", metavar="jd_file", nargs="+",
+                        help="Path to the justification file, or a glob pattern of files")
+
+    return parser.parse_args(argv)
+
+
+def parse_worker_args(argv=None):
+    parser = argparse.ArgumentParser(prog="jpipe-runner worker",
+                                     description="Serve the checks of Python libraries to remote coordinators")
+    parser.add_argument("--listen", metavar="HOST:PORT", default="localhost:7777",
+                        help="Address to listen on (default: localhost:7777)")
+    parser.add_argument("--library", "-l", action="append", default=[],
+                        help="Specify a Python library to load")
+    parser.add_argument("--jobs", "-j", metavar="N", type=int, default=1,
+                        help="Number of checks called at once")
+
+    return parser.parse_args(argv)
+
+
+def parse_history_args(argv=None):
+    from jpipe_runner.history import QUERIES
+
+    parser = argparse.ArgumentParser(prog="jpipe-runner history",
+                                     description=("Query the history store of the runs recorded with --history:\n"
+                                                  "  slowest  functions with the longest mean duration\n"
+                                                  "  trends   functions whose duration grew the most across runs\n"
+                                                  "  flaky    checks both passing and failing on unchanged inputs\n"
+                                                  "  cache    cache hit rates of the pure checks"),
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--history", metavar="DIR", default=os.environ.get("JPIPE_RUNNER_HISTORY"),
+                        help="Directory of the history store (default: $JPIPE_RUNNER_HISTORY)")
+    parser.add_argument("--runs", metavar="N", type=int,
+                        help="Only query the N latest runs")
+    parser.add_argument("--limit", "-n", metavar="N", type=int, default=20,
+                        help="Number of results (default: 20)")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as JSON")
+    parser.add_argument("query", choices=QUERIES)
+
+    args = parser.parse_args(argv)
+    if not args.history:
+        parser.error("the history directory is required, with --history or $JPIPE_RUNNER_HISTORY")
+    return args
+
+
+def justify_isolated(jpipe: JPipeEngine,
+                     server: ForkServer,
+                     diagram: str,
+                     /,
+                     dry_run: bool = False,
+                     runtime: PythonRuntime = None,
+                     scheduler: Optional[Scheduler] = None,
+                     ) -> Iterator[dict]:
+    """Justify a diagram in a fork of the template process.
+
+    The results are memoized in the template, after justifying the missing
+    components in forks of their own, so that forks of later diagrams
+    inherit them and each component is justified once per run.
+    """
+    if diagram in jpipe.results:
+        yield from jpipe.justify(diagram, dry_run=dry_run, runtime=runtime)
+        return
+
+    if not dry_run:
+        for component in jpipe.components(diagram):
+            if component not in jpipe.results:
+                jpipe.memoize(component, server.iterate(jpipe.justify, component,
+                                                        runtime=runtime,
+                                                        scheduler=scheduler))
+
+    results = []
+    for result in server.iterate(jpipe.justify, diagram,
+                                 dry_run=dry_run,
+                                 runtime=runtime,
+                                 scheduler=scheduler):
+        results.append(result)
+        yield result
+
+    if not dry_run:
+        jpipe.memoize(diagram, results)
+
+
+def check_resources(jpipe: JPipeEngine,
+                    diagrams: Iterable[str],
+                    runtime: PythonRuntime,
+                    scheduler: Scheduler,
+                    ) -> None:
+    """Reject the checks requiring more resources than their pool holds,
+    which could never start."""
+    for diagram in dict.fromkeys(c for d in diagrams for c in (*jpipe.components(d), d)):
+        for _, d in jpipe.justifications[diagram].nodes(data=True):
+            if d['var_type'] not in (VariableType.EVIDENCE, VariableType.STRATEGY) \
+                    or 'component' in d or 'operator' in d:
+                continue
+            fn_name = d.get('function') or sanitize_string(d['label'])
+            if exceeded := scheduler.over_capacity(runtime.spec(fn_name)):
+                raise ValueError(f"function '{fn_name}' requires more resources than available: "
+                                 + ", ".join(f"{k}={format_amount(v)} > {format_amount(scheduler.capacities[k])}"
+                                             for k, v in exceeded.items()))
 
 
 def pretty_display(diagrams: Iterable[tuple[str, Iterable[dict]]]) -> [int, int, int, int]:
+    from termcolor import colored
+
     terminal_width, _ = shutil.get_terminal_size((78, 30))
     width = 78 if terminal_width > 78 else terminal_width
 
@@ -141,10 +336,158 @@ def pretty_display(diagrams: Iterable[tuple[str, Iterable[dict]]]) -> [int, int,
     return total_justifications, passed_justifications, failed_justifications, skipped_justifications
 
 
+def merge_main(argv=None):
+    args = parse_merge_args(argv)
+
+    try:
+        reports = [RunReport.load(i) for i in args.reports]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Invalid report: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        report = RunReport.merge(reports)
+    except ValueError as e:
+        print(f"Cannot merge reports: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    pretty_display(report.replay())
+
+    if args.report:
+        report.dump(args.report)
+
+    sys.exit(report.exit_code)
+
+
+def matrix_main(args: argparse.Namespace,
+                jpipe: JPipeEngine,
+                diagrams: list[str],
+                runtime: PythonRuntime,
+                server: ForkServer,
+                ):
+    from jpipe_runner.matrix import justify_matrix, read_variable_sets, unbatched_checks
+
+    if args.batch_size > 1 and (unbatched := unbatched_checks(jpipe, diagrams, runtime)):
+        print(f"Ignoring --batch-size {args.batch_size}, as some checks have no batched variant: "
+              + ", ".join(unbatched), file=sys.stderr)
+
+    total = failed = 0
+    try:
+        for record in justify_matrix(jpipe, server, diagrams,
+                                     read_variable_sets(args.matrix),
+                                     jobs=args.jobs,
+                                     batch_size=args.batch_size,
+                                     dry_run=args.dry_run,
+                                     runtime=runtime):
+            total += 1
+            failed += record['status'] != "PASS"
+            print(json.dumps(record), flush=True)
+    except (OSError, ValueError) as e:
+        print(f"Invalid matrix: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{total} variable set{'s' if total > 1 else ''}, {total - failed} passed, {failed} failed",
+          file=sys.stderr)
+    # the number of failed sets may be too large for an exit status.
+    sys.exit(min(failed, 255))
+
+
+def worker_main(argv=None):
+    from jpipe_runner.worker import serve
+
+    args = parse_worker_args(argv)
+
+    try:
+        serve(args.listen,
+              libraries=[i for l in args.library for i in glob.glob(l)],
+              slots=args.jobs)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+def history_main(argv=None):
+    from jpipe_runner.history import HistoryException, RunHistory, format_history
+
+    args = parse_history_args(argv)
+
+    try:
+        with RunHistory(args.history) as history:
+            rows = history.query(args.query, limit=args.limit, runs=args.runs)
+    except (HistoryException, OSError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_history(args.query, rows))
+    sys.exit(0)
+
+
+def record_history(args: argparse.Namespace,
+                   report: RunReport,
+                   started: float,
+                   jpipe: JPipeEngine,
+                   libraries: list[str],
+                   variables: list[list[str]],
+                   ) -> None:
+    from jpipe_runner.history import HistoryException, RunHistory, hash_files, hash_variables
+
+    try:
+        with RunHistory(args.history) as history:
+            history.record(report, started,
+                           model_hash=hash_files(jpipe.files),
+                           library_hash=hash_files(libraries),
+                           variables_hash=hash_variables(variables))
+    except (HistoryException, OSError) as e:
+        # the results of the run stand, even when they cannot be recorded.
+        print(f"Cannot record the run: {e}", file=sys.stderr)
+
+
+def compile_main(argv=None):
+    from jpipe_runner.compiled import write_compiled
+    from jpipe_runner.jpipe import JPipeEngine
+
+    args = parse_compile_args(argv)
+
+    try:
+        jd_files = expand_jd_files(args.jd_files)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    jpipe = JPipeEngine(jd_file=jd_files, root=args.root)
+    write_compiled(jpipe.justifications, args.output)
+
+    print(f"{len(jpipe.justifications)} justification"
+          f"{'s' if len(jpipe.justifications) > 1 else ''} compiled into {args.output}",
+          file=sys.stderr)
+    sys.exit(0)
+
+
 def main():
+    if sys.argv[1:2] == ["merge"]:
+        merge_main(sys.argv[2:])
+    if sys.argv[1:2] == ["compile"]:
+        compile_main(sys.argv[2:])
+    if sys.argv[1:2] == ["worker"]:
+        worker_main(sys.argv[2:])
+    if sys.argv[1:2] == ["history"]:
+        history_main(sys.argv[2:])
+
     args = parse_args(sys.argv[1:])
 
-    jpipe = JPipeEngine(jd_file=args.jd_file)
+    from jpipe_runner.jpipe import JPipeEngine
+
+    try:
+        jd_files = expand_jd_files(args.jd_files)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    jpipe = JPipeEngine(jd_file=jd_files, root=args.root)
 
     diagrams = [jd for jd in jpipe.justifications.keys()
                 if fnmatch.fnmatch(jd, args.diagram)]
@@ -153,26 +496,155 @@ def main():
         print(f"No justification diagram found: {args.diagram}", file=sys.stderr)
         sys.exit(1)
 
+    if args.shard:
+        try:
+            index, total = parse_shard(args.shard)
+            durations = load_durations(args.durations)
+        except (OSError, ValueError, KeyError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        costs = estimate_costs(diagram_sizes(jpipe, diagrams), durations)
+        diagrams = shard_diagrams(costs, index, total)
+        if not diagrams:
+            print(f"No justification diagram assigned to shard {args.shard}", file=sys.stderr)
+            if args.report:
+                RunReport(shard=args.shard).dump(args.report)
+            sys.exit(0)
+
+    if args.explain:
+        try:
+            costs = load_function_durations(args.durations)
+            for estimates in args.estimates:
+                with open(estimates, encoding='utf-8') as f:
+                    costs.update(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        specs, capacities = None, None
+        if args.library:
+            from jpipe_runner.runtime import PythonRuntime
+
+            # the declared properties of the checks, e.g. which ones run alone.
+            specs = PythonRuntime(libraries=[i for l in args.library for i in glob.glob(l)]).specs()
+        if args.resource:
+            from jpipe_runner.scheduler import parse_resource
+
+            try:
+                capacities = dict(parse_resource(r) for r in args.resource)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+        explanations = [explain(jpipe.justifications[d], costs, workers=max(args.jobs, 1),
+                                justifications=jpipe.justifications,
+                                specs=specs,
+                                capacities=capacities)
+                        for d in diagrams]
+        if args.explain_format == "json":
+            print(json.dumps(explanations, indent=2))
+        else:
+            print("\n\n".join(format_explanation(e) for e in explanations))
+        sys.exit(0)
+
     if args.output:
-        print("Output is set, generating diagram image...", file=sys.stderr)
-        if len(diagrams) != 1:
-            print("Multiple justification diagrams found, but only one diagram allowed", file=sys.stderr)
+        from jpipe_runner.export import ExportException, export_diagrams
+
+        print("Output is set, generating diagram images...", file=sys.stderr)
+        try:
+            for name, path, cached in export_diagrams({d: jpipe.justifications[d] for d in diagrams},
+                                                      args.output,
+                                                      renderer=args.renderer,
+                                                      dpi=args.dpi,
+                                                      jobs=args.jobs,
+                                                      cache_dir=args.image_cache):
+                print(f"{name} -> {path}{' (cached)' if cached else ''}", file=sys.stderr)
+        except (ExportException, ImportError, OSError) as e:
+            print(e, file=sys.stderr)
             sys.exit(1)
-        generate_image(jpipe.justifications[diagrams[0]],
-                       args.output)
         sys.exit(0)
 
-    runtime = PythonRuntime(libraries=[i for l in args.library
-                                       for i in glob.glob(l)],
-                            variables=[i.split(':', maxsplit=1)
-                                       for i in args.variable
-                                       if i.find(':')])
+    variables = [i.split(':', maxsplit=1)
+                 for i in args.variable
+                 if i.find(':')]
+    libraries = [i for l in args.library
+                 for i in glob.glob(l)]
+
+    if args.worker:
+        if args.isolation != "none" or args.matrix:
+            print("Remote workers cannot be used with --isolation or --matrix", file=sys.stderr)
+            sys.exit(1)
+        from jpipe_runner.worker import RemoteRuntime
+
+        try:
+            runtime = RemoteRuntime(args.worker, variables)
+        except RuntimeException as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        if args.jobs == 1:
+            args.jobs = runtime.slots
+    else:
+        from jpipe_runner.runtime import PythonRuntime
+
+        runtime = PythonRuntime(libraries=libraries,
+                                variables=variables)
+
+    server = None
+    if args.isolation != "none" or args.matrix:
+        from jpipe_runner.forkserver import ForkServer, ForkedRuntime
+
+        try:
+            server = ForkServer()
+        except RuntimeException as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
+    if args.isolation == "node":
+        if args.jobs > 1 and not args.matrix:
+            print("Node isolation cannot run checks in parallel, use --jobs 1", file=sys.stderr)
+            sys.exit(1)
+        runtime = ForkedRuntime(runtime, server)
+
+    if args.matrix:
+        matrix_main(args, jpipe, diagrams, runtime, server)
+
+    scheduler = None
+    if args.jobs > 1 or args.resource:
+        from jpipe_runner.scheduler import Scheduler, parse_resource
 
-    m, n, _, s = pretty_display((d, jpipe.justify(d,
-                                                  dry_run=args.dry_run,
-                                                  runtime=runtime))
+        try:
+            pools = Scheduler(args.jobs, dict(parse_resource(r) for r in args.resource))
+            check_resources(jpipe, diagrams, runtime, pools)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        # one check at a time always fits in the pools.
+        scheduler = pools if args.jobs > 1 else None
+
+    def justify(diagram: str) -> Iterable[dict]:
+        if args.isolation == "diagram":
+            return justify_isolated(jpipe, server, diagram,
+                                    dry_run=args.dry_run,
+                                    runtime=runtime,
+                                    scheduler=scheduler)
+        return jpipe.justify(diagram,
+                             dry_run=args.dry_run,
+                             runtime=runtime,
+                             scheduler=scheduler)
+
+    report = RunReport(shard=args.shard)
+    started = time.time()
+
+    m, n, _, s = pretty_display((d, report.record(d, justify(d)))
                                 for d in diagrams)
 
+    if args.report:
+        report.dump(args.report)
+
+    if args.history and not args.dry_run:
+        record_history(args, report, started, jpipe, libraries, variables)
+
+    if args.worker:
+        runtime.close()
+
     # exit 0 only when all justifications passed/skipped
     sys.exit(m - n - s)
 
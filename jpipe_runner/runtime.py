@@ -7,10 +7,12 @@ This module contains the runtimes that can be used by jPipe Runner.
 
 import importlib.util
 import os
+import threading
 from ast import literal_eval
 from typing import Any, Iterable, Optional, Tuple
 
-from jpipe_runner.exceptions import RuntimeException
+from jpipe_runner.exceptions import CheckTimeoutError, FunctionException, RuntimeException
+from jpipe_runner.library import DEFAULT_SPEC, SPEC_ATTR, CheckSpec
 from jpipe_runner.utils import group_github_logs
 
 
@@ -22,6 +24,8 @@ class PythonRuntime:
                  variables: Optional[Iterable[Tuple[str, str]]] = None,
                  ):
         self._modules = []
+        # declared properties of the checks, see `jpipe_runner.library.check`.
+        self._specs: dict[str, CheckSpec] = {}
         self.load_files(libraries or [])
 
         for k, v in variables or []:
@@ -44,6 +48,10 @@ class PythonRuntime:
         spec.loader.exec_module(module)
 
         self._modules.append(module)
+        for name, value in vars(module).items():
+            if callable(value) and hasattr(value, SPEC_ATTR):
+                # the first module defining a function is the one called.
+                self._specs.setdefault(name, getattr(value, SPEC_ATTR))
 
     def _find_modules_by_attr(self, name: str) -> list[Any]:
         if modules := [module for module in self._modules if name in dir(module)]:
@@ -58,6 +66,67 @@ class PythonRuntime:
         with group_github_logs():
             return self.__getattr__(name)(*args, **kwargs)
 
+    def spec(self, name: str) -> CheckSpec:
+        """Return the declared properties of a function."""
+        return self._specs.get(name, DEFAULT_SPEC)
+
+    def specs(self) -> dict[str, CheckSpec]:
+        """Return the declared properties of the functions declaring any."""
+        return dict(self._specs)
+
+    def call_check(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Call a function, failing with a CheckTimeoutError after `timeout` seconds.
+
+        A timed out function cannot be interrupted, it is left running in a
+        daemon thread, and the `running` future of the error is done once it
+        returns, so that a scheduler holds its slot and resources until then.
+        Only the forks of `--isolation node` are killed, see `ForkedRuntime`.
+        """
+        if timeout is None:
+            return self.call_function(name)
+
+        # imported here, as runs without timeouts never need futures.
+        from concurrent.futures import Future, wait
+
+        future = Future()
+
+        def target():
+            try:
+                future.set_result(self.call_function(name))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name=f"jpipe-{name}", daemon=True).start()
+        if not wait([future], timeout).done:
+            raise CheckTimeoutError(f"function '{name}' timed out after {timeout}s", running=future)
+        return future.result()
+
+    def call_batch(self, name: str, variable_sets: list[dict[str, Any]]) -> list[Any]:
+        """Call a function for each set of variables, with its batched variant
+        when registered (see `jpipe_runner.library.batch`), or once per set
+        after setting its variables otherwise, the sets sharing the library
+        state. Exceptions of single sets are returned in place of their
+        results."""
+        self.__getattr__(name)  # the function must exist.
+        if (batched := self.spec(name).batch) is not None:
+            with group_github_logs():
+                results = list(batched(variable_sets))
+            if len(results) != len(variable_sets):
+                raise FunctionException(
+                    f"batched variant of '{name}' returns {len(results)} results "
+                    f"for {len(variable_sets)} variable sets")
+            return results
+
+        results = []
+        for variables in variable_sets:
+            try:
+                for k, v in variables.items():
+                    self.set_variable(k, v)
+                results.append(self.call_function(name))
+            except Exception as e:
+                results.append(e)
+        return results
+
     def set_variable(self, name: str, value: Any) -> None:
         modules = self._find_modules_by_attr(name)
         for module in modules:
@@ -0,0 +1,166 @@
+"""
+jpipe_runner.scheduler
+~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the parallel scheduling of the checks of a justification.
+"""
+
+import heapq
+import itertools
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Mapping, Optional
+
+from jpipe_runner.exceptions import RuntimeException
+from jpipe_runner.library import CheckSpec
+from jpipe_runner.utils import parse_amount
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+
+def parse_resource(resource: str) -> tuple[str, float]:
+    """Parse a resource pool specification NAME=AMOUNT, e.g. memory=16G."""
+    name, sep, amount = resource.partition('=')
+    if not sep or not name.strip():
+        raise ValueError(f"invalid resource '{resource}', expected NAME=AMOUNT")
+    return name.strip(), parse_amount(amount)
+
+
+class Scheduler:
+    """Run the checks of a justification on a pool of threads.
+
+    A node is ready once all its predecessors are done, and ready checks
+    start first come, first served: parallel-safe checks run concurrently,
+    up to `jobs` at once and while the resource pools hold their
+    requirements, and any other check runs alone. Nodes without a check are
+    evaluated inline.
+
+    A check waiting for a slot or resources is never overtaken by a later
+    check competing for them, so that it does not starve, and since no check
+    requires more than a pool holds, the first waiting check can always
+    start once the running ones are done.
+
+    A timed out check left running (where fork is not supported) holds its
+    slot and resources until it returns, or for its timeout again, after
+    which it is given up while it may still be running.
+    """
+
+    def __init__(self, jobs: int = 1, capacities: Optional[Mapping[str, float]] = None):
+        self.jobs = max(jobs, 1)
+        self.capacities = dict(capacities or {})
+        # timed out checks left running, which hold their slot and resources
+        # until they are done or given up, across the justifications of a run.
+        self._timed_out: dict["Future", tuple[CheckSpec, float]] = {}
+
+    def over_capacity(self, spec: CheckSpec) -> dict[str, float]:
+        """Return the requirements of a check exceeding the capacity of their pool."""
+        return {k: v for k, v in spec.resources.items()
+                if k in self.capacities and v > self.capacities[k]}
+
+    def fits(self, spec: CheckSpec, running: Mapping[Any, tuple[Optional[str], CheckSpec]], held: Counter) -> bool:
+        """Return whether a check can start next to the running ones, which
+        hold the `held` amount of each resource."""
+        if not running:
+            return True
+        if len(running) >= self.jobs or not spec.parallel_safe \
+                or any(not s.parallel_safe for _, s in running.values()):
+            return False
+        return all(held[k] + v <= self.capacities[k]
+                   for k, v in spec.resources.items() if k in self.capacities)
+
+    def run(self,
+            jd: Any,
+            evaluate: Callable[[str, Any], dict],
+            check: Callable[[str, Any], Optional[CheckSpec]],
+            ) -> Iterator[dict]:
+        """Evaluate the nodes of a justification, yielding their results in
+        justify order.
+
+        `evaluate(node, attr)` returns the result of a node, and
+        `check(node, attr)` the properties of the check it would call, or
+        None when it does not call any. A result may hold, as `running`, the
+        future of a timed out check left running: it is reported right away,
+        but its slot and resources are only released once the future is done,
+        or once its timeout elapsed again.
+        """
+        # imported here, as runs without --jobs never need a pool of threads.
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        order = jd.justify_order()
+        position = {n: i for i, n in enumerate(order)}
+        waiting = {n: jd.in_degree(n) for n in order}
+        arrival = itertools.count()
+        # ready nodes, first come (then in justify order), first served.
+        ready = [(next(arrival), position[n], n) for n in order if waiting[n] == 0]
+        results: dict[str, dict] = {}
+        # the checks of timed out nodes are running without a node.
+        running: dict["Future", tuple[Optional[str], CheckSpec]] = {
+            future: (None, spec) for future, (spec, _) in self._timed_out.items()}
+        held = Counter()
+        for spec, _ in self._timed_out.values():
+            held.update(spec.resources)
+        emitted = 0
+
+        def complete(n: str, result: dict) -> None:
+            results[n] = result
+            for child in jd.successors(n):
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    heapq.heappush(ready, (next(arrival), position[child], child))
+
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="jpipe") as pool:
+            while emitted < len(order):
+                blocked = []
+                # resources claimed by waiting checks, which later ones cannot take.
+                reserved, barrier = set(), False
+                while ready:
+                    entry = heapq.heappop(ready)
+                    n = entry[2]
+                    attr = jd.nodes[n]
+                    if (spec := check(n, attr)) is None:
+                        complete(n, evaluate(n, attr))
+                        continue
+                    if exceeded := self.over_capacity(spec):
+                        raise RuntimeException(
+                            f"node '{n}' requires more resources than available: {exceeded}")
+                    if not barrier and reserved.isdisjoint(spec.resources) \
+                            and self.fits(spec, running, held):
+                        running[pool.submit(evaluate, n, attr)] = (n, spec)
+                        held.update(spec.resources)
+                        continue
+                    blocked.append(entry)
+                    reserved.update(spec.resources)
+                    # a check waiting for a slot, or to run alone, holds back the next ones.
+                    barrier |= not spec.parallel_safe or len(running) >= self.jobs
+                for entry in blocked:
+                    heapq.heappush(ready, entry)
+
+                while emitted < len(order) and order[emitted] in results:
+                    yield results.pop(order[emitted])
+                    emitted += 1
+
+                # timed out checks still running are not waited for once all nodes are done.
+                if running and emitted < len(order):
+                    deadlines = [deadline for _, deadline in self._timed_out.values()]
+                    timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                    finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        n, spec = running.pop(future)
+                        if n is None:
+                            del self._timed_out[future]
+                            held.subtract(spec.resources)
+                            continue
+                        result = future.result()
+                        if (timed_out := result.pop('running', None)) is not None and not timed_out.done():
+                            running[timed_out] = (None, spec)
+                            self._timed_out[timed_out] = (spec, time.monotonic() + spec.timeout)
+                        else:
+                            held.subtract(spec.resources)
+                        complete(n, result)
+                    # timed out checks still running after their timeout again are given up.
+                    now = time.monotonic()
+                    for future, (spec, deadline) in list(self._timed_out.items()):
+                        if deadline <= now:
+                            del self._timed_out[future], running[future]
+                            held.subtract(spec.resources)
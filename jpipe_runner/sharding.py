@@ -0,0 +1,60 @@
+"""
+jpipe_runner.sharding
+~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the sharding of justifications across runner invocations.
+"""
+
+from typing import Any, Iterable, Mapping, Optional
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parse a shard specification INDEX/TOTAL, where INDEX starts from 1."""
+    try:
+        index, total = (int(i) for i in shard.split('/', maxsplit=1))
+    except ValueError as e:
+        raise ValueError(f"invalid shard '{shard}', expected INDEX/TOTAL") from e
+    if not 1 <= index <= total:
+        raise ValueError(f"invalid shard '{shard}', INDEX must be between 1 and TOTAL")
+    return index, total
+
+
+def diagram_sizes(jpipe: Any, diagrams: Iterable[str]) -> dict[str, int]:
+    """Return the number of nodes of each justification, including the ones
+    of its components (transitively), which are justified in its shard."""
+    return {d: sum(len(jpipe.justifications[j].nodes) for j in [*jpipe.components(d), d])
+            for d in diagrams}
+
+
+def estimate_costs(sizes: Mapping[str, int],
+                   durations: Optional[Mapping[str, float]] = None,
+                   ) -> dict[str, float]:
+    """Estimate the cost of each justification.
+
+    Recorded durations are used when available. Otherwise, the cost is
+    estimated from the number of nodes, scaled by the average recorded
+    duration per node so that both kinds of costs remain comparable.
+    """
+    durations = {k: v for k, v in (durations or {}).items() if k in sizes}
+    recorded_nodes = sum(sizes[k] for k in durations)
+    per_node = (sum(durations.values()) / recorded_nodes) if recorded_nodes else 1.0
+    return {name: durations.get(name, size * per_node)
+            for name, size in sizes.items()}
+
+
+def shard_diagrams(costs: Mapping[str, float], index: int, total: int) -> list[str]:
+    """Return the justifications assigned to a shard, balanced by cost.
+
+    The assignment is deterministic for the same costs: justifications are
+    taken from the most to the least expensive (ties broken by name), each
+    one going to the least loaded shard (ties broken by shard index).
+    """
+    loads = [0.0] * total
+    shards: list[list[str]] = [[] for _ in range(total)]
+    for name in sorted(costs, key=lambda k: (-costs[k], k)):
+        i = min(range(total), key=lambda j: (loads[j], j))
+        loads[i] += costs[name]
+        shards[i].append(name)
+    selected = set(shards[index - 1])
+    # keep the original order of the justifications.
+    return [name for name in costs if name in selected]
@@ -5,7 +5,7 @@ jpipe_runner.transformer
 This module contains the transformer for jPipe Lark Grammar.
 """
 
-from typing import Any, Iterable
+from typing import Iterable, Optional
 
 import lark
 from lark import Transformer, v_args
@@ -19,8 +19,10 @@ from jpipe_runner.models import (ModelDef,
                                  ClassDef,
                                  VariableDef,
                                  SupportDef,
+                                 Supports,
                                  JustificationDef,
-                                 CompositionDef)
+                                 CompositionDef,
+                                 CompositionInfo)
 
 
 # noinspection PyMethodMayBeStatic
@@ -67,7 +69,7 @@ class JPipeTransformer(Transformer):
                               items: Iterable[VariableDef | SupportDef],
                               ) -> JustificationDef:
         return JustificationDef(
-            supports=set(i for i in items if isinstance(i, SupportDef)),
+            supports=Supports(i for i in items if isinstance(i, SupportDef)),
             variables=dict((i.name, i) for i in items if isinstance(i, VariableDef)),
         )
 
@@ -93,20 +95,37 @@ class JPipeTransformer(Transformer):
         return SupportDef(left=left,
                           right=right)
 
-    def composition(self, items: Iterable[Any]) -> CompositionDef:
-        return CompositionDef(
-            compositions=dict((str(i), i) for i in items),
-        )
+    def composition(self,
+                    items: Iterable[str | tuple[str, CompositionInfo]],
+                    ) -> CompositionDef:
+        compositions: dict[str, Optional[CompositionInfo]] = {}
+        for item in items:
+            match item:
+                case (name, info):
+                    compositions[name] = info
+                case name:
+                    # declaration only, defined by an instruction.
+                    compositions.setdefault(name, None)
+        return CompositionDef(compositions=compositions)
+
+    @v_args(inline=True)
+    def composition_variable(self, name: str) -> str:
+        return name
 
-    # TODO: add support for composition class.
-    # def composition_variable(self, items):
-    #     return {"composition_variable": {"justification": items[0]}}
-    #
-    # def composition_instruction(self, items):
-    #     return {"composition_instruction": {"variable": items[0], "information": items[1]}}
-    #
-    # def composition_information(self, items):
-    #     return {"information": {"id1": items[0], "id2": items[1]}}
+    @v_args(inline=True)
+    def composition_instruction(self,
+                                name: str,
+                                info: CompositionInfo,
+                                ) -> tuple[str, CompositionInfo]:
+        return name, info
+
+    @v_args(inline=True)
+    def composition_information(self,
+                                left: str,
+                                right: str,
+                                ) -> CompositionInfo:
+        return CompositionInfo(left=left,
+                               right=right)
 
     # LEXER tokens
     def CLASS_TYPE(self, token: lark.Token) -> ClassType:
@@ -47,7 +47,35 @@ def sanitize_string(s: str) -> str:
     return sanitized
 
 
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_amount(amount: str | int | float) -> float:
+    """Parse an amount of a resource, with an optional binary suffix, e.g. 16G."""
+    if isinstance(amount, int | float):
+        return float(amount)
+    if not (m := re.fullmatch(r'\s*(\d+(?:\.\d*)?|\.\d+)\s*([KMGT]?)B?\s*', amount, re.IGNORECASE)):
+        raise ValueError(f"invalid amount '{amount}'")
+    return float(m.group(1)) * _UNITS[m.group(2).upper()]
+
+
+def format_amount(amount: float) -> str:
+    """Format an amount of a resource, with the largest exact binary suffix."""
+    for unit, size in reversed(_UNITS.items()):
+        if size > 1 and amount >= size and amount % size == 0:
+            return f"{amount / size:g}{unit}"
+    return f"{amount:g}"
+
+
 def _test():
+    """test parse_amount"""
+    assert parse_amount('4') == 4
+    assert parse_amount('16G') == 16 << 30
+    assert parse_amount('512 MB') == 512 << 20
+    assert parse_amount(0.5) == 0.5
+    assert format_amount(parse_amount('16G')) == '16G'
+    assert format_amount(4) == '4'
+
     """test unquote_string"""
     assert unquote_string('"hello"') == 'hello'
     try:
@@ -0,0 +1,354 @@
+"""
+jpipe_runner.worker
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the distributed worker protocol of jPipe Runner.
+
+A coordinator, i.e. a run with `--worker HOST:PORT`, schedules the nodes of
+its justifications as usual, but sends the checks of the ready nodes over
+TCP to `jpipe-runner worker` processes, which call them in their own
+`PythonRuntime`. Messages are JSON objects, one per line:
+
+    coordinator -> worker
+        {"type": "hello", "variables": [[name, value], ...]}
+        {"type": "call", "id": 1, "function": "nda_is_signed", "timeout": null}
+        {"type": "bye"}
+
+    worker -> coordinator
+        {"type": "ready", "slots": 2, "specs": {"nda_is_signed": {...}}}
+        {"type": "result", "id": 1, "truth": true, "repr": "True", "exception": null}
+        {"type": "heartbeat"}
+        {"type": "error", "message": "..."}
+
+Workers load their libraries from their command line, and the variables of
+the coordinator on each connection. The coordinator schedules the checks as
+with `--jobs`: only parallel-safe checks (see `jpipe_runner.library.check`)
+run at once, any other check runs alone, so undecorated checks do not run
+any faster with more workers. Pure checks are cached by the coordinator,
+except the ones declaring a `cache_key`, which is only known on the
+workers. A worker which closes the connection or misses its heartbeats is
+lost, and its calls are sent to other workers.
+"""
+
+import builtins
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+
+from jpipe_runner import exceptions
+from jpipe_runner.exceptions import CheckTimeoutError, RuntimeException
+from jpipe_runner.library import CheckSpec, DEFAULT_SPEC
+from jpipe_runner.runtime import PythonRuntime
+
+# seconds between the heartbeats of a worker.
+HEARTBEAT_INTERVAL = 1.0
+# seconds without any message after which a worker is lost.
+HEARTBEAT_TIMEOUT = 10.0
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """Parse an address HOST:PORT, where an IPv6 host is in brackets."""
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"invalid address '{address}', expected HOST:PORT")
+    return host.strip('[]') or "localhost", int(port)
+
+
+def _send(sock: socket.socket, message: dict) -> None:
+    sock.sendall(json.dumps(message).encode('utf-8') + b"\n")
+
+
+class _RemoteResult:
+    """Stand-in for the result of a remote call."""
+
+    def __init__(self, truth: bool, value: str):
+        self._truth = truth
+        self._repr = value
+
+    def __bool__(self) -> bool:
+        return self._truth
+
+    def __repr__(self) -> str:
+        return self._repr
+
+
+def _exception(name: str, message: str) -> Exception:
+    # rebuild well-known exceptions, so that they are reported as on a local call.
+    cls = getattr(exceptions, name, None) or getattr(builtins, name, None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(message)
+        except Exception:
+            pass
+    return RuntimeException(f"{name}: {message}")
+
+
+def _dump_spec(spec: CheckSpec) -> dict:
+    return dict(pure=spec.pure,
+                parallel_safe=spec.parallel_safe,
+                timeout=spec.timeout,
+                resources=dict(spec.resources),
+                cache_key=spec.cache_key is not None)
+
+
+def _load_spec(spec: dict) -> CheckSpec:
+    # the key of a cached result is only known on the worker, hence the
+    # coordinator calls the pure checks declaring a `cache_key` every time.
+    return CheckSpec(pure=spec['pure'] and not spec.get('cache_key'),
+                     parallel_safe=spec['parallel_safe'],
+                     timeout=spec['timeout'],
+                     resources=spec['resources'])
+
+
+class _Call:
+
+    def __init__(self, call_id: int, function: str, timeout: Optional[float]):
+        self.id = call_id
+        self.function = function
+        self.timeout = timeout
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exception: Optional[Exception] = None
+
+
+class _Worker:
+
+    def __init__(self, address: str, sock: socket.socket, reader: Any, slots: int):
+        self.address = address
+        self.sock = sock
+        self.reader = reader
+        self.slots = slots
+        self.calls: dict[int, _Call] = {}
+        self.last_seen = time.monotonic()
+
+
+class RemoteRuntime:
+    """A runtime calling every function on remote workers.
+
+    Calls are queued, and sent to the workers with a free slot in order. The
+    calls of a lost worker are sent again to the others, hence checks should
+    tolerate running more than once.
+    """
+
+    def __init__(self,
+                 addresses: Iterable[str],
+                 variables: Optional[Iterable[tuple[str, str]]] = None,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+                 ):
+        self._lock = threading.Lock()
+        self._queue: deque[_Call] = deque()
+        self._workers: list[_Worker] = []
+        self._specs: dict[str, CheckSpec] = {}
+        self._ids = 0
+        self._heartbeat_timeout = heartbeat_timeout
+        self._closed = threading.Event()
+
+        hello = dict(type="hello", variables=[list(v) for v in variables or []])
+        for address in addresses:
+            self._workers.append(worker := self._connect(address, hello))
+            threading.Thread(target=self._read, args=(worker,),
+                             name=f"jpipe-worker-{address}", daemon=True).start()
+        threading.Thread(target=self._monitor, name="jpipe-heartbeats", daemon=True).start()
+
+    def _connect(self, address: str, hello: dict) -> _Worker:
+        try:
+            sock = socket.create_connection(parse_address(address), timeout=self._heartbeat_timeout)
+            _send(sock, hello)
+            reader = sock.makefile('rb')
+            ready = json.loads(reader.readline() or b"null")
+        except (OSError, ValueError) as e:
+            raise RuntimeException(f"cannot connect to worker {address}: {e}") from e
+        if not ready or ready.get('type') != "ready":
+            message = ready.get('message') if ready else "connection closed"
+            raise RuntimeException(f"worker {address} is not ready: {message}")
+        sock.settimeout(None)
+        for name, spec in ready['specs'].items():
+            self._specs.setdefault(name, _load_spec(spec))
+        return _Worker(address, sock, reader, ready['slots'])
+
+    @property
+    def slots(self) -> int:
+        """The number of calls the workers can run at once."""
+        with self._lock:
+            return sum(w.slots for w in self._workers)
+
+    def spec(self, name: str) -> CheckSpec:
+        return self._specs.get(name, DEFAULT_SPEC)
+
+    def _dispatch(self) -> None:
+        # with the lock held, to the least loaded workers.
+        while self._queue:
+            if not (free := [w for w in self._workers if len(w.calls) < w.slots]):
+                break
+            worker = min(free, key=lambda w: len(w.calls) / w.slots)
+            call = self._queue.popleft()
+            worker.calls[call.id] = call
+            try:
+                _send(worker.sock, dict(type="call", id=call.id,
+                                        function=call.function, timeout=call.timeout))
+            except OSError:
+                # the call is sent again once the worker is found lost.
+                pass
+        if not self._workers:
+            while self._queue:
+                call = self._queue.popleft()
+                call.exception = RuntimeException("no worker left to call function "
+                                                  f"'{call.function}'")
+                call.done.set()
+
+    def _lost(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker not in self._workers:
+                return
+            self._workers.remove(worker)
+            print(f"Worker {worker.address} lost, sending its {len(worker.calls)} call(s) "
+                  f"to {len(self._workers)} other worker(s)", file=sys.stderr)
+            # calls of the lost worker go first, in their original order.
+            self._queue.extendleft(sorted(worker.calls.values(), key=lambda c: c.id, reverse=True))
+            worker.calls.clear()
+            self._dispatch()
+        try:
+            worker.sock.close()
+        except OSError:
+            pass
+
+    def _read(self, worker: _Worker) -> None:
+        try:
+            for line in worker.reader:
+                message = json.loads(line)
+                worker.last_seen = time.monotonic()
+                if message['type'] != "result":
+                    continue
+                with self._lock:
+                    if (call := worker.calls.pop(message['id'], None)) is None:
+                        continue
+                    if message['exception'] is not None:
+                        call.exception = _exception(*message['exception'])
+                    else:
+                        call.result = _RemoteResult(message['truth'], message['repr'])
+                    call.done.set()
+                    self._dispatch()
+        except (OSError, ValueError):
+            pass
+        if not self._closed.is_set():
+            self._lost(worker)
+
+    def _monitor(self) -> None:
+        while not self._closed.wait(self._heartbeat_timeout / 4):
+            now = time.monotonic()
+            with self._lock:
+                lost = [w for w in self._workers if now - w.last_seen > self._heartbeat_timeout]
+            for worker in lost:
+                self._lost(worker)
+
+    def call_check(self, name: str, timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            self._ids += 1
+            call = _Call(self._ids, name, timeout)
+            self._queue.append(call)
+            self._dispatch()
+        call.done.wait()
+        if call.exception is not None:
+            raise call.exception
+        return call.result
+
+    def call_function(self, name: str) -> Any:
+        return self.call_check(name)
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    _send(worker.sock, dict(type="bye"))
+                    worker.sock.close()
+                except OSError:
+                    pass
+            self._workers.clear()
+
+
+def _handle(conn: socket.socket,
+            libraries: list[str],
+            slots: int,
+            heartbeat_interval: float,
+            ) -> None:
+    send_lock = threading.Lock()
+    stop = threading.Event()
+
+    def send(message: dict) -> None:
+        with send_lock:
+            _send(conn, message)
+
+    reader = conn.makefile('rb')
+    hello = json.loads(reader.readline() or b"null")
+    if not hello or hello.get('type') != "hello":
+        return
+    try:
+        runtime = PythonRuntime(libraries=libraries, variables=hello['variables'])
+    except Exception as e:
+        send(dict(type="error", message=f"{type(e).__name__}: {e}"))
+        return
+    send(dict(type="ready", slots=slots,
+              specs={k: _dump_spec(v) for k, v in runtime.specs().items()}))
+
+    def heartbeat():
+        try:
+            while not stop.wait(heartbeat_interval):
+                send(dict(type="heartbeat"))
+        except OSError:
+            pass
+
+    def run(message: dict):
+        result = dict(type="result", id=message['id'], truth=None, repr=None, exception=None)
+        running = None
+        try:
+            res = runtime.call_check(message['function'], timeout=message['timeout'])
+            result.update(truth=bool(res), repr=repr(res))
+        except Exception as e:
+            result['exception'] = (type(e).__name__, str(e))
+            if isinstance(e, CheckTimeoutError):
+                running = e.running
+        try:
+            send(result)
+        except OSError:
+            pass  # the coordinator sends the call again to another worker.
+        if running is not None:
+            # a timed out check holds its slot until it is done.
+            running.exception()
+
+    threading.Thread(target=heartbeat, name="jpipe-heartbeat", daemon=True).start()
+    with ThreadPoolExecutor(max_workers=slots, thread_name_prefix="jpipe") as pool:
+        try:
+            for line in reader:
+                message = json.loads(line)
+                match message['type']:
+                    case "call":
+                        pool.submit(run, message)
+                    case "bye":
+                        break
+        finally:
+            stop.set()
+
+
+def serve(address: str,
+          libraries: list[str],
+          slots: int = 1,
+          heartbeat_interval: float = HEARTBEAT_INTERVAL,
+          ) -> None:
+    """Serve coordinators, one at a time, calling the functions of the libraries."""
+    with socket.create_server(parse_address(address)) as server:
+        host, port = server.getsockname()[:2]
+        print(f"jPipe Runner worker listening on {host}:{port}", flush=True)
+        while True:
+            conn, peer = server.accept()
+            with conn:
+                print(f"Coordinator connected from {peer[0]}:{peer[1]}", flush=True)
+                try:
+                    _handle(conn, libraries, max(slots, 1), heartbeat_interval)
+                except (OSError, ValueError) as e:
+                    print(f"Coordinator connection lost: {e}", flush=True)
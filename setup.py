@@ -11,6 +11,9 @@ setup(
     url="https://github.com/ace-design/jpipe-runner",
     packages=find_packages(),
     install_requires=open("requirements.txt").read().splitlines(),
+    extras_require={
+        "export": ["networkx>=3.4.2,<4", "pygraphviz>=1.14"],
+    },
     python_requires=">=3.10",
     entry_points={
         "console_scripts": [
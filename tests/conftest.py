@@ -0,0 +1,19 @@
+import textwrap
+
+import pytest
+
+
+@pytest.fixture
+def write(tmp_path):
+    """Write a dedented file into the temporary directory, returning its path."""
+
+    def write(name: str, content: str | bytes) -> str:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(textwrap.dedent(content))
+        return str(path)
+
+    return write
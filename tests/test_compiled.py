@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from jpipe_runner.compiled import MAGIC, CompiledModelException, write_compiled
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.runtime import PythonRuntime
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "examples")
+MODELS = ["01_slides.jd", "01_slides.json", "02_quality_full.jd", "03_quality_compo.jd", "04_pattern.jd"]
+
+
+def _compile(model: str, tmp_path) -> tuple[JPipeEngine, JPipeEngine]:
+    source = JPipeEngine(os.path.join(EXAMPLES, "models", model))
+    write_compiled(source.justifications, filename := str(tmp_path / "model.jpb"))
+    return source, JPipeEngine(filename)
+
+
+def _comparable(results) -> list[dict]:
+    # compiled nodes carry their precomputed function names.
+    return [{k: v for k, v in r.items() if k not in ('function', 'duration')} for r in results]
+
+
+@pytest.mark.parametrize("model", MODELS)
+def test_compiled_models_round_trip(model, tmp_path):
+    source, compiled = _compile(model, tmp_path)
+    assert list(compiled.justifications) == list(source.justifications)
+    for name, jd in source.justifications.items():
+        loaded = compiled.justifications[name]
+        assert _comparable(a for _, a in loaded.nodes(data=True)) == _comparable(a for _, a in jd.nodes(data=True))
+        assert list(loaded.nodes) == list(jd.nodes)
+        assert list(loaded.edges) == list(jd.edges)
+        assert loaded.justify_order() == jd.justify_order()
+        assert _comparable(compiled.justify(name, dry_run=True)) == _comparable(source.justify(name, dry_run=True))
+        assert compiled.functions(name) == source.functions(name)
+
+
+def test_compiled_models_justify_like_their_source(tmp_path):
+    source, compiled = _compile("01_slides.jd", tmp_path)
+    variables = [("signature", "jason"), ("available", "yes")]
+    libraries = [os.path.join(EXAMPLES, "libraries", "slides.py")]
+    expected = list(source.justify("slides", runtime=PythonRuntime(libraries, variables)))
+    results = list(compiled.justify("slides", runtime=PythonRuntime(libraries, variables)))
+    assert _comparable(results) == _comparable(expected)
+
+
+@pytest.mark.parametrize("content", [b"", MAGIC, MAGIC + b"\xff" * 64])
+def test_invalid_compiled_models(content, tmp_path):
+    (path := tmp_path / "model.jpb").write_bytes(content)
+    with pytest.raises(CompiledModelException):
+        JPipeEngine(str(path))
+
+
+def test_interrupted_compiles_keep_the_previous_model(tmp_path, monkeypatch):
+    source, _ = _compile("01_slides.jd", tmp_path)
+    previous = (path := tmp_path / "model.jpb").read_bytes()
+
+    def interrupt(*args):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(os, "replace", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        write_compiled(source.justifications, str(path))
+    assert path.read_bytes() == previous
+    assert os.listdir(tmp_path) == ["model.jpb"]
@@ -0,0 +1,88 @@
+from jpipe_runner.enums import StatusType
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.runtime import PythonRuntime
+
+MODEL = """
+justification left {
+    evidence   e is "Left evidence holds"
+    strategy   s is "Check left"
+    conclusion c is "Left holds"
+    e supports s
+    s supports c
+}
+
+justification right {
+    evidence   e is "Right evidence holds"
+    strategy   s is "Check right"
+    conclusion c is "Right holds"
+    e supports s
+    s supports c
+}
+
+composition both {
+    justification left
+    justification combined is left with right
+}
+"""
+
+LIBRARY = """
+calls = []
+
+
+def left_evidence_holds():
+    calls.append("left")
+    return True
+
+
+def check_left():
+    return True
+
+
+def right_evidence_holds():
+    calls.append("right")
+    return True
+
+
+def check_right():
+    return True
+"""
+
+
+def test_declared_justifications_are_references(write):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    assert sorted(jpipe.justifications) == ["combined", "left", "right"]
+    assert jpipe.components("combined") == ["left", "right"]
+
+
+def test_components_are_justified_once(write):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = PythonRuntime(libraries=[write("checks.py", LIBRARY)])
+    for diagram in ["left", "combined"]:
+        results = list(jpipe.justify(diagram, runtime=runtime))
+        assert all(r['status'] is StatusType.PASS for r in results)
+    assert runtime.calls == ["left", "right"]
+
+
+def test_replayed_results_are_marked(write):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = PythonRuntime(libraries=[write("checks.py", LIBRARY)])
+    first = list(jpipe.justify("left", runtime=runtime))
+    again = list(jpipe.justify("left", runtime=runtime))
+    assert [r['name'] for r in again] == [r['name'] for r in first]
+    assert not any(r.get('replayed') for r in first)
+    checks = [r for r in again if r.get('duration') is not None]
+    assert [r['name'] for r in checks] == ["e", "s"]
+    assert all(r['replayed'] and r['duration'] == 0.0 and not r.get('cached') for r in checks)
+    # the memoized results are left untouched.
+    assert all(r['duration'] > 0.0 for r in jpipe.results["left"] if 'duration' in r)
+
+
+def test_dry_runs_do_not_replay_real_runs(write):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = PythonRuntime(libraries=[write("checks.py", LIBRARY)])
+    dry = list(jpipe.justify("left", dry_run=True, runtime=runtime))
+    real = list(jpipe.justify("left", runtime=runtime))
+    assert all(r['status'] is StatusType.PASS for r in real)
+    again = list(jpipe.justify("left", dry_run=True, runtime=runtime))
+    assert [r['status'] for r in again] == [r['status'] for r in dry] == [StatusType.SKIP] * 3
+    assert not any(r.get('replayed') for r in again)
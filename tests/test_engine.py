@@ -0,0 +1,28 @@
+import os
+
+from jpipe_runner.jpipe import JPipeEngine
+
+MODEL = """
+justification {name} {{
+    evidence   e is "Evidence holds"
+    strategy   s is "Check evidence"
+    conclusion c is "Conclusion holds"
+    e supports s
+    s supports c
+}}
+"""
+
+
+def test_qualified_names_do_not_depend_on_working_directory(write, tmp_path, monkeypatch):
+    files = [write("models/a.jd", MODEL.format(name="a")),
+             write("models/sub/b.jd", MODEL.format(name="b"))]
+    names = ["a.jd::a", "sub/b.jd::b"]
+    for cwd in [tmp_path, tmp_path / "models" / "sub", "/"]:
+        monkeypatch.chdir(cwd)
+        assert list(JPipeEngine(files).justifications) == names
+    assert list(JPipeEngine(files, root=str(tmp_path)).justifications) == ["models/" + n for n in names]
+
+
+def test_single_file_names_are_not_qualified(write):
+    assert list(JPipeEngine(write("a.jd", MODEL.format(name="a"))).justifications) == ["a"]
+    assert os.path.isfile(JPipeEngine(write("b.jd", MODEL.format(name="b"))).files[0])
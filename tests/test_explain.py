@@ -0,0 +1,117 @@
+import json
+import sys
+
+import pytest
+
+from jpipe_runner.explain import explain, format_explanation
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.library import CheckSpec
+
+MODEL = """
+justification left {
+    evidence   e is "Left evidence holds"
+    strategy   s is "Check left"
+    conclusion c is "Left holds"
+    e supports s
+    s supports c
+}
+
+justification right {
+    evidence   e1 is "Right evidence holds"
+    evidence   e2 is "Other evidence holds"
+    strategy   s  is "Check right"
+    conclusion c  is "Right holds"
+    e1 supports s
+    e2 supports s
+    s  supports c
+}
+
+composition composed {
+    justification both is left with right
+    justification all is both with left
+}
+"""
+
+COSTS = {"left_evidence_holds": 1.0, "check_left": 2.0,
+         "right_evidence_holds": 3.0, "other_evidence_holds": 1.0, "check_right": 1.0}
+
+
+@pytest.fixture
+def jpipe(write):
+    return JPipeEngine(write("model.jd", MODEL))
+
+
+def test_explain_critical_path(jpipe):
+    explanation = explain(jpipe.justifications["right"], COSTS, workers=2)
+    assert explanation['serial_cost'] == 5.0
+    assert explanation['critical_path'] == ["e1", "s", "c"]
+    assert explanation['critical_path_cost'] == 4.0
+    assert explanation['wall_time'] == 4.0
+
+
+def test_explain_costs_components_recursively(jpipe):
+    justifications = jpipe.justifications
+    both = explain(justifications["both"], COSTS, justifications=justifications)
+    assert both['serial_cost'] == 8.0
+    assert both['wall_time'] == 8.0
+    assert both['critical_path'][0] == "right"
+    assert {n['name']: n['cost'] for n in both['dominating_nodes']} == {"left": 3.0, "right": 5.0}
+
+    # right runs on two workers, and the components one after the other.
+    parallel = explain(justifications["both"], COSTS, workers=2, justifications=justifications)
+    assert parallel['wall_time'] == 3.0 + 4.0
+    # the serial cost does not depend on the workers.
+    assert parallel['serial_cost'] == 8.0
+    assert {n['name']: n['cost'] for n in parallel['dominating_nodes']} == {"left": 3.0, "right": 5.0}
+
+    nested = explain(justifications["all"], COSTS, justifications=justifications)
+    assert nested['critical_path'][0] == "both"
+    assert {n['name']: n['cost'] for n in nested['dominating_nodes']}["both"] == 8.0
+
+
+def test_explain_reports_unknown_functions_of_components(jpipe):
+    justifications = jpipe.justifications
+    explanation = explain(justifications["both"], {"check_left": 2.0}, justifications=justifications)
+    assert explanation['unknown_functions'] == ["check_right", "left_evidence_holds",
+                                                "other_evidence_holds", "right_evidence_holds"]
+
+
+def test_explain_runs_undeclared_checks_alone(jpipe):
+    right = jpipe.justifications["right"]
+    safe = CheckSpec(parallel_safe=True)
+    assert explain(right, COSTS, workers=2)['assumed_parallel_safe']
+    assert "assumed parallel-safe" in format_explanation(explain(right, COSTS, workers=2))
+    # undeclared checks run one after the other.
+    explanation = explain(right, COSTS, workers=2, specs={})
+    assert not explanation['assumed_parallel_safe']
+    assert explanation['wall_time'] == 5.0
+    specs = {"right_evidence_holds": safe, "other_evidence_holds": safe}
+    assert explain(right, COSTS, workers=2, specs=specs)['wall_time'] == 4.0
+    # an evidence running alone waits for the other one.
+    specs = {"right_evidence_holds": safe}
+    assert explain(right, COSTS, workers=2, specs=specs)['wall_time'] == 5.0
+
+
+def test_explain_limits_checks_by_resource_pools(jpipe):
+    right = jpipe.justifications["right"]
+    heavy = CheckSpec(parallel_safe=True, resources={"memory": 8.0})
+    specs = {"right_evidence_holds": heavy, "other_evidence_holds": heavy}
+    assert explain(right, COSTS, workers=2, specs=specs, capacities={"memory": 16.0})['wall_time'] == 4.0
+    assert explain(right, COSTS, workers=2, specs=specs, capacities={"memory": 8.0})['wall_time'] == 5.0
+
+
+@pytest.mark.parametrize("explain_format", [[], ["--explain-format", "json"]])
+def test_explain_flag_precedes_the_model(write, monkeypatch, capsys, explain_format):
+    from jpipe_runner.runner import main
+
+    estimates = write("estimates.json", json.dumps(COSTS))
+    monkeypatch.setattr(sys, "argv", ["jpipe-runner", "--estimates", estimates, *explain_format,
+                                      "--explain", write("model.jd", MODEL)])
+    with pytest.raises(SystemExit) as e:
+        main()
+    assert e.value.code == 0
+    out = capsys.readouterr().out
+    if explain_format:
+        assert [e['name'] for e in json.loads(out)] == ["left", "right", "both", "all"]
+    else:
+        assert "Justification :: right" in out
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from jpipe_runner import export
+from jpipe_runner.jpipe import JPipeEngine
+
+MODEL = """
+justification first {
+    evidence   e is "Evidence holds"
+    strategy   s is "Check first"
+    conclusion c is "First holds"
+    e supports s
+    s supports c
+}
+
+justification second {
+    evidence   e is "Evidence holds"
+    strategy   s is "Check second"
+    conclusion c is "Second holds"
+    e supports s
+    s supports c
+}
+"""
+
+
+def test_write_replaces_images(tmp_path):
+    path = tmp_path / "out" / "image.svg"
+    assert export._write(str(path), b"<svg/>")
+    assert not export._write(str(path), b"<svg/>")
+    assert export._write(str(path), b"<svg></svg>")
+    assert path.read_bytes() == b"<svg></svg>"
+    assert os.listdir(path.parent) == ["image.svg"]
+    assert path.stat().st_mode & 0o777 == 0o666 & ~_umask()
+
+
+def test_interrupted_write_keeps_previous_image(tmp_path, monkeypatch):
+    path = tmp_path / "image.svg"
+    path.write_bytes(b"<svg/>")
+
+    def interrupted(src, dst):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(export.os, "replace", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        export._write(str(path), b"<svg></svg>")
+    assert path.read_bytes() == b"<svg/>"
+    assert os.listdir(tmp_path) == ["image.svg"]
+
+
+def test_export_reuses_cached_renders(write, tmp_path):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    output, cache_dir = str(tmp_path / "images" / "{name}.svg"), str(tmp_path / "cache")
+    first = list(export.export_diagrams(jpipe.justifications, output, renderer="builtin", cache_dir=cache_dir))
+    assert [(n, cached) for n, _, cached in first] == [("first", False), ("second", False)]
+    again = list(export.export_diagrams(jpipe.justifications, output, renderer="builtin", cache_dir=cache_dir))
+    assert [(n, cached) for n, _, cached in again] == [("first", True), ("second", True)]
+    for _, path, _ in again:
+        assert open(path, 'rb').read().lstrip().startswith((b"<?xml", b"<svg"))
+
+
+def _umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+from jpipe_runner.exceptions import RuntimeException
+from jpipe_runner.forkserver import ForkServer, ForkedRuntime
+from jpipe_runner.runtime import PythonRuntime
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not supported")
+
+state = []
+
+
+def _square(x: int) -> int:
+    if x == 3:
+        raise ValueError("three")
+    if x == 4:
+        os._exit(1)
+    state.append(x)
+    return x * x
+
+
+def test_imap_yields_results_in_order():
+    server = ForkServer()
+    results = list(server.imap(_square, range(6), jobs=3))
+    assert [results[i] for i in (0, 1, 2, 5)] == [0, 1, 4, 25]
+    assert isinstance(results[3], ValueError) and str(results[3]) == "three"
+    assert isinstance(results[4], RuntimeException)
+    # the forks never change the state of the template.
+    assert state == []
+
+
+def test_iterate_streams_items():
+    def items():
+        yield from ("a", "b")
+        raise KeyError("c")
+
+    iterator = ForkServer().iterate(items)
+    assert [next(iterator), next(iterator)] == ["a", "b"]
+    with pytest.raises(KeyError):
+        next(iterator)
+
+
+def test_call_kills_timed_out_forks():
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        ForkServer().call(time.sleep, 10, timeout=0.2)
+    assert time.perf_counter() - start < 5
+
+
+def test_forked_runtime_isolates_checks(write):
+    library = write("checks.py", """
+        calls = []
+
+
+        def check_calls():
+            calls.append(1)
+            return len(calls)
+    """)
+    runtime = ForkedRuntime(PythonRuntime(libraries=[library]), ForkServer())
+    assert [runtime.call_check("check_calls") for _ in range(3)] == [1, 1, 1]
+    assert runtime.calls == []
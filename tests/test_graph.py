@@ -0,0 +1,83 @@
+import random
+from typing import Any
+
+import pytest
+
+from jpipe_runner.graph import DiGraph
+
+
+def _random_edges(seed: int, nodes: int = 30, edges: int = 80) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(edges):
+        u, v = sorted(rng.sample(range(nodes), 2))
+        result.append((f"n{u}", f"n{v}"))
+    # duplicated edges are kept once.
+    return result + result[:10]
+
+
+def _graphs(edges: list[tuple[str, str]]) -> tuple[DiGraph, Any]:
+    nx = pytest.importorskip("networkx")
+    graph, expected = DiGraph(), nx.DiGraph()
+    for u, v in edges:
+        graph.add_edge(u, v)
+        expected.add_edge(u, v)
+    return graph, expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_graph_matches_networkx(seed):
+    nx = pytest.importorskip("networkx")
+    graph, expected = _graphs(_random_edges(seed))
+    assert list(graph.nodes) == list(expected.nodes)
+    assert graph.edges == list(expected.edges)
+    assert graph.number_of_edges() == expected.number_of_edges()
+    for n in expected.nodes:
+        assert list(graph.successors(n)) == list(expected.successors(n))
+        assert list(graph.predecessors(n)) == list(expected.predecessors(n))
+        assert graph.in_degree(n) == expected.in_degree(n)
+        assert graph.out_degree(n) == expected.out_degree(n)
+        assert graph.ancestors(n) == nx.ancestors(expected, n)
+    assert graph.is_directed_acyclic_graph()
+
+
+def test_edges_added_after_a_query_keep_their_order():
+    graph, expected = _graphs([("a", "c"), ("b", "c"), ("a", "b")])
+    assert list(graph.predecessors("c")) == ["a", "b"]
+    for u, v in [("d", "c"), ("a", "d"), ("b", "c")]:
+        graph.add_edge(u, v)
+        expected.add_edge(u, v)
+    assert graph.edges == list(expected.edges)
+    assert list(graph.predecessors("c")) == list(expected.predecessors("c")) == ["a", "b", "d"]
+    assert list(graph.successors("a")) == list(expected.successors("a")) == ["c", "b", "d"]
+
+
+def test_cycles_are_detected():
+    graph, _ = _graphs([("a", "b"), ("b", "c"), ("c", "a")])
+    assert not graph.is_directed_acyclic_graph()
+
+
+def test_node_attributes():
+    graph = DiGraph()
+    graph.add_node("a", label="A", status=None)
+    graph.add_node("b", label="B")
+    graph.add_edge("a", "b")
+    assert dict(graph.nodes["a"]) == {"label": "A", "status": None}
+    assert dict(graph.nodes["b"]) == {"label": "B"}
+    graph.nodes["b"]["status"] = "PASS"
+    del graph.nodes["a"]["label"]
+    assert dict(graph.nodes(data=True)) == {"a": {"status": None}, "b": {"label": "B", "status": "PASS"}}
+    with pytest.raises(KeyError):
+        graph.nodes["a"]["label"]
+
+
+def test_copy_and_arrays_round_trip():
+    graph, _ = _graphs(_random_edges(0))
+    copy = graph.copy()
+    copy.add_edge("n0", "extra")
+    assert "extra" not in graph
+    names = list(graph.nodes)
+    loaded = DiGraph.from_arrays("g", names, {}, graph.arrays())
+    assert loaded.edges == graph.edges
+    for n in names:
+        assert list(loaded.predecessors(n)) == list(graph.predecessors(n))
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from jpipe_runner.history import HistoryException, RunHistory, format_history
+from jpipe_runner.report import RunReport
+
+
+def _report(status: str, slow: float, cached: bool = False) -> RunReport:
+    node = dict(var_type="evidence", label="Check", exception=None)
+    return RunReport([dict(name="d", status=status, duration=slow + 1.0, nodes=[
+        dict(node, name="fast", function="fast_check", status="PASS", duration=1.0),
+        dict(node, name="slow", function="slow_check", status=status, duration=slow),
+        dict(node, name="again", function="fast_check", status="PASS", duration=0.0, cached=cached),
+    ])])
+
+
+def _record(history: RunHistory, report: RunReport, model: str = "model") -> int:
+    return history.record(report, started=0.0, model_hash=model, library_hash="lib", variables_hash="vars")
+
+
+def test_queries(tmp_path):
+    with RunHistory(str(tmp_path)) as history:
+        _record(history, _report("PASS", 2.0))
+        _record(history, _report("FAIL", 4.0, cached=True))
+        _record(history, _report("PASS", 6.0, cached=True))
+        # the same check failing on another model is not flaky.
+        _record(history, _report("FAIL", 6.0), model="other")
+
+        slowest = history.query("slowest")
+        assert [(r['function'], r['calls'], r['mean']) for r in slowest] \
+               == [("slow_check", 4, 4.5), ("fast_check", 6, 2 / 3)]
+        assert history.query("slowest", runs=1)[0]['mean'] == 6.0
+
+        [trend] = [t for t in history.query("trends") if t['function'] == "slow_check"]
+        assert (trend['before'], trend['after']) == (3.0, 6.0)
+
+        [flaky] = history.query("flaky")
+        assert (flaky['name'], flaky['passed'], flaky['failed'], flaky['flips']) == ("slow", 2, 1, 2)
+
+        [cache] = history.query("cache")
+        assert (cache['function'], cache['hits'], cache['calls']) == ("fast_check", 2, 8)
+
+        with pytest.raises(HistoryException, match="unknown history query"):
+            history.query("fastest")
+
+
+def test_format_history(tmp_path):
+    with RunHistory(str(tmp_path)) as history:
+        _record(history, _report("PASS", 2.0))
+        assert format_history("flaky", history.query("flaky")) == "No flaky results in the history"
+        assert format_history("slowest", history.query("slowest")).splitlines()[1].endswith("slow_check")
+
+
+def test_unsupported_version(tmp_path):
+    RunHistory(str(tmp_path)).close()
+    db = sqlite3.connect(tmp_path / "history.sqlite3")
+    db.execute("PRAGMA user_version=99")
+    db.close()
+    with pytest.raises(HistoryException, match="unsupported history version"):
+        RunHistory(str(tmp_path))
+
+
+def test_replayed_results_are_left_out(tmp_path):
+    node = dict(var_type="evidence", label="Check", exception=None, function="check", status="PASS")
+    report = RunReport([dict(name="d", status="PASS", duration=1.0, nodes=[
+        dict(node, name="e", duration=1.0),
+        dict(node, name="e", duration=0.0, replayed=True),
+    ])])
+    with RunHistory(str(tmp_path)) as history:
+        _record(history, report)
+        assert [(r['calls'], r['mean']) for r in history.query("slowest")] == [(1, 1.0)]
+        assert history.query("cache") == []
+
+
+def test_version_1_histories_are_upgraded(tmp_path):
+    with RunHistory(str(tmp_path)) as history:
+        _record(history, _report("PASS", 2.0))
+    db = sqlite3.connect(tmp_path / "history.sqlite3")
+    db.execute("ALTER TABLE nodes DROP COLUMN replayed")
+    db.execute("PRAGMA user_version=1")
+    db.commit()
+    db.close()
+    with RunHistory(str(tmp_path)) as history:
+        _record(history, _report("PASS", 4.0))
+        assert history.query("slowest")[0]['mean'] == 3.0
@@ -0,0 +1,43 @@
+import importlib.util
+import os
+
+import pytest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "benchmarks", "bench_import.py")
+# the budget of `benchmarks/bench_import.py`, in ms, only checked when set,
+# as import times depend on the machine.
+BUDGET = os.environ.get("JPIPE_IMPORT_BUDGET")
+
+def _load_benchmark():
+    spec = importlib.util.spec_from_file_location("bench_import", BENCHMARK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+bench_import = _load_benchmark()
+
+
+SCENARIOS = pytest.mark.parametrize("name, cli, forbidden", bench_import.SCENARIOS,
+                                    ids=[s[0] for s in bench_import.SCENARIOS])
+
+
+@SCENARIOS
+def test_heavy_dependencies_are_not_imported(name, cli, forbidden):
+    _, imported = bench_import.measure(cli, repeat=1)
+    assert [m for m in forbidden if m in imported] == []
+    assert "jpipe_runner" in imported
+
+
+@pytest.mark.skipif(BUDGET is None, reason="JPIPE_IMPORT_BUDGET is not set")
+@SCENARIOS
+def test_import_time_budget(name, cli, forbidden):
+    budget = float(BUDGET)
+    best, _ = bench_import.measure(cli, repeat=5)
+    # measured again on a busy machine, a regression stays over the budget.
+    for _ in range(2):
+        if best <= budget:
+            break
+        best = min(best, bench_import.measure(cli, repeat=5)[0])
+    assert best <= budget, f"{name}: {best:.1f} ms over the budget of {budget:.0f} ms"
@@ -0,0 +1,104 @@
+import pytest
+
+from jpipe_runner.forkserver import ForkServer
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.matrix import justify_matrix, unbatched_checks
+from jpipe_runner.runtime import PythonRuntime
+
+MODEL = """
+justification fresh {
+    conclusion done is "Value is fresh"
+    strategy   check is "Check value"
+    evidence   value is "Value is set"
+    value supports check
+    check supports done
+}
+"""
+
+# the checks keep module state, which must not leak between sets.
+LIBRARY = """
+value = None
+seen = []
+
+
+def value_is_set():
+    seen.append(value)
+    return value is not None
+
+
+def check_value():
+    return seen == [value] and value != "bad"
+"""
+
+BATCHED = LIBRARY + """
+
+from jpipe_runner import batch
+
+calls = []
+
+
+@batch(value_is_set)
+def values_are_set(variable_sets):
+    calls.append(len(variable_sets))
+    return [v['value'] is not None for v in variable_sets]
+
+
+@batch(check_value)
+def check_values(variable_sets):
+    # one call per chunk, after the first batched check.
+    return [calls == [len(variable_sets)] and v['value'] != "bad" for v in variable_sets]
+"""
+
+SETS = [{"value": "a"}, {"value": "bad"}, {"value": "c"}, {"value": "d"}]
+
+
+def _statuses(model: str, library: str, batch_size: int) -> list[str]:
+    jpipe = JPipeEngine(model)
+    runtime = PythonRuntime(libraries=[library])
+    return [record['status'] for record in justify_matrix(jpipe, ForkServer(), ["fresh"], SETS,
+                                                          batch_size=batch_size,
+                                                          runtime=runtime)]
+
+
+@pytest.mark.parametrize("batch_size", [2, 3, 4])
+def test_batch_size_does_not_change_results(write, batch_size):
+    model, library = write("model.jd", MODEL), write("checks.py", LIBRARY)
+    assert _statuses(model, library, 1) == ["PASS", "FAIL", "PASS", "PASS"]
+    assert _statuses(model, library, batch_size) == ["PASS", "FAIL", "PASS", "PASS"]
+
+
+def test_batched_checks_are_called_once_per_chunk(write):
+    model, library = write("model.jd", MODEL), write("checks.py", BATCHED)
+    assert _statuses(model, library, 2) == ["PASS", "FAIL", "PASS", "PASS"]
+
+
+# only the first check is batched, the second one only depends on the variables.
+PARTLY_BATCHED = """
+from jpipe_runner import batch
+
+value = None
+
+
+def value_is_set():
+    return value is not None
+
+
+@batch(value_is_set)
+def values_are_set(variable_sets):
+    return [v['value'] is not None for v in variable_sets]
+
+
+def check_value():
+    return value != "bad"
+"""
+
+
+def test_checks_without_batched_variant_are_called_per_set(write):
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = PythonRuntime(libraries=[write("checks.py", PARTLY_BATCHED)])
+    assert unbatched_checks(jpipe, ["fresh"], runtime) == ["check_value"]
+    results = jpipe.justify_batch("fresh", SETS, runtime=runtime)
+    assert [next(r['status'].value for r in nodes if r['name'] == "done") for nodes in results] \
+           == ["PASS", "SKIP", "PASS", "PASS"]
+    assert [next(r['status'].value for r in nodes if r['name'] == "check") for nodes in results] \
+           == ["PASS", "FAIL", "PASS", "PASS"]
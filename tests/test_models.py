@@ -0,0 +1,38 @@
+from jpipe_runner.models import SupportDef, Supports
+
+
+def test_supports_keep_declaration_order():
+    supports = Supports([("a", "x"), ("b", "y"), ("a", "z"), ("a", "x")])
+    assert list(supports.edges()) == [("a", "x"), ("b", "y"), ("a", "z")]
+    assert len(supports) == 3
+
+
+def test_supports_set_operations():
+    supports = Supports([SupportDef(left="a", right="b")])
+    supports.add(("b", "c"))
+    assert ("a", "b") in supports
+    assert SupportDef(left="b", right="c") in supports
+    assert ("c", "a") not in supports
+    assert "a" not in supports
+    supports.discard(("a", "b"))
+    supports.discard(("x", "y"))
+    assert list(supports) == [SupportDef(left="b", right="c")]
+
+
+def test_supports_equality():
+    supports = Supports([("a", "b"), ("b", "c")])
+    assert supports == Supports([("b", "c"), ("a", "b")])
+    assert supports == {SupportDef(left="a", right="b"), SupportDef(left="b", right="c")}
+    assert supports != Supports([("a", "b"), ("b", "d")])
+    assert supports != Supports([("a", "b")])
+    supports.discard(("b", "c"))
+    assert supports == Supports([("a", "b")])
+    supports.clear()
+    assert supports == Supports() and not supports
+
+
+def test_supports_lookups_are_constant_time():
+    edges = [(f"n{k}", f"n{k + 1}") for k in range(200_000)]
+    supports, other = Supports(edges), Supports(reversed(edges))
+    assert supports == other and supports <= other
+    assert all(edge in supports for edge in edges)
@@ -0,0 +1,52 @@
+import io
+import json
+import os
+
+import pytest
+
+from jpipe_runner.parser import _JSONObjectReader, parse_jd_file, parse_jd_json_file
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "examples", "models")
+
+DOCUMENT = json.dumps({
+    "int": 1, "float": 1.5, "exp": 1e10, "neg": -0.25e-3, "big": 12345678901234567890,
+    "true": True, "false": False, "null": None,
+    "string": "a \"quoted\" \\ string é中",
+    "list": [1, 22, 333.5, [], {}, [-1e+2]],
+    "object": {"nested": {"deep": [0, 10, 2.5e-7]}},
+}, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(DOCUMENT) + 2))
+def test_reader_decodes_values_at_any_chunk_size(chunk_size):
+    reader = _JSONObjectReader(io.StringIO(DOCUMENT), chunk_size=chunk_size)
+    assert reader.value() == json.load(io.StringIO(DOCUMENT))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 8, 16, 1 << 16])
+def test_reader_iterates_members_at_any_chunk_size(chunk_size):
+    reader = _JSONObjectReader(io.StringIO(DOCUMENT), chunk_size=chunk_size)
+    assert {key: reader.value() for key in reader.members()} == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize("document", ["1.5", "1e10", "-12", "[1.5, 2e3]", '{"a": 10.25}'])
+def test_reader_decodes_numbers_cut_by_chunks(document):
+    for chunk_size in range(1, len(document) + 1):
+        reader = _JSONObjectReader(io.StringIO(document), chunk_size=chunk_size)
+        assert reader.value() == json.loads(document)
+
+
+@pytest.mark.parametrize("document", ['{"a": 1', '{"a" 1}', '{"a": 1,}'])
+def test_reader_rejects_invalid_objects(document):
+    reader = _JSONObjectReader(io.StringIO(document), chunk_size=2)
+    with pytest.raises(ValueError):
+        {key: reader.value() for key in reader.members()}
+
+
+def test_json_model_matches_jd_model():
+    from_json = parse_jd_json_file(os.path.join(EXAMPLES, "01_slides.json"))
+    from_jd = parse_jd_file(os.path.join(EXAMPLES, "01_slides.jd"))
+    assert from_json.class_defs.keys() == from_jd.class_defs.keys()
+    for name, cls in from_jd.class_defs.items():
+        assert dict(from_json.class_defs[name].body.variables) == dict(cls.body.variables)
+        assert sorted(from_json.class_defs[name].body.supports.edges()) == sorted(cls.body.supports.edges())
@@ -0,0 +1,141 @@
+import gc
+import random
+
+import pytest
+
+from jpipe_runner.enums import ClassType, VariableType
+from jpipe_runner.exceptions import InvalidJustificationException
+from jpipe_runner.jpipe import ExpandedJustification, JPipeEngine, PatternTemplate
+from jpipe_runner.models import ClassDef, JustificationDef, VariableDef
+
+PATTERN = """
+pattern gated {
+    conclusion c    is "Claim holds"
+    strategy   gate is "Assess gates"
+    gate supports c
+    @support repr is "Environment is reproducible"
+    repr supports gate
+}
+"""
+
+
+def _implementation(name: str) -> str:
+    return f"""
+justification {name} implements gated {{
+    evidence       e    is "Evidence of {name}"
+    strategy       s    is "Check {name}"
+    sub-conclusion repr is "Environment is reproducible"
+    e supports s
+    s supports repr
+}}
+"""
+
+
+def test_implementations_share_their_pattern(write):
+    jpipe = JPipeEngine(write("model.jd", PATTERN + _implementation("a") + _implementation("b")))
+    assert list(jpipe.justifications) == ["a", "b"]
+    assert len(jpipe._templates) == 1
+    a, b = jpipe.justifications["a"], jpipe.justifications["b"]
+    assert a.justify_order() == ["e", "s", "repr", "gate", "c"]
+    assert a.nodes["s"]['label'] == "Check a" and b.nodes["s"]['label'] == "Check b"
+    assert a.nodes["gate"] == b.nodes["gate"]
+
+
+def test_implementations_are_materialized_while_in_use(write):
+    jpipe = JPipeEngine(write("model.jd", PATTERN + _implementation("a")))
+    a = jpipe.justifications["a"]
+    assert jpipe.justifications["a"] is a
+    a.nodes["gate"]['status'] = "changed"
+    del a
+    gc.collect()
+    # materialized again from the pattern, which changes to a copy never reach.
+    assert jpipe.justifications["a"].nodes["gate"]['status'] is None
+
+
+def test_implementations_are_validated(write):
+    with pytest.raises(InvalidJustificationException, match="'repr' not found"):
+        JPipeEngine(write("model.jd", PATTERN + """
+justification a implements gated {
+    evidence e is "Evidence of a"
+}
+"""))
+
+
+E, S, SC, C, SUP = (VariableType.EVIDENCE, VariableType.STRATEGY, VariableType.SUB_CONCLUSION,
+                    VariableType.CONCLUSION, VariableType.SUPPORT)
+
+# (variables, supports) of patterns with their conclusion, and without it.
+PATTERNS = {
+    "concluded": ({"c": C, "gate": S, "pe": E, "ps": S, "psub": SC, "repr": SUP, "fair": SUP},
+                  [("gate", "c"), ("pe", "ps"), ("ps", "psub"), ("psub", "gate"),
+                   ("repr", "gate"), ("fair", "gate")]),
+    "open": ({"gate": S, "top": SC, "repr": SUP},
+             [("gate", "top"), ("repr", "gate")]),
+}
+
+
+def _definition(name: str, variables: dict, supports: list) -> ClassDef:
+    return ClassDef(class_type=ClassType.JUSTIFICATION, name=name, pattern="p",
+                    body=JustificationDef(supports=supports,
+                                          variables={k: VariableDef(t, k, f"{k} holds")
+                                                     for k, t in variables.items()}))
+
+
+def _random_overlay(rng: random.Random, pattern: str) -> tuple[dict, list]:
+    pattern_variables, _ = PATTERNS[pattern]
+    variables, supports = {}, []
+    for p in (k for k, t in pattern_variables.items() if t is SUP):
+        variables |= {p: SC, f"s_{p}": S, f"e_{p}": E}
+        supports += [(f"e_{p}", f"s_{p}"), (f"s_{p}", p)]
+    if pattern == "open":
+        variables |= {"c": C, "s_top": S}
+        supports += [("top", "s_top"), ("s_top", "c")]
+
+    for _ in range(rng.randrange(4)):
+        nodes = [*(k for k, t in pattern_variables.items() if t is not SUP), *variables]
+        match rng.randrange(6):
+            case 0:
+                supports.append((rng.choice(nodes), rng.choice(nodes)))
+            case 1 if supports:
+                supports.remove(rng.choice(supports))
+            case 2 if supports:
+                # a new evidence takes the place of a supporter, left unsupporting.
+                left, right = supports.pop(rng.randrange(len(supports)))
+                variables[extra := f"x{len(variables)}"] = E
+                supports.append((extra, right))
+            case 3:
+                variables[rng.choice(list(variables))] = rng.choice([E, S, SC, C])
+            case 4:
+                extra = f"x{len(variables)}"
+                variables[extra] = rng.choice([E, S, SC, C])
+                supports.append((extra, rng.choice(nodes)) if rng.random() < 0.5 else (rng.choice(nodes), extra))
+            case _:
+                # pattern variables take precedence over the overlay ones.
+                variables[rng.choice(list(pattern_variables))] = rng.choice([E, S, SC, C])
+    return variables, supports
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_incremental_validation_matches_full_validation(pattern):
+    template = PatternTemplate("p", JustificationDef(
+        supports=PATTERNS[pattern][1],
+        variables={k: VariableDef(t, k, f"{k} holds") for k, t in PATTERNS[pattern][0].items()}))
+    rng = random.Random(pattern)
+    outcomes = []
+    for i in range(1500):
+        variables, supports = _random_overlay(rng, pattern)
+        jd_cls = _definition(f"j{i}", variables, supports)
+        try:
+            template.expand(jd_cls)
+            expanded = None
+        except InvalidJustificationException as e:
+            expanded = e
+        try:
+            ExpandedJustification(template, jd_cls).materialize().validate()
+            validated = None
+        except InvalidJustificationException as e:
+            validated = e
+        assert (expanded is None) == (validated is None), (variables, supports, expanded, validated)
+        outcomes.append(expanded is None)
+    # both valid and invalid overlays are exercised.
+    assert 0.2 < sum(outcomes) / len(outcomes) < 0.8
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from jpipe_runner.enums import StatusType
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.report import RunReport, load_durations, load_function_durations
+from jpipe_runner.runtime import PythonRuntime
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "examples")
+MODEL = os.path.join(EXAMPLES, "models", "01_slides.jd")
+LIBRARY = os.path.join(EXAMPLES, "libraries", "slides.py")
+
+
+def _record(report: RunReport, signature: str) -> list[dict]:
+    jpipe = JPipeEngine(MODEL)
+    runtime = PythonRuntime(libraries=[LIBRARY], variables=[("signature", signature), ("available", "yes")])
+    return list(report.record("slides", jpipe.justify("slides", runtime=runtime)))
+
+
+def test_dumped_reports_replay_their_results(tmp_path):
+    report = RunReport(shard="1/2")
+    results = _record(report, "jason")
+    report.dump(filename := str(tmp_path / "report.json"))
+
+    loaded = RunReport.load(filename)
+    assert loaded.shard == "1/2"
+    assert loaded.summary == dict(total=1, passed=1, failed=0, skipped=0)
+    assert loaded.exit_code == 0
+    [(name, replayed)] = loaded.replay()
+    assert name == "slides"
+    assert [(r['name'], r['var_type'], r['status']) for r in replayed] \
+           == [(r['name'], r['var_type'], r['status']) for r in results]
+    assert {r['function'] for r in replayed if 'function' in r} \
+           == {"nda_is_signed", "slides_are_available", "check_contents_wrt_nda",
+               "check_grammar_typos", "all_conditions_are_met"}
+
+
+def test_merged_reports_cover_all_shards(tmp_path):
+    first, second = RunReport(shard="1/2"), RunReport(shard="2/2")
+    _record(first, "someone else")
+    second.diagrams.append(dict(name="other", status="PASS", duration=1.0, nodes=[]))
+
+    merged = RunReport.merge([first, second])
+    assert [d['name'] for d in merged.diagrams] == ["slides", "other"]
+    assert merged.diagrams[0]['status'] == StatusType.FAIL.value
+    assert merged.summary == dict(total=2, passed=1, failed=1, skipped=0)
+    assert merged.exit_code == 1
+
+
+@pytest.mark.parametrize("shards, error", [
+    (["1/3", "3/3"], "missing shards: 2/3"),
+    (["1/2", "1/2", "2/2"], "duplicate shards: 1/2"),
+    (["1/2", "2/3"], "different totals"),
+    (["1/2", None], "sharded and unsharded"),
+])
+def test_incomplete_shards_are_not_merged(shards, error):
+    reports = [RunReport([dict(name=f"d{k}", status="PASS", duration=1.0, nodes=[])], shard=shard)
+               for k, shard in enumerate(shards)]
+    with pytest.raises(ValueError, match=error):
+        RunReport.merge(reports)
+
+
+def test_overlapping_reports_are_not_merged():
+    first, second = RunReport(shard="1/2"), RunReport(shard="2/2")
+    _record(first, "jason")
+    _record(second, "jason")
+    with pytest.raises(ValueError, match="'slides' is in several reports"):
+        RunReport.merge([first, second])
+
+
+def test_durations_leave_out_cached_results(tmp_path):
+    node = dict(var_type="evidence", label="Check", status="PASS", exception=None, function="check")
+    report = RunReport([dict(name="a", status="PASS", duration=3.0, nodes=[
+        dict(node, name="e1", duration=1.0),
+        dict(node, name="e2", duration=3.0),
+        dict(node, name="e3", duration=0.0, cached=True),
+    ])])
+    report.dump(filename := str(tmp_path / "report.json"))
+    assert load_durations([filename]) == {"a": 3.0}
+    assert load_function_durations([filename]) == {"check": 2.0}
@@ -0,0 +1,258 @@
+import os
+import time
+
+import pytest
+
+from jpipe_runner.enums import StatusType
+from jpipe_runner.exceptions import RuntimeException
+from jpipe_runner.forkserver import ForkServer, ForkedRuntime
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.library import CheckSpec
+from jpipe_runner.runtime import PythonRuntime
+from jpipe_runner.scheduler import Scheduler, parse_resource
+
+LIBRARY_HEAD = """
+import threading
+import time
+
+from jpipe_runner import check
+
+lock = threading.Lock()
+running = 0
+peak = 0
+calls = []
+
+
+def _work(name, duration=0.1):
+    global running, peak
+    with lock:
+        running += 1
+        peak = max(peak, running)
+        calls.append(name)
+    time.sleep(duration)
+    with lock:
+        running -= 1
+    return True
+
+
+def combine():
+    return True
+"""
+
+
+def _model(labels: list[str]) -> str:
+    lines = ["justification fanin {",
+             '    strategy   s is "Combine"',
+             '    conclusion c is "Done"',
+             "    s supports c"]
+    for k, label in enumerate(labels):
+        lines += [f'    evidence e{k} is "{label}"', f"    e{k} supports s"]
+    return "\n".join(lines + ["}"])
+
+
+def _library(decorators: dict[str, str]) -> str:
+    functions = [f"\n\n{decorator}\ndef {name}():\n    return _work({name!r})\n"
+                 for name, decorator in decorators.items()]
+    return LIBRARY_HEAD + "".join(functions)
+
+
+def _justify(write, labels, decorators, scheduler):
+    jpipe = JPipeEngine(write("model.jd", _model(labels)))
+    runtime = PythonRuntime(libraries=[write("checks.py", _library(decorators))])
+    results = list(jpipe.justify("fanin", runtime=runtime, scheduler=scheduler))
+    return jpipe, runtime, results
+
+
+def test_results_are_in_justify_order(write):
+    labels = [f"Check {k}" for k in range(6)]
+    jpipe, runtime, results = _justify(write, labels, {f"check_{k}": "@check(parallel_safe=True)"
+                                                       for k in range(6)}, Scheduler(jobs=3))
+    assert [r['name'] for r in results] == jpipe.justifications["fanin"].justify_order()
+    assert all(r['status'] is StatusType.PASS for r in results)
+    assert runtime.peak == 3
+
+
+def test_unsafe_checks_run_alone(write):
+    labels = ["Check 0", "Check 1", "Check 2", "Check 3"]
+    decorators = {"check_0": "@check(parallel_safe=True)", "check_1": "@check(parallel_safe=True)",
+                  "check_2": "", "check_3": "@check(parallel_safe=True)"}
+    _, runtime, _ = _justify(write, labels, decorators, Scheduler(jobs=4))
+    assert runtime.peak == 2
+    # the unsafe check_2 waits for the running checks, and holds back check_3.
+    assert sorted(runtime.calls[:2]) == ["check_0", "check_1"]
+    assert runtime.calls[2:] == ["check_2", "check_3"]
+
+
+def test_resource_pools_limit_concurrency(write):
+    labels = [f"Check {k}" for k in range(6)]
+    decorators = {f"check_{k}": "@check(parallel_safe=True, resources={'gpu': 1})" for k in range(6)}
+    _, runtime, results = _justify(write, labels, decorators, Scheduler(jobs=6, capacities={"gpu": 2}))
+    assert runtime.peak == 2
+    assert all(r['status'] is StatusType.PASS for r in results)
+
+
+def test_over_capacity_is_rejected(write):
+    decorators = {"check_0": "@check(parallel_safe=True, resources={'gpu': 4})"}
+    with pytest.raises(RuntimeException, match="more resources than available"):
+        _justify(write, ["Check 0"], decorators, Scheduler(jobs=2, capacities={"gpu": 2}))
+
+
+def test_pure_check_runs_once_when_called_concurrently(write):
+    labels = ["Shared check"] * 4
+    jpipe, runtime, results = _justify(write, labels, {"shared_check": "@check(pure=True)"},
+                                       Scheduler(jobs=4))
+    assert runtime.calls == ["shared_check"]
+    evidence = [r for r in results if r['name'].startswith("e")]
+    assert [r['status'] for r in evidence] == [StatusType.PASS] * 4
+    assert sum(bool(r.get('cached')) for r in evidence) == 3
+
+
+def test_spec_errors_fail_the_node(write):
+    class BrokenSpecs(PythonRuntime):
+        def spec(self, name: str) -> CheckSpec:
+            if name == "check_1":
+                raise RuntimeException("no spec")
+            return super().spec(name)
+
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0", "Check 1"])))
+    runtime = BrokenSpecs(libraries=[write("checks.py", _library({"check_0": "", "check_1": ""}))])
+    results = {r['name']: r for r in jpipe.justify("fanin", runtime=runtime)}
+    assert results["e0"]['status'] is StatusType.PASS
+    assert results["e1"]['status'] is StatusType.FAIL
+    assert results["e1"]['exception'] == "RuntimeException: no spec"
+    assert results["c"]['status'] is StatusType.SKIP
+
+
+@pytest.mark.parametrize("resource, expected", [("gpu=2", ("gpu", 2.0)), ("memory=16G", ("memory", 16 * 2 ** 30))])
+def test_parse_resource(resource, expected):
+    assert parse_resource(resource) == expected
+
+
+@pytest.mark.parametrize("resource", ["gpu", "=2", "gpu=lots"])
+def test_parse_invalid_resource(resource):
+    with pytest.raises(ValueError):
+        parse_resource(resource)
+
+
+def test_timed_out_checks_hold_their_resources(write):
+    library = LIBRARY_HEAD + """
+
+@check(parallel_safe=True, timeout=0.3, resources={"memory": "8G"})
+def check_0():
+    return _work("check_0", 0.5)
+
+
+@check(parallel_safe=True, timeout=0.3, resources={"memory": "8G"})
+def check_1():
+    return _work("check_1", 0.5)
+"""
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0", "Check 1"])))
+    runtime = PythonRuntime(libraries=[write("checks.py", library)])
+    scheduler = Scheduler(jobs=4, capacities={"memory": 8 << 30})
+    start = time.perf_counter()
+    results = {r['name']: r for r in jpipe.justify("fanin", runtime=runtime, scheduler=scheduler)}
+    assert [results[e]['exception'] for e in ("e0", "e1")] \
+           == [f"CheckTimeoutError: function 'check_{i}' timed out after 0.3s" for i in (0, 1)]
+    assert all('running' not in r for r in results.values())
+    # the second check starts once the first one is done, not once it timed out.
+    assert time.perf_counter() - start >= 0.5
+    time.sleep(0.7)
+    assert runtime.calls == ["check_0", "check_1"] and runtime.peak == 1
+
+
+def test_timed_out_checks_hold_their_slot_across_justifications(write):
+    library = LIBRARY_HEAD + """
+
+@check(timeout=0.3)
+def check_0():
+    return _work("check_0", 0.5)
+
+
+@check(parallel_safe=True)
+def check_1():
+    return _work("check_1")
+"""
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0"]) + _model(["Check 1"]).replace("fanin", "other")))
+    runtime = PythonRuntime(libraries=[write("checks.py", library)])
+    scheduler = Scheduler(jobs=4)
+    list(jpipe.justify("fanin", runtime=runtime, scheduler=scheduler))
+    assert runtime.running == 1
+    list(jpipe.justify("other", runtime=runtime, scheduler=scheduler))
+    # check_0 does not run in parallel, check_1 waits for it.
+    assert runtime.peak == 1
+
+
+TIMED_OUT_LIBRARY = """
+import time
+
+from jpipe_runner import check
+
+log = {log!r}
+
+
+def _log(line):
+    with open(log, "a") as f:
+        f.write(line + "\\n")
+
+
+@check(timeout=0.2)
+def check_0():
+    _log("check_0 started")
+    time.sleep({duration})
+    _log("check_0 done")
+    return True
+
+
+def check_1():
+    with open(log) as f:
+        _log(f"check_1 saw {{len(f.readlines())}}")
+    return True
+"""
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not supported")
+def test_timed_out_checks_are_killed_with_node_isolation(write, tmp_path):
+    log = tmp_path / "log.txt"
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0", "Check 1"])))
+    runtime = PythonRuntime(libraries=[write("checks.py", TIMED_OUT_LIBRARY.format(log=str(log), duration=1))])
+    list(jpipe.justify("fanin", runtime=ForkedRuntime(runtime, ForkServer())))
+    time.sleep(1.2)
+    # check_1, which runs alone, starts once check_0 is killed.
+    assert log.read_text().splitlines() == ["check_0 started", "check_1 saw 1"]
+
+
+def test_timed_out_checks_run_alone(write, tmp_path):
+    log = tmp_path / "log.txt"
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0", "Check 1"])))
+    runtime = PythonRuntime(libraries=[write("checks.py", TIMED_OUT_LIBRARY.format(log=str(log), duration=0.3))])
+    results = {r['name']: r for r in jpipe.justify("fanin", runtime=runtime)}
+    assert results["e0"]['exception'] == "CheckTimeoutError: function 'check_0' timed out after 0.2s"
+    # check_1 starts once check_0 returns, not once it timed out.
+    assert log.read_text().splitlines() == ["check_0 started", "check_0 done", "check_1 saw 2"]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_timed_out_checks_are_given_up(write, tmp_path, jobs):
+    log = tmp_path / "log.txt"
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0", "Check 1"])))
+    runtime = PythonRuntime(libraries=[write("checks.py", TIMED_OUT_LIBRARY.format(log=str(log), duration=1))])
+    start = time.perf_counter()
+    list(jpipe.justify("fanin", runtime=runtime, scheduler=Scheduler(jobs=jobs) if jobs > 1 else None))
+    # check_1 starts once check_0 ran for its timeout twice, while check_0 is still running.
+    assert 0.4 <= time.perf_counter() - start < 0.9
+    assert log.read_text().splitlines() == ["check_0 started", "check_1 saw 1"]
+    time.sleep(0.8)
+
+
+def test_timed_out_checks_keep_their_library_state(write):
+    library = LIBRARY_HEAD.replace("def combine():\n    return True",
+                                   "def combine():\n    return calls == ['check_0']") + """
+
+@check(pure=True, timeout=1)
+def check_0():
+    return _work("check_0")
+"""
+    jpipe = JPipeEngine(write("model.jd", _model(["Check 0"])))
+    runtime = PythonRuntime(libraries=[write("checks.py", library)])
+    # the strategy reads the state left by the evidence, which runs in-process.
+    assert all(r['status'] is StatusType.PASS for r in jpipe.justify("fanin", runtime=runtime))
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.sharding import diagram_sizes, estimate_costs, parse_shard, shard_diagrams
+
+
+@pytest.mark.parametrize("shard, expected", [("1/1", (1, 1)), ("2/3", (2, 3))])
+def test_parse_shard(shard, expected):
+    assert parse_shard(shard) == expected
+
+
+@pytest.mark.parametrize("shard", ["1", "a/2", "0/2", "3/2", "1/2/3"])
+def test_parse_invalid_shard(shard):
+    with pytest.raises(ValueError):
+        parse_shard(shard)
+
+
+def test_unrecorded_costs_are_scaled_by_node():
+    costs = estimate_costs({"a": 10, "b": 20, "c": 5}, {"a": 2.0, "unknown": 100.0})
+    assert costs == {"a": 2.0, "b": 4.0, "c": 1.0}
+    assert estimate_costs({"a": 10, "b": 20}) == {"a": 10.0, "b": 20.0}
+
+
+def test_compositions_are_sized_with_their_components(write):
+    jpipe = JPipeEngine(write("model.jd", """
+        justification left {
+            evidence   e is "Left evidence holds"
+            strategy   s is "Check left"
+            conclusion c is "Left holds"
+            e supports s
+            s supports c
+        }
+
+        justification right {
+            evidence   e is "Right evidence holds"
+            strategy   s is "Check right"
+            conclusion c is "Right holds"
+            e supports s
+            s supports c
+        }
+
+        composition composed {
+            justification both is left with right
+            justification all is both with left
+        }
+    """))
+    sizes = diagram_sizes(jpipe, ["left", "both", "all"])
+    both = len(jpipe.justifications["both"].nodes)
+    assert sizes == {"left": 3, "both": both + 6, "all": len(jpipe.justifications["all"].nodes) + both + 6}
+
+
+def test_shards_partition_the_justifications():
+    rng = random.Random(0)
+    costs = {f"d{i}": rng.uniform(0.1, 10.0) for i in range(50)}
+    shards = [shard_diagrams(costs, i, 4) for i in range(1, 5)]
+    assert sorted(n for s in shards for n in s) == sorted(costs)
+    # each shard keeps the original order.
+    order = list(costs)
+    assert all(s == sorted(s, key=order.index) for s in shards)
+    loads = [sum(costs[n] for n in s) for s in shards]
+    assert max(loads) - min(loads) <= max(costs.values())
+
+
+def test_shards_are_deterministic():
+    costs = {"a": 1.0, "b": 1.0, "c": 1.0, "d": 3.0}
+    assert [shard_diagrams(costs, i, 2) for i in (1, 2)] == [["d"], ["a", "b", "c"]]
+    reversed_costs = dict(reversed(costs.items()))
+    assert [sorted(shard_diagrams(reversed_costs, i, 2)) for i in (1, 2)] == [["d"], ["a", "b", "c"]]
+
+
+def test_more_shards_than_justifications():
+    assert [shard_diagrams({"a": 1.0}, i, 3) for i in (1, 2, 3)] == [["a"], [], []]
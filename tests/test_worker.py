@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jpipe_runner.enums import StatusType
+from jpipe_runner.jpipe import JPipeEngine
+from jpipe_runner.library import CheckSpec
+from jpipe_runner.scheduler import Scheduler
+from jpipe_runner.worker import RemoteRuntime, _dump_spec, _load_spec
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODEL = """
+justification remote {
+    evidence   e1 is "Slow check 1"
+    evidence   e2 is "Slow check 2"
+    evidence   e3 is "Slow check 3"
+    evidence   e4 is "Slow check 4"
+    strategy   s  is "Combine checks"
+    conclusion c  is "Checks hold"
+    e1 supports s
+    e2 supports s
+    e3 supports s
+    e4 supports s
+    s  supports c
+}
+"""
+
+LIBRARY = """
+import time
+
+from jpipe_runner import check
+
+suffix = None
+
+
+def _slow():
+    time.sleep(0.5)
+    return suffix == "ok"
+
+
+@check(parallel_safe=True)
+def slow_check_1():
+    return _slow()
+
+
+@check(parallel_safe=True)
+def slow_check_2():
+    return _slow()
+
+
+@check(parallel_safe=True)
+def slow_check_3():
+    return _slow()
+
+
+@check(parallel_safe=True)
+def slow_check_4():
+    return _slow()
+
+
+def combine_checks():
+    return suffix == "ok"
+"""
+
+
+def _start_worker(library: str) -> tuple[subprocess.Popen, str]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.Popen([sys.executable, "-m", "jpipe_runner", "worker",
+                             "--listen", "localhost:0", "-l", library],
+                            env=env, stdout=subprocess.PIPE, text=True)
+    # "jPipe Runner worker listening on HOST:PORT"
+    line = proc.stdout.readline()
+    assert "listening on" in line, line
+    return proc, line.split()[-1]
+
+
+@pytest.fixture
+def workers(write):
+    library = write("checks.py", LIBRARY)
+    procs = []
+    try:
+        addresses = []
+        for _ in range(3):
+            proc, address = _start_worker(library)
+            procs.append(proc)
+            addresses.append(address)
+        yield procs, addresses
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+
+
+def _justify(jpipe: JPipeEngine, runtime: RemoteRuntime) -> list[dict]:
+    return list(jpipe.justify("remote", runtime=runtime, scheduler=Scheduler(jobs=runtime.slots)))
+
+
+def test_checks_run_on_workers(write, workers):
+    _, addresses = workers
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = RemoteRuntime(addresses, variables=[("suffix", "ok")])
+    try:
+        assert runtime.slots == 3
+        assert all(r['status'] is StatusType.PASS for r in _justify(jpipe, runtime))
+    finally:
+        runtime.close()
+
+
+def test_calls_of_a_lost_worker_are_reassigned(write, workers, capsys):
+    procs, addresses = workers
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = RemoteRuntime(addresses, variables=[("suffix", "ok")])
+    try:
+        # kill a worker while it runs one of the first three checks.
+        killer = threading.Timer(0.2, procs[0].kill)
+        killer.start()
+        start = time.monotonic()
+        results = _justify(jpipe, runtime)
+        killer.join()
+    finally:
+        runtime.close()
+
+    assert all(r['status'] is StatusType.PASS for r in results)
+    assert f"Worker {addresses[0]} lost, sending its 1 call(s) to 2 other worker(s)" in capsys.readouterr().err
+    # the lost call ran again with the fourth check, on the two workers left.
+    assert time.monotonic() - start < 3 * 0.5 + 1
+
+
+def test_run_fails_without_workers_left(write, workers):
+    procs, addresses = workers
+    jpipe = JPipeEngine(write("model.jd", MODEL))
+    runtime = RemoteRuntime(addresses, variables=[("suffix", "ok")])
+    try:
+        for proc in procs:
+            proc.kill()
+        results = _justify(jpipe, runtime)
+    finally:
+        runtime.close()
+
+    assert [r['status'] for r in results][:4] == [StatusType.FAIL] * 4
+    assert "no worker left" in results[0]['exception']
+
+
+def test_checks_with_a_cache_key_are_not_cached_remotely():
+    pure = CheckSpec(pure=True, parallel_safe=True, resources={"cpu": 2.0})
+    assert _load_spec(_dump_spec(pure)) == pure
+    keyed = _load_spec(_dump_spec(CheckSpec(pure=True, parallel_safe=True, cache_key=lambda: 1)))
+    assert keyed == CheckSpec(pure=False, parallel_safe=True)